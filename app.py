@@ -16,21 +16,46 @@ import queue
 import time
 import logging
 from datetime import datetime
+from cli_pool import CliSessionPool
+from async_core import DeviceCore
+from mup1 import Mup1Transport
+from batch import is_read_command
+from cache import ReadCache
+from singleflight import SingleFlight
+from telemetry import TelemetryPoller
+from parsing import FastJSONProvider, cli_response, parse_result
+from gcl import compile_schedule
+import cbs
+from streaming import SSE, stream_format, stream_response, stream_process, result_events
+import serve
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app)
 
 # CLI tool path
 CLI_PATH = "/home/kim/Downloads/Microchip_VelocityDRIVE_CT-CLI-linux-2025.07.12/mvdct.cli"
 
+# Command transport: 'subprocess' starts mvdct for every request,
+# 'pool' keeps one interactive CLI session open per device,
+# 'mup1' talks MUP1 directly over the connected serial port,
+# 'async' runs mvdct processes on one asyncio event loop
+CLI_TRANSPORT = os.environ.get('VELOCITYDRIVE_TRANSPORT', 'subprocess')
+
 # Global serial connection
 serial_conn = None
 serial_lock = threading.Lock()
 output_queue = queue.Queue()
+mup1_link = None
+
+# Recent read results, dropped when a write touches an overlapping path
+yang_cache = ReadCache()
+# Identical reads running at the same time share one device round trip
+read_flight = SingleFlight()
 
 def get_serial_ports():
     """List available serial ports"""
@@ -43,8 +68,8 @@ def get_serial_ports():
         })
     return ports
 
-def execute_cli_command(args):
-    """Execute mvdct CLI command"""
+def run_cli_subprocess(args, timeout=10):
+    """Execute mvdct CLI command in a new process"""
     try:
         cmd = [CLI_PATH] + args
         logger.info(f"Executing: {' '.join(cmd)}")
@@ -53,7 +78,7 @@ def execute_cli_command(args):
             cmd,
             capture_output=True,
             text=True,
-            timeout=10
+            timeout=timeout
         )
 
         return {
@@ -75,6 +100,69 @@ def execute_cli_command(args):
             'command': ' '.join(args)
         }
 
+cli_pool = CliSessionPool(CLI_PATH, fallback=run_cli_subprocess)
+device_core = DeviceCore(CLI_PATH) if CLI_TRANSPORT == 'async' else None
+
+def dispatch_cli_command(args, timeout=10):
+    """Run a CLI command and parse its output into 'data'"""
+    return parse_result(args, run_on_transport(args, timeout))
+
+def run_on_transport(args, timeout=10):
+    """Run a CLI command on the configured transport"""
+    link = mup1_link
+    if CLI_TRANSPORT == 'mup1' and link and len(args) > 1 and args[1] == link.name:
+        result = link.execute(args, timeout=timeout)
+        if result is not None:
+            return result
+        # Not handled natively: lend the serial port to mvdct for this command
+        with link.released():
+            return run_cli_subprocess(args, timeout)
+    if CLI_TRANSPORT == 'pool':
+        return cli_pool.execute(args, timeout=timeout)
+    if device_core:
+        return device_core.execute(args, timeout)
+    return run_cli_subprocess(args, timeout)
+
+def execute_cli_command(args, timeout=10):
+    """Execute mvdct CLI command"""
+    if is_read_command(args):
+        return read_flight.do(tuple(args), dispatch_cli_command, args, timeout)
+    try:
+        return dispatch_cli_command(args, timeout)
+    finally:
+        invalidate_reads(args)
+
+def invalidate_reads(args):
+    """Drop cached and in-flight reads that a write may have changed"""
+    if is_read_command(args):
+        return
+    yang_cache.invalidate_for(args)
+    if len(args) > 1 and args[0] == 'device':
+        read_flight.forget(lambda key: key[1] == args[1])
+
+def cached_cli_command(args, timeout=10):
+    """Execute a read command, answering from the read cache when fresh"""
+    return yang_cache.execute(args, execute_cli_command, timeout=timeout)
+
+# Shared sampler feeding /api/telemetry/stream subscribers
+telemetry = TelemetryPoller(execute_cli_command)
+
+def stream_cli_command(args, timeout=10):
+    """Yield output events for a CLI command while it runs"""
+    try:
+        if CLI_TRANSPORT == 'pool':
+            # Interactive sessions only return complete replies
+            yield from result_events(cli_pool.execute(args, timeout=timeout))
+            return
+        link = mup1_link
+        if CLI_TRANSPORT == 'mup1' and link and len(args) > 1 and args[1] == link.name:
+            with link.released():
+                yield from stream_process([CLI_PATH] + args, timeout)
+            return
+        yield from stream_process([CLI_PATH] + args, timeout)
+    finally:
+        invalidate_reads(args)
+
 @app.route('/')
 def index():
     """Main page"""
@@ -88,7 +176,7 @@ def list_ports():
 @app.route('/api/connect', methods=['POST'])
 def connect_device():
     """Connect to device"""
-    global serial_conn
+    global serial_conn, mup1_link
 
     data = request.json
     port = data.get('port', '/dev/ttyACM0')
@@ -96,6 +184,9 @@ def connect_device():
 
     try:
         with serial_lock:
+            if mup1_link:
+                mup1_link.close()
+                mup1_link = None
             if serial_conn:
                 serial_conn.close()
 
@@ -105,6 +196,12 @@ def connect_device():
                 timeout=1
             )
 
+            if CLI_TRANSPORT == 'mup1':
+                mup1_link = Mup1Transport(serial_conn, name=port).start()
+
+        # A (re)connected device may not match what was cached for the port
+        yang_cache.invalidate(port)
+
         return jsonify({
             'success': True,
             'message': f'Connected to {port} at {baudrate} baud'
@@ -118,10 +215,13 @@ def connect_device():
 @app.route('/api/disconnect', methods=['POST'])
 def disconnect_device():
     """Disconnect from device"""
-    global serial_conn
+    global serial_conn, mup1_link
 
     try:
         with serial_lock:
+            if mup1_link:
+                mup1_link.close()
+                mup1_link = None
             if serial_conn:
                 serial_conn.close()
                 serial_conn = None
@@ -142,8 +242,8 @@ def get_device_info():
     data = request.json
     port = data.get('port', '/dev/ttyACM0')
 
-    result = execute_cli_command(['device', port, 'get', '/ietf-system:system-state'])
-    return jsonify(result)
+    result = cached_cli_command(['device', port, 'get', '/ietf-system:system-state'])
+    return cli_response(result)
 
 @app.route('/api/device/capabilities', methods=['POST'])
 def get_capabilities():
@@ -151,8 +251,8 @@ def get_capabilities():
     data = request.json
     port = data.get('port', '/dev/ttyACM0')
 
-    result = execute_cli_command(['device', port, 'get-capabilities'])
-    return jsonify(result)
+    result = cached_cli_command(['device', port, 'get-capabilities'])
+    return cli_response(result)
 
 @app.route('/api/interface/list', methods=['POST'])
 def list_interfaces():
@@ -161,7 +261,7 @@ def list_interfaces():
     port = data.get('port', '/dev/ttyACM0')
 
     result = execute_cli_command(['device', port, 'get', '/ietf-interfaces:interfaces'])
-    return jsonify(result)
+    return cli_response(result)
 
 @app.route('/api/interface/status/<interface>', methods=['POST'])
 def get_interface_status(interface):
@@ -171,7 +271,7 @@ def get_interface_status(interface):
 
     path = f'/ietf-interfaces:interfaces/interface[name="{interface}"]'
     result = execute_cli_command(['device', port, 'get', path])
-    return jsonify(result)
+    return cli_response(result)
 
 @app.route('/api/tsn/config', methods=['GET', 'POST'])
 def tsn_config():
@@ -181,7 +281,7 @@ def tsn_config():
         port = data.get('port', '/dev/ttyACM0')
 
         result = execute_cli_command(['device', port, 'get', '/ieee802-dot1q-tsn-config:tsn'])
-        return jsonify(result)
+        return cli_response(result)
 
     elif request.method == 'POST':
         data = request.json
@@ -191,7 +291,7 @@ def tsn_config():
         # Build configuration command
         # This would need to be expanded based on specific TSN parameters
         result = execute_cli_command(['device', port, 'set', '/ieee802-dot1q-tsn-config:tsn', json.dumps(config)])
-        return jsonify(result)
+        return cli_response(result)
 
 @app.route('/api/tsn/tas/config', methods=['GET', 'POST'])
 def tas_config():
@@ -201,7 +301,7 @@ def tas_config():
 
     if request.method == 'GET':
         result = execute_cli_command(['device', port, 'get', '/ieee802-dot1q-sched:sched'])
-        return jsonify(result)
+        return cli_response(result)
 
     elif request.method == 'POST':
         # TAS configuration parameters
@@ -216,8 +316,15 @@ def tas_config():
             'admin-control-list': gate_list
         }
 
+        # Check the gate list locally before spending a device round trip
+        tas_config, validation = compile_schedule(tas_config, merge_entries=data.get('merge', True))
+        if not validation['valid']:
+            return jsonify({'success': False, 'error': '; '.join(validation['errors']),
+                            'validation': validation})
+
         result = execute_cli_command(['device', port, 'set', '/ieee802-dot1q-sched:sched', json.dumps(tas_config)])
-        return jsonify(result)
+        result['validation'] = validation
+        return cli_response(result)
 
 @app.route('/api/tsn/cbs/config', methods=['GET', 'POST'])
 def cbs_config():
@@ -227,7 +334,7 @@ def cbs_config():
 
     if request.method == 'GET':
         result = execute_cli_command(['device', port, 'get', '/ieee802-dot1q-stream-filters-gates:stream-filters-gates'])
-        return jsonify(result)
+        return cli_response(result)
 
     elif request.method == 'POST':
         # CBS configuration parameters
@@ -236,15 +343,32 @@ def cbs_config():
         hi_credit = data.get('hi_credit', 100)
         lo_credit = data.get('lo_credit', -100)
 
-        cbs_config = {
-            'idle-slope': idle_slope,
-            'send-slope': send_slope,
-            'hi-credit': hi_credit,
-            'lo-credit': lo_credit
-        }
+        admission = None
+        if data.get('classes'):
+            # Derive the parameters of traffic_class from the port's classes
+            admission = cbs.calculate(data)
+            if not admission['valid']:
+                return jsonify({'success': False, 'error': '; '.join(admission['errors']),
+                                'admission': admission})
+            wanted = [cls for cls in admission['classes']
+                      if cls['traffic_class'] == data.get('traffic_class')] or admission['classes'][:1]
+            cbs_config = cbs.device_parameters(wanted[0])
+        else:
+            errors = cbs.check_parameters(idle_slope, send_slope, hi_credit, lo_credit,
+                                          data.get('link_speed'))
+            if errors:
+                return jsonify({'success': False, 'error': '; '.join(errors)})
+            cbs_config = {
+                'idle-slope': idle_slope,
+                'send-slope': send_slope,
+                'hi-credit': hi_credit,
+                'lo-credit': lo_credit
+            }
 
         result = execute_cli_command(['device', port, 'set', '/ieee802-dot1q-stream-filters-gates:stream-filters-gates', json.dumps(cbs_config)])
-        return jsonify(result)
+        if admission:
+            result['admission'] = admission
+        return cli_response(result)
 
 @app.route('/api/ptp/status', methods=['POST'])
 def ptp_status():
@@ -253,7 +377,7 @@ def ptp_status():
     port = data.get('port', '/dev/ttyACM0')
 
     result = execute_cli_command(['device', port, 'get', '/ieee1588-ptp:ptp'])
-    return jsonify(result)
+    return cli_response(result)
 
 @app.route('/api/statistics', methods=['POST'])
 def get_statistics():
@@ -264,7 +388,33 @@ def get_statistics():
 
     path = f'/ietf-interfaces:interfaces/interface[name="{interface}"]/statistics'
     result = execute_cli_command(['device', port, 'get', path])
-    return jsonify(result)
+    return cli_response(result)
+
+@app.route('/api/telemetry/stream')
+def telemetry_stream():
+    """Push telemetry changes for a device (SSE by default)"""
+    port = request.args.get('port', '/dev/ttyACM0')
+    streams = request.args.get('streams')
+    streams = streams.split(',') if streams else None
+
+    try:
+        events = telemetry.watch(port, streams)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return stream_response(events, stream_format(request) or SSE)
+
+@app.route('/api/telemetry/config', methods=['POST'])
+def telemetry_config():
+    """Set telemetry sample intervals (seconds per stream) and interfaces"""
+    data = request.json
+    port = data.get('port', '/dev/ttyACM0')
+
+    try:
+        config = telemetry.configure(port, intervals=data.get('intervals'),
+                                     interfaces=data.get('interfaces'))
+    except (ValueError, TypeError) as e:
+        return jsonify({'success': False, 'error': str(e)})
+    return jsonify({'success': True, 'config': config})
 
 @app.route('/api/command', methods=['POST'])
 def execute_command():
@@ -276,8 +426,12 @@ def execute_command():
         return jsonify({'success': False, 'error': 'No command provided'})
 
     args = command.split()
+    fmt = stream_format(request, data)
+    if fmt:
+        return stream_response(stream_cli_command(args, timeout=data.get('timeout', 10)), fmt)
+
     result = execute_cli_command(args)
-    return jsonify(result)
+    return cli_response(result)
 
 @app.route('/api/health')
 def health_check():
@@ -286,8 +440,24 @@ def health_check():
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
         'cli_path': CLI_PATH,
-        'cli_exists': os.path.exists(CLI_PATH)
+        'cli_exists': os.path.exists(CLI_PATH),
+        'transport': CLI_TRANSPORT,
+        'cli_sessions': cli_pool.status(),
+        'device_core': device_core.status() if device_core else None,
+        'mup1_link': mup1_link.status() if mup1_link else None,
+        'cache': yang_cache.stats(),
+        'coalescing': read_flight.stats(),
+        'telemetry': telemetry.status()
     })
 
+def close_device_links():
+    """Release CLI sessions and the MUP1 link on shutdown"""
+    telemetry.stop()
+    cli_pool.close()
+    if device_core:
+        device_core.close()
+    if mup1_link:
+        mup1_link.close()
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8080, debug=True)
\ No newline at end of file
+    serve.run(app, host='0.0.0.0', port=8080, on_shutdown=[close_device_links])
\ No newline at end of file
@@ -4,7 +4,7 @@ VelocityDRIVE Touch GUI - Complete Web interface with all CLI features
 Comprehensive wrapper for all mvdct CLI commands
 """
 
-from flask import Flask, render_template, jsonify, request, Response, send_file
+from flask import Flask, render_template, jsonify, request, Response, send_file, g
 from flask_cors import CORS
 import subprocess
 import json
@@ -18,42 +18,106 @@ import logging
 from datetime import datetime
 import tempfile
 import yaml
+from cli_pool import CliSessionPool
+from async_core import DeviceCore
+from simulator import DeviceSimulator
+from replay import Recorder, ReplayTransport, capture_path
+from fleet import DeviceRegistry
+from deploy import DeployEngine
+from transaction import TransactionManager
+from gcl import compile_schedule
+import cbs
+from mup1 import Mup1Transport
+from coap import CoapClient, CoapError, CoreconfClient, SidMap
+import cbor
+from batch import BatchEngine, MODES as BATCH_MODES, STOP_ON_ERROR, is_read_command
+from cache import ReadCache
+from metrics import COUNTER, GAUGE, HISTOGRAM, Metrics, operation, outcome
+from tracing import Tracer, add_span, span
+from singleflight import SingleFlight
+from telemetry import TELEMETRY_STREAMS, TelemetryPoller, flatten
+from timeseries import TimeSeriesStore, counter_values
+from ptp_analytics import PtpAnalytics
+from parsing import FastJSONProvider, cli_response, fetch_instances, parse_output, parse_result, statistics_table
+from yang_patch import VersionStore, diff, etag
+from streaming import SSE, stream_format, stream_response, stream_process, result_events, with_progress
+import serve
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app)
 
 # CLI tool path
 CLI_PATH = "/home/kim/Downloads/Microchip_VelocityDRIVE_CT-CLI-linux-2025.07.12/mvdct.cli"
 
+# Command transport: 'subprocess' starts mvdct for every request,
+# 'pool' keeps one interactive CLI session open per device,
+# 'mup1' talks MUP1 directly over each device's serial port,
+# 'async' runs mvdct processes on one asyncio event loop,
+# 'sim' answers from simulated boards (no hardware or mvdct needed),
+# 'replay' answers with responses recorded in a capture log
+CLI_TRANSPORT = os.environ.get('VELOCITYDRIVE_TRANSPORT', 'subprocess')
+
 # Global variables
 serial_conn = None
 serial_lock = threading.Lock()
 output_queue = queue.Queue()
 current_device = None
-
-def execute_cli_command(args, timeout=30):
-    """Execute mvdct CLI command with timeout"""
+mup1_links = {}
+coreconf_clients = {}
+MUP1_BAUDRATE = 115200
+
+# YANG SID files used to address CORECONF requests over MUP1
+SID_DIR = os.environ.get('VELOCITYDRIVE_SID_DIR', os.path.join(os.path.dirname(__file__), 'sid'))
+sid_map = SidMap.load_dir(SID_DIR)
+
+# Recent read results, dropped when a write touches an overlapping path
+yang_cache = ReadCache()
+# Recently returned YANG subtrees, for /api/yang/get delta responses
+yang_versions = VersionStore()
+# Identical reads running at the same time share one device round trip
+read_flight = SingleFlight()
+
+# Latency histograms and counters for /api/metrics
+metrics = Metrics()
+metrics.define('cli_request_seconds', HISTOGRAM, 'CLI command latency seen by callers, including queueing')
+metrics.define('transport_seconds', HISTOGRAM, 'Time a command spent on the transport')
+metrics.define('queue_wait_seconds', HISTOGRAM, 'Time a command waited for its device worker')
+metrics.define('cli_requests_total', COUNTER, 'CLI commands by outcome')
+metrics.define('cli_bytes_total', COUNTER, 'Characters of command arguments sent and output received')
+metrics.define('http_request_seconds', HISTOGRAM, 'HTTP request latency until the response is built')
+
+# Requests sent with ?trace=1 or an X-Trace: 1 header return their span tree
+tracer = Tracer()
+TRACE_HEADER = 'X-Trace'
+
+def run_cli_subprocess(args, timeout=30):
+    """Execute mvdct CLI command in a new process"""
     try:
         cmd = [CLI_PATH] + args
         logger.info(f"Executing: {' '.join(cmd)}")
 
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=timeout
-        )
+        with span('spawn'):
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        try:
+            # Device handshake and transfer happen inside mvdct
+            with span('device'):
+                stdout, stderr = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            raise
 
         return {
-            'success': result.returncode == 0,
-            'stdout': result.stdout,
-            'stderr': result.stderr,
+            'success': process.returncode == 0,
+            'stdout': stdout,
+            'stderr': stderr,
             'command': ' '.join(cmd),
-            'returncode': result.returncode
+            'returncode': process.returncode
         }
     except subprocess.TimeoutExpired:
         return {
@@ -68,6 +132,298 @@ def execute_cli_command(args, timeout=30):
             'command': ' '.join(args)
         }
 
+cli_pool = CliSessionPool(CLI_PATH, fallback=run_cli_subprocess)
+# Device processes for the 'async' transport and background jobs; the loop
+# thread starts on first use, also in each pre-forked server process
+device_core = DeviceCore(CLI_PATH)
+# Simulated boards for the 'sim' transport
+device_simulator = DeviceSimulator()
+# Recorded responses for the 'replay' transport
+replay_transport = ReplayTransport() if CLI_TRANSPORT == 'replay' else None
+# Capture log of device commands, on when VELOCITYDRIVE_CAPTURE_FILE is set
+capture = Recorder()
+
+def get_mup1_link(device):
+    """Open the native MUP1 link for a serial device on first use"""
+    with serial_lock:
+        link = mup1_links.get(device)
+        if link is None:
+            port = serial.Serial(port=device, baudrate=MUP1_BAUDRATE, timeout=0.1)
+            link = mup1_links[device] = Mup1Transport(port, name=device).start()
+        return link
+
+def get_coreconf_client(device):
+    """CoAP/CORECONF client sharing the device's MUP1 link"""
+    link = get_mup1_link(device)
+    with serial_lock:
+        client = coreconf_clients.get(device)
+        if client is None or client.coap.link is not link:
+            client = coreconf_clients[device] = CoreconfClient(CoapClient(link), sid_map)
+        return client
+
+def execute_mup1_command(args, timeout=30):
+    """Execute a command over MUP1, lending the port to mvdct when needed"""
+    try:
+        link = get_mup1_link(args[1])
+        coreconf = get_coreconf_client(args[1])
+    except Exception as e:
+        logger.warning(f"MUP1 link unavailable for {args[1]}: {e}")
+        return run_cli_subprocess(args, timeout)
+
+    result = link.execute(args, timeout=timeout)
+    if result is None:
+        result = coreconf.execute(args, timeout=timeout)
+    if result is not None:
+        return result
+    with link.released():
+        return run_cli_subprocess(args, timeout)
+
+def dispatch_cli_command(args, timeout=30):
+    """Run a CLI command and parse its output into 'data'"""
+    result = fleet.run(args, timeout)
+    with span('parse'):
+        return parse_result(args, result)
+
+def run_on_transport(args, timeout=30):
+    """Run a CLI command on the configured transport"""
+    started = time.time()
+    with span('transport', transport=CLI_TRANSPORT):
+        result = transport_command(args, timeout)
+    metrics.observe('transport_seconds', time.time() - started,
+                    transport=CLI_TRANSPORT, operation=operation(args)[0])
+    capture.record(args, started, result)
+    return result
+
+def transport_command(args, timeout=30):
+    if CLI_TRANSPORT == 'mup1' and len(args) > 2 and args[0] == 'device':
+        return execute_mup1_command(args, timeout)
+    if CLI_TRANSPORT == 'pool':
+        return cli_pool.execute(args, timeout=timeout)
+    if CLI_TRANSPORT == 'async' or (CLI_TRANSPORT == 'subprocess' and device_core.in_job()):
+        # A job's process runs on the device core so cancelling the job kills it
+        return device_core.execute(args, timeout)
+    if CLI_TRANSPORT == 'sim':
+        return device_simulator.execute(args, timeout)
+    if CLI_TRANSPORT == 'replay':
+        return replay_transport.execute(args, timeout)
+    return run_cli_subprocess(args, timeout)
+
+# Connected boards; each device's commands run in order on its own worker
+def record_queue_wait(device, seconds):
+    metrics.observe('queue_wait_seconds', seconds, device=device)
+    add_span('queue', time.time() - seconds, device=device)
+
+fleet = DeviceRegistry(run_on_transport, on_wait=record_queue_wait)
+
+def execute_cli_command(args, timeout=30):
+    """Execute mvdct CLI command with timeout"""
+    started = time.time()
+    name, path = operation(args)
+    with span('cli', operation=name, path=path):
+        if is_read_command(args):
+            result = read_flight.do(tuple(args), dispatch_cli_command, args, timeout)
+        else:
+            try:
+                result = dispatch_cli_command(args, timeout)
+            finally:
+                invalidate_reads(args)
+    record_command(args, result, time.time() - started)
+    return result
+
+def record_command(args, result, seconds):
+    """Add a finished command to the latency, outcome and traffic metrics"""
+    name, path = operation(args)
+    metrics.observe('cli_request_seconds', seconds, operation=name, path=path)
+    metrics.inc('cli_requests_total', operation=name, outcome=outcome(result))
+    metrics.inc('cli_bytes_total', sum(len(str(arg)) for arg in args), direction='sent')
+    metrics.inc('cli_bytes_total', len(result.get('stdout') or '') + len(result.get('stderr') or ''),
+                direction='received')
+
+def collect_metrics():
+    """Cache, coalescing and queue figures kept by their own components"""
+    cache = yang_cache.stats()
+    flight = read_flight.stats()
+    queues = {(('device', device),): entry['worker']['queued']
+              for device, entry in fleet.status().items() if 'worker' in entry}
+    return [
+        ('cache_hits_total', COUNTER, 'Reads answered from the read cache', {(): cache['hits']}),
+        ('cache_misses_total', COUNTER, 'Reads the read cache could not answer', {(): cache['misses']}),
+        ('cache_hit_ratio', GAUGE, 'Share of cacheable reads answered from the cache',
+         {(): cache['hit_rate'] or 0}),
+        ('coalesced_reads_total', COUNTER, 'Reads that shared an identical in-flight read',
+         {(): flight['shared']}),
+        ('device_queue_depth', GAUGE, 'Commands waiting for each device worker', queues),
+    ]
+
+metrics.add_collector(collect_metrics)
+
+def invalidate_reads(args):
+    """Drop cached and in-flight reads that a write may have changed"""
+    if is_read_command(args):
+        return
+    yang_cache.invalidate_for(args)
+    if len(args) > 1 and args[0] == 'device':
+        read_flight.forget(lambda key: key[1] == args[1])
+
+def cached_cli_command(args, timeout=30, use_cache=True):
+    """Execute a read command, answering from the read cache when fresh"""
+    return yang_cache.execute(args, execute_cli_command, timeout=timeout, use_cache=use_cache)
+
+# Shared sampler feeding /api/telemetry/stream subscribers
+telemetry = TelemetryPoller(execute_cli_command)
+
+# Counter history for /api/tsn/statistics/history; with recording enabled
+# (VELOCITYDRIVE_HISTORY_RECORD=1) a connected device's statistics keep being
+# sampled when no client is watching
+HISTORY_RECORD = os.environ.get('VELOCITYDRIVE_HISTORY_RECORD', '0') == '1'
+statistics_history = TimeSeriesStore()
+
+def record_statistics(device, stream, interface, leaves, sampled_at=None):
+    """Add a statistics sample to the interface's counter history"""
+    if stream == 'statistics':
+        statistics_history.record(device, interface, counter_values(leaves), sampled_at)
+
+telemetry.add_listener(record_statistics)
+
+# Offset and path delay samples for /api/tsn/ptp/analytics
+ptp_analytics = PtpAnalytics()
+telemetry.add_listener(ptp_analytics.listener)
+
+def release_idle_ptp(device, stream, key, leaves, sampled_at):
+    """Stop sampling ptp for analytics nobody has read for a while"""
+    if stream == 'ptp':
+        for idle in ptp_analytics.expired(sampled_at):
+            telemetry.release(idle, ['ptp'])
+
+telemetry.add_listener(release_idle_ptp)
+
+def transport_events(args, timeout=30, kill_on_close=True):
+    """Output events for a command on the configured transport while it runs"""
+    if CLI_TRANSPORT in ('pool', 'sim', 'replay'):
+        # Interactive sessions, the simulator and replays only return complete replies
+        yield from result_events(transport_command(args, timeout))
+        return
+    link = None
+    if CLI_TRANSPORT == 'mup1' and len(args) > 2 and args[0] == 'device':
+        link = mup1_links.get(args[1])
+    if link is None:
+        yield from stream_process([CLI_PATH] + args, timeout, kill_on_close)
+        return
+    with link.released():
+        yield from stream_process([CLI_PATH] + args, timeout, kill_on_close)
+
+def stream_on_transport(args, timeout=30, kill_on_close=True):
+    """transport_events with the metrics and capture of run_on_transport"""
+    started = time.time()
+    result = {'success': False, 'command': ' '.join(args), 'error': 'Stream closed before the command finished'}
+    try:
+        with span('transport', transport=CLI_TRANSPORT):
+            for event in transport_events(args, timeout, kill_on_close):
+                if event.get('type') == 'done':
+                    result = {key: value for key, value in event.items() if key != 'type'}
+                yield event
+    finally:
+        metrics.observe('transport_seconds', time.time() - started,
+                        transport=CLI_TRANSPORT, operation=operation(args)[0])
+        capture.record(args, started, result)
+
+def stream_cli_command(args, timeout=30, kill_on_close=True):
+    """Yield output events for a CLI command while it runs, as a write on
+    its device's worker so nothing else reaches the board meanwhile"""
+    started = time.time()
+    result = {'success': False, 'command': ' '.join(args), 'error': 'Stream closed before the command finished'}
+    try:
+        for event in fleet.stream(args, lambda args, timeout: stream_on_transport(args, timeout, kill_on_close),
+                                  timeout):
+            if event.get('type') == 'done':
+                result = {key: value for key, value in event.items() if key != 'type'}
+            yield event
+    finally:
+        invalidate_reads(args)
+        record_command(args, result, time.time() - started)
+
+def start_cli_job(args, timeout=30, description=None):
+    """Run a CLI command in the background; returns a job id for /api/jobs
+
+    The command goes through its device's worker like any other, so it
+    waits for commands already queued and later ones wait for it.
+    """
+    return device_core.start_job(args, timeout, description, execute=execute_cli_command)
+
+def job_response(job_id):
+    return jsonify({'success': True, 'job': device_core.job(job_id)}), 202
+
+batch_engine = BatchEngine(execute_cli_command)
+deploy_engine = DeployEngine(execute_cli_command)
+
+def ipatch_edits(device, edits, timeout=30):
+    """Send transaction edits as one CORECONF iPATCH, or None if the CLI must"""
+    if CLI_TRANSPORT != 'mup1':
+        return None
+    try:
+        coreconf = get_coreconf_client(device)
+    except Exception:
+        return None
+    if not all(coreconf.supports(path) for path in edits):
+        return None
+
+    def send(args, timeout):
+        try:
+            coreconf.ipatch(edits, timeout=timeout)
+            return {'success': True, 'stdout': '', 'stderr': '', 'command': 'iPATCH'}
+        except (CoapError, TimeoutError, cbor.CBORError) as e:
+            return {'success': False, 'error': str(e), 'command': 'iPATCH'}
+
+    args = ['device', device, 'patch']
+    try:
+        return fleet.run(args, timeout, execute=send)
+    finally:
+        invalidate_reads(args)
+
+transactions = TransactionManager(execute_cli_command, apply_native=ipatch_edits)
+
+def trace_requested():
+    flag = request.args.get('trace') or request.headers.get(TRACE_HEADER)
+    return flag in ('1', 'true', 'yes')
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.time()
+    if trace_requested():
+        g.trace = tracer.start(f'{request.method} {request.path}',
+                               endpoint=request.url_rule.rule if request.url_rule else None)
+        if request.is_json:
+            # Parsed once here; handlers get Flask's cached copy
+            with span('parse_request', bytes=request.content_length):
+                request.get_json(silent=True)
+
+@app.after_request
+def record_request(response):
+    """Time every request against its route pattern, not its concrete URL"""
+    if request.url_rule is not None and 'request_started' in g:
+        metrics.observe('http_request_seconds', time.time() - g.request_started,
+                        endpoint=request.url_rule.rule, method=request.method,
+                        status=str(response.status_code))
+    if g.get('trace') is not None:
+        attach_trace(response, tracer.finish(g.pop('trace')))
+    return response
+
+@app.teardown_request
+def end_trace(error=None):
+    # A request that raised never reached after_request
+    if g.get('trace') is not None:
+        tracer.finish(g.pop('trace'))
+
+def attach_trace(response, tree):
+    """Add the span tree to a JSON body and the stage timings as Server-Timing"""
+    response.headers['Server-Timing'] = ', '.join(
+        f"{child['name']};dur={child['duration_ms']}" for child in tree.get('children', []))
+    if response.is_json and not response.is_streamed:
+        body = response.get_json(silent=True)
+        if isinstance(body, dict):
+            body['trace'] = tree
+            response.set_data(app.json.dumps(body))
+
 # ==================== Basic Device Management ====================
 
 @app.route('/')
@@ -79,17 +435,13 @@ def index():
 def list_serial_ports():
     """List available serial ports"""
     result = execute_cli_command(['list'])
-    ports = []
-
-    if result['success']:
-        # Parse the output to extract port information
-        lines = result['stdout'].strip().split('\n')
-        for line in lines:
-            if '/dev/' in line or 'COM' in line:
-                ports.append({'device': line.strip()})
+    ports = list(result.get('data') or [])
+    seen = {port['device'] for port in ports}
 
     # Also get system ports
     for port in serial.tools.list_ports.comports():
+        if port.device in seen:
+            continue
         ports.append({
             'device': port.device,
             'description': port.description,
@@ -104,8 +456,8 @@ def get_device_type():
     data = request.json
     device = data.get('device', '/dev/ttyACM0')
 
-    result = execute_cli_command(['device', device, 'type'])
-    return jsonify(result)
+    result = cached_cli_command(['device', device, 'type'])
+    return cli_response(result)
 
 @app.route('/api/device/connect', methods=['POST'])
 def connect_device():
@@ -115,11 +467,17 @@ def connect_device():
     data = request.json
     device = data.get('device', '/dev/ttyACM0')
 
+    # A (re)connected device may not match what was cached for the port
+    yang_cache.invalidate(device)
+
     # Test connection by getting device type
-    result = execute_cli_command(['device', device, 'type'])
+    result = cached_cli_command(['device', device, 'type'])
 
     if result['success']:
         current_device = device
+        fleet.register(device, type=result['stdout'].strip(), name=data.get('name'))
+        if HISTORY_RECORD:
+            telemetry.retain(device, ['statistics'])
         return jsonify({
             'success': True,
             'device': device,
@@ -140,8 +498,8 @@ def get_yang_catalogs():
     data = request.json
     device = data.get('device', current_device or '/dev/ttyACM0')
 
-    result = execute_cli_command(['device', device, 'yang'])
-    return jsonify(result)
+    result = cached_cli_command(['device', device, 'yang'], use_cache=data.get('cache', True))
+    return cli_response(result)
 
 @app.route('/api/yang/get', methods=['POST'])
 def yang_get():
@@ -150,8 +508,32 @@ def yang_get():
     device = data.get('device', current_device or '/dev/ttyACM0')
     path = data.get('path', '/')
 
-    result = execute_cli_command(['device', device, 'get', path])
-    return jsonify(result)
+    result = cached_cli_command(['device', device, 'get', path], use_cache=data.get('cache', True))
+    if not result.get('success'):
+        return cli_response(result)
+
+    # Version the subtree so unchanged reads cost a 304 and changed ones a patch
+    content = result.get('data') if result.get('data') is not None else result.get('stdout')
+    tag = etag(content)
+    yang_versions.remember((device, path), tag, content)
+
+    if tag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        base = data.get('since')
+        previous = yang_versions.get((device, path), base) if base else None
+        if isinstance(content, (dict, list)) and isinstance(previous, (dict, list)):
+            response = cli_response({
+                'success': True,
+                'command': result.get('command'),
+                'base': base,
+                'etag': tag,
+                'patch': diff(previous, content)
+            })
+        else:
+            response = cli_response(dict(result, etag=tag))
+    response.set_etag(tag)
+    return response
 
 @app.route('/api/yang/set', methods=['POST'])
 def yang_set():
@@ -164,12 +546,12 @@ def yang_set():
     if not path or value is None:
         return jsonify({'success': False, 'error': 'Path and value required'})
 
-    # Convert value to JSON string if it's a dict/list
-    if isinstance(value, (dict, list)):
+    # Convert value to JSON text unless it is a string (true, not True)
+    if not isinstance(value, str):
         value = json.dumps(value)
 
     result = execute_cli_command(['device', device, 'set', path, value])
-    return jsonify(result)
+    return cli_response(result)
 
 @app.route('/api/yang/delete', methods=['POST'])
 def yang_delete():
@@ -182,7 +564,56 @@ def yang_delete():
         return jsonify({'success': False, 'error': 'Path required'})
 
     result = execute_cli_command(['device', device, 'delete', path])
-    return jsonify(result)
+    return cli_response(result)
+
+@app.route('/api/transaction/begin', methods=['POST'])
+def transaction_begin():
+    """Open a transaction on a device, optionally staging edits"""
+    data = request.json or {}
+    device = data.get('device', current_device or '/dev/ttyACM0')
+    tx = transactions.begin(device)
+    try:
+        transactions.stage(tx.id, data.get('edits', []))
+    except ValueError as e:
+        transactions.abort(tx.id)
+        return jsonify({'success': False, 'error': str(e)})
+    return jsonify({'success': True, 'transaction': tx.summary()})
+
+@app.route('/api/transaction/<tx_id>', methods=['GET', 'DELETE'])
+def transaction_status(tx_id):
+    """Get a transaction, or abort it while it is open"""
+    if request.method == 'DELETE':
+        tx = transactions.abort(tx_id)
+        if tx is None:
+            return jsonify({'success': False, 'error': f'No open transaction: {tx_id}'}), 404
+        return jsonify({'success': True, 'transaction': tx.summary()})
+    tx = transactions.get(tx_id)
+    if tx is None:
+        return jsonify({'success': False, 'error': f'Unknown transaction: {tx_id}'}), 404
+    return jsonify({'success': True, 'transaction': tx.summary()})
+
+@app.route('/api/transaction/<tx_id>/stage', methods=['POST'])
+def transaction_stage(tx_id):
+    """Stage one edit ({op, path, value}) or a list of them ({edits})"""
+    data = request.json
+    edits = data.get('edits') or [data] if isinstance(data, dict) else data
+    try:
+        tx = transactions.stage(tx_id, edits)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)})
+    if tx is None:
+        return jsonify({'success': False, 'error': f'No open transaction: {tx_id}'}), 404
+    return jsonify({'success': True, 'transaction': tx.summary()})
+
+@app.route('/api/transaction/<tx_id>/commit', methods=['POST'])
+def transaction_commit(tx_id):
+    """Apply all staged edits in one patch, rolling back on failure"""
+    data = request.json or {}
+    summary = transactions.commit(tx_id, rollback=data.get('rollback', True),
+                                  timeout=data.get('timeout', 60))
+    if summary is None:
+        return jsonify({'success': False, 'error': f'No open transaction: {tx_id}'}), 404
+    return jsonify(dict(summary, transaction=tx_id))
 
 @app.route('/api/yang/call', methods=['POST'])
 def yang_call_rpc():
@@ -199,7 +630,7 @@ def yang_call_rpc():
         value = json.dumps(value)
 
     result = execute_cli_command(['device', device, 'call', rpc_id, value])
-    return jsonify(result)
+    return cli_response(result)
 
 # ==================== Firmware Management ====================
 
@@ -210,7 +641,7 @@ def get_firmware_version():
     device = data.get('device', current_device or '/dev/ttyACM0')
 
     result = execute_cli_command(['device', device, 'firmware'])
-    return jsonify(result)
+    return cli_response(result)
 
 @app.route('/api/firmware/update', methods=['POST'])
 def update_firmware():
@@ -225,8 +656,16 @@ def update_firmware():
     if not os.path.exists(firmware_file):
         return jsonify({'success': False, 'error': 'Firmware file not found'})
 
-    result = execute_cli_command(['device', device, 'firmware', firmware_file], timeout=300)
-    return jsonify(result)
+    args = ['device', device, 'firmware', firmware_file]
+    if data.get('background'):
+        return job_response(start_cli_job(args, timeout=300, description='Firmware update'))
+    fmt = stream_format(request, data)
+    if fmt:
+        # An interrupted update must not be killed when the browser goes away
+        return stream_response(with_progress(stream_cli_command(args, timeout=300, kill_on_close=False)), fmt)
+
+    result = execute_cli_command(args, timeout=300)
+    return cli_response(result)
 
 # ==================== Patch and Fetch Operations ====================
 
@@ -247,7 +686,7 @@ def apply_patch():
 
     try:
         result = execute_cli_command(['device', device, 'patch', patch_file])
-        return jsonify(result)
+        return cli_response(result)
     finally:
         os.unlink(patch_file)
 
@@ -268,7 +707,7 @@ def fetch_data():
 
     try:
         result = execute_cli_command(['device', device, 'fetch', fetch_file])
-        return jsonify(result)
+        return cli_response(result)
     finally:
         os.unlink(fetch_file)
 
@@ -288,7 +727,7 @@ def send_coap():
         coap_args.append(payload)
 
     result = execute_cli_command(coap_args)
-    return jsonify(result)
+    return cli_response(result)
 
 @app.route('/api/mup/send', methods=['POST'])
 def send_mup():
@@ -301,7 +740,7 @@ def send_mup():
         return jsonify({'success': False, 'error': 'MUP1 message required'})
 
     result = execute_cli_command(['device', device, 'mup', message])
-    return jsonify(result)
+    return cli_response(result)
 
 # ==================== Import/Export ====================
 
@@ -312,7 +751,7 @@ def get_export_formats():
     device = data.get('device', current_device or '/dev/ttyACM0')
 
     result = execute_cli_command(['device', device, 'export'])
-    return jsonify(result)
+    return cli_response(result)
 
 @app.route('/api/import/formats', methods=['POST'])
 def get_import_formats():
@@ -321,7 +760,7 @@ def get_import_formats():
     device = data.get('device', current_device or '/dev/ttyACM0')
 
     result = execute_cli_command(['device', device, 'import'])
-    return jsonify(result)
+    return cli_response(result)
 
 @app.route('/api/export', methods=['POST'])
 def export_config():
@@ -332,7 +771,7 @@ def export_config():
     path = data.get('path', '/')
 
     result = execute_cli_command(['device', device, 'export', format_type, path])
-    return jsonify(result)
+    return cli_response(result)
 
 @app.route('/api/import', methods=['POST'])
 def import_config():
@@ -352,7 +791,7 @@ def import_config():
 
     try:
         result = execute_cli_command(['device', device, 'import', format_type, config_file])
-        return jsonify(result)
+        return cli_response(result)
     finally:
         os.unlink(config_file)
 
@@ -362,13 +801,13 @@ def import_config():
 def generate_key():
     """Generate DTLS key"""
     result = execute_cli_command(['key', 'generate'])
-    return jsonify(result)
+    return cli_response(result)
 
 @app.route('/api/key/list', methods=['GET'])
 def list_keys():
     """List available DTLS keys"""
     result = execute_cli_command(['key', 'list'])
-    return jsonify(result)
+    return cli_response(result)
 
 # ==================== TSN Specific Endpoints ====================
 
@@ -379,7 +818,7 @@ def get_tsn_interfaces():
     device = data.get('device', current_device or '/dev/ttyACM0')
 
     result = execute_cli_command(['device', device, 'get', '/ietf-interfaces:interfaces'])
-    return jsonify(result)
+    return cli_response(result)
 
 @app.route('/api/tsn/ptp/config', methods=['GET', 'POST'])
 def ptp_config():
@@ -392,7 +831,7 @@ def ptp_config():
         config = request.json.get('config', {})
         result = execute_cli_command(['device', device, 'set', '/ieee1588-ptp:ptp', json.dumps(config)])
 
-    return jsonify(result)
+    return cli_response(result)
 
 @app.route('/api/tsn/tas/schedule', methods=['GET', 'POST'])
 def tas_schedule():
@@ -402,10 +841,25 @@ def tas_schedule():
     if request.method == 'GET':
         result = execute_cli_command(['device', device, 'get', '/ieee802-dot1q-sched:sched'])
     else:
-        schedule = request.json.get('schedule', {})
+        schedule, validation = compile_schedule(request.json.get('schedule', {}),
+                                                merge_entries=request.json.get('merge', True))
+        if not validation['valid']:
+            # Rejected locally: a bad schedule never reaches the device
+            return jsonify({'success': False, 'error': '; '.join(validation['errors']),
+                            'validation': validation})
         result = execute_cli_command(['device', device, 'set', '/ieee802-dot1q-sched:sched', json.dumps(schedule)])
+        result['validation'] = validation
+
+    return cli_response(result)
 
-    return jsonify(result)
+@app.route('/api/tsn/tas/validate', methods=['POST'])
+def tas_validate():
+    """Check a TAS schedule and return it compiled, without touching the device"""
+    data = request.json
+    schedule, validation = compile_schedule(data.get('schedule', {}),
+                                            queues=data.get('queues', 8),
+                                            merge_entries=data.get('merge', True))
+    return jsonify({'success': validation['valid'], 'schedule': schedule, 'validation': validation})
 
 @app.route('/api/tsn/cbs/parameters', methods=['GET', 'POST'])
 def cbs_parameters():
@@ -416,9 +870,44 @@ def cbs_parameters():
         result = execute_cli_command(['device', device, 'get', '/ieee802-dot1q-stream-filters-gates:stream-filters-gates'])
     else:
         params = request.json.get('parameters', {})
+        if params.get('classes'):
+            # Derive slopes and credits for every class and admit them together
+            admission = cbs.calculate(params)
+            if not admission['valid']:
+                return jsonify({'success': False, 'error': '; '.join(admission['errors']),
+                                'admission': admission})
+            # Only the computed leaves of the selected class go to the device
+            wanted = [cls for cls in admission['classes']
+                      if cls['traffic_class'] == params.get('traffic_class')] or admission['classes'][:1]
+            params = cbs.device_parameters(wanted[0])
+        else:
+            admission = None
+            rate = params.get('linkSpeed', params.get('link_speed'))
+            errors = cbs.check_parameters(params.get('idleSlope'), params.get('sendSlope'),
+                                          params.get('hiCredit'), params.get('loCredit'), rate)
+            if errors:
+                return jsonify({'success': False, 'error': '; '.join(errors)})
+            # Same leaves (slopes in kbit/s) as the calculated branch writes
+            leaves = {
+                'idle-slope': params.get('idleSlope'),
+                'send-slope': params.get('sendSlope'),
+                'hi-credit': params.get('hiCredit'),
+                'lo-credit': params.get('loCredit')
+            }
+            params = {leaf: value for leaf, value in leaves.items() if value is not None}
+            if not params:
+                return jsonify({'success': False, 'error': 'No CBS parameters given'})
         result = execute_cli_command(['device', device, 'set', '/ieee802-dot1q-stream-filters-gates:stream-filters-gates', json.dumps(params)])
+        if admission:
+            result['admission'] = admission
 
-    return jsonify(result)
+    return cli_response(result)
+
+@app.route('/api/tsn/cbs/calculate', methods=['POST'])
+def cbs_calculate():
+    """CBS slopes, credits and latency bounds for a port's classes, without touching the device"""
+    admission = cbs.calculate(request.json or {})
+    return jsonify(dict(admission, success=admission['valid']))
 
 @app.route('/api/tsn/frer/config', methods=['GET', 'POST'])
 def frer_config():
@@ -431,7 +920,7 @@ def frer_config():
         config = request.json.get('config', {})
         result = execute_cli_command(['device', device, 'set', '/ieee802-dot1cb:frer', json.dumps(config)])
 
-    return jsonify(result)
+    return cli_response(result)
 
 @app.route('/api/tsn/statistics', methods=['POST'])
 def get_tsn_statistics():
@@ -446,16 +935,323 @@ def get_tsn_statistics():
     ]
 
     results = {}
-    for path in paths:
-        result = execute_cli_command(['device', device, 'get', path])
-        if result['success']:
-            results[path] = result['stdout']
+    coreconf = None
+    if CLI_TRANSPORT == 'mup1' and all(sid_map.instance_identifier(path) for path in paths):
+        try:
+            coreconf = get_coreconf_client(device)
+        except Exception as e:
+            logger.warning(f"CORECONF unavailable for {device}: {e}")
+
+    if coreconf:
+        # Both reads go out pipelined on the device link
+        for path, data in coreconf.fetch_many(paths).items():
+            if not isinstance(data, Exception):
+                results[path] = json.dumps(data, indent=2)
+                record_statistics(device, 'statistics', interface, flatten(data))
+    else:
+        for path in paths:
+            result = execute_cli_command(['device', device, 'get', path])
+            if result['success']:
+                results[path] = result['stdout']
+                if isinstance(result.get('data'), (dict, list)):
+                    record_statistics(device, 'statistics', interface, flatten(result['data']))
 
     return jsonify({
         'success': True,
         'statistics': results
     })
 
+# Subtrees holding the counters of every port
+STATISTICS_SUBTREES = ('/ietf-interfaces:interfaces', '/ieee802-dot1q-bridge:bridges')
+
+def fetch_subtrees(device, paths, timeout=30):
+    """({path: data}, round trips) reading several subtrees in as few trips as possible"""
+    if CLI_TRANSPORT == 'mup1' and all(sid_map.instance_identifier(path) for path in paths):
+        try:
+            # One CORECONF FETCH carries every path
+            data = get_coreconf_client(device).fetch(list(paths), timeout=timeout)
+            return {path: data.get(path) for path in paths}, 1
+        except Exception as e:
+            logger.warning(f"CORECONF fetch failed on {device}: {e}")
+
+    # One mvdct 'fetch' reads all paths in a single process and handshake
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.fetch', delete=False) as f:
+        yaml.safe_dump(list(paths), f)
+        fetch_file = f.name
+    try:
+        result = execute_cli_command(['device', device, 'fetch', fetch_file], timeout)
+    finally:
+        os.unlink(fetch_file)
+    if result['success']:
+        data = result.get('data')
+        found = fetch_instances(data if data is not None else parse_output(result['stdout']))
+        if any(path in found for path in paths):
+            return {path: found.get(path) for path in paths}, 1
+
+    # Counters are recorded as sampled now, so these reads bypass the read cache
+    subtrees = {}
+    for path in paths:
+        result = execute_cli_command(['device', device, 'get', path], timeout)
+        subtrees[path] = result.get('data') if result['success'] else None
+    return subtrees, 1 + len(paths)
+
+@app.route('/api/tsn/statistics/all', methods=['GET', 'POST'])
+def get_all_statistics():
+    """Counters of every port as one table keyed by port name"""
+    data = request.get_json(silent=True) or request.args
+    device = data.get('device', current_device or '/dev/ttyACM0')
+
+    started = time.time()
+    subtrees, round_trips = fetch_subtrees(device, STATISTICS_SUBTREES)
+    table = statistics_table(*(subtrees.get(path) for path in STATISTICS_SUBTREES))
+
+    now = time.time()
+    for name, row in table.items():
+        if 'counters' in row:
+            record_statistics(device, 'statistics', name, row['counters'], now)
+
+    return jsonify({
+        'success': bool(table),
+        'device': device,
+        'ports': table,
+        'error': None if table else 'No interface statistics returned',
+        'round_trips': round_trips,
+        'elapsed_ms': round((now - started) * 1000, 2)
+    })
+
+@app.route('/api/tsn/statistics/history', methods=['GET', 'POST'])
+def get_tsn_statistics_history():
+    """Counter history with per-second rates, optionally downsampled
+
+    since/until are epoch seconds, or seconds before now when negative;
+    step buckets the points into min/max/avg rates per step seconds.
+    """
+    data = request.get_json(silent=True) or request.args
+    device = data.get('device', current_device or '/dev/ttyACM0')
+    interface = data.get('interface', 'eth0')
+    counters = data.get('counters')
+    if isinstance(counters, str):
+        counters = counters.split(',')
+
+    try:
+        now = time.time()
+        since, until, step = (float(data[name]) if data.get(name) not in (None, '') else None
+                              for name in ('since', 'until', 'step'))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'since, until and step must be numbers'})
+    if since is not None and since < 0:
+        since += now
+    if until is not None and until < 0:
+        until += now
+
+    return jsonify({
+        'success': True,
+        'device': device,
+        'interface': interface,
+        'counters': statistics_history.counters(device, interface),
+        'series': statistics_history.query(device, interface, counters, since, until, step)
+    })
+
+@app.route('/api/tsn/ptp/analytics', methods=['GET', 'POST'])
+def get_ptp_analytics():
+    """Sync quality from the sampled offset-from-master and mean-path-delay
+
+    window limits the analysis to the last window seconds; interval changes
+    the ptp sample rate. The first request for a connected or registered
+    device starts sampling its ptp stream, which stops again once nobody has
+    asked for VELOCITYDRIVE_PTP_IDLE seconds.
+    """
+    data = request.get_json(silent=True) or request.args
+    device = data.get('device', current_device or '/dev/ttyACM0')
+    if device != current_device and device not in fleet.registered():
+        return jsonify({'success': False, 'error': f'Unknown device: {device}'}), 404
+
+    try:
+        window, threshold, interval = (float(data[name]) if data.get(name) not in (None, '') else None
+                                       for name in ('window', 'lock_threshold_ns', 'interval'))
+        if interval is not None:
+            telemetry.configure(device, intervals={'ptp': interval})
+    except (ValueError, TypeError) as e:
+        return jsonify({'success': False, 'error': f'Invalid analytics parameter: {e}'})
+    if ptp_analytics.watch(device):
+        telemetry.retain(device, ['ptp'])
+
+    return jsonify(dict(ptp_analytics.analyze(device, window, threshold), success=True))
+
+# ==================== Telemetry ====================
+
+@app.route('/api/telemetry/stream')
+def telemetry_stream():
+    """Push telemetry changes for a device (SSE by default)"""
+    device = request.args.get('device', current_device or '/dev/ttyACM0')
+    streams = request.args.get('streams')
+    streams = streams.split(',') if streams else None
+
+    try:
+        events = telemetry.watch(device, streams)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return stream_response(events, stream_format(request) or SSE)
+
+@app.route('/api/telemetry/config', methods=['POST'])
+def telemetry_config():
+    """Set telemetry sample intervals (seconds per stream) and interfaces"""
+    data = request.json
+    device = data.get('device', current_device or '/dev/ttyACM0')
+
+    try:
+        config = telemetry.configure(device, intervals=data.get('intervals'),
+                                     interfaces=data.get('interfaces'))
+    except (ValueError, TypeError) as e:
+        return jsonify({'success': False, 'error': str(e)})
+    return jsonify({'success': True, 'config': config})
+
+# ==================== Fleet Operations ====================
+
+# current-ds leaves reported per device by /api/fleet/ptp
+PTP_LEAVES = ('offset-from-master', 'mean-path-delay', 'steps-removed')
+
+def fleet_devices(data):
+    """Devices named in the request, or every registered device"""
+    devices = data.get('devices') or fleet.registered()
+    if isinstance(devices, str):
+        devices = devices.split(',')
+    return devices
+
+def ptp_number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+@app.route('/api/fleet')
+def fleet_status():
+    """Registered devices with their worker queues"""
+    return jsonify({'success': True, 'current_device': current_device, 'devices': fleet.status()})
+
+@app.route('/api/fleet/register', methods=['POST'])
+def fleet_register():
+    """Add a device to the fleet without making it the current device"""
+    data = request.json
+    device = data.get('device')
+    if not device:
+        return jsonify({'success': False, 'error': 'Device required'})
+    return jsonify({'success': True, 'device': fleet.register(device, name=data.get('name'))})
+
+@app.route('/api/fleet/unregister', methods=['POST'])
+def fleet_unregister():
+    """Remove a device from the fleet"""
+    device = request.json.get('device')
+    if not fleet.unregister(device):
+        return jsonify({'success': False, 'error': f'Unknown device: {device}'})
+    telemetry.release(device)
+    return jsonify({'success': True, 'device': device})
+
+@app.route('/api/fleet/get', methods=['POST'])
+def fleet_get():
+    """Read one YANG path from every device at once"""
+    data = request.json
+    path = data.get('path')
+    devices = fleet_devices(data)
+    if not path:
+        return jsonify({'success': False, 'error': 'Path required'})
+    if not devices:
+        return jsonify({'success': False, 'error': 'No devices registered'})
+
+    return jsonify(fleet.fan_out(devices, lambda device: ['device', device, 'get', path],
+                                 execute=cached_cli_command, timeout=data.get('timeout', 30)))
+
+@app.route('/api/fleet/command', methods=['POST'])
+def fleet_command():
+    """Run one device sub-command (e.g. 'type') on every device at once"""
+    data = request.json
+    command = data.get('command', '')
+    devices = fleet_devices(data)
+    if not command:
+        return jsonify({'success': False, 'error': 'No command provided'})
+    if not devices:
+        return jsonify({'success': False, 'error': 'No devices registered'})
+
+    import shlex
+    args = shlex.split(command)
+    return jsonify(fleet.fan_out(devices, lambda device: ['device', device] + args,
+                                 execute=execute_cli_command, timeout=data.get('timeout', 30)))
+
+@app.route('/api/fleet/ptp', methods=['POST'])
+def fleet_ptp():
+    """PTP current-ds of every device with the spread of their offsets"""
+    data = request.json or {}
+    devices = fleet_devices(data)
+    if not devices:
+        return jsonify({'success': False, 'error': 'No devices registered'})
+
+    path = TELEMETRY_STREAMS['ptp'][0]
+    response = fleet.fan_out(devices, lambda device: ['device', device, 'get', path],
+                             execute=execute_cli_command, timeout=data.get('timeout', 30))
+
+    table = {}
+    for device, result in response['results'].items():
+        row = {'success': result.get('success')}
+        if not result.get('success'):
+            row['error'] = result.get('error') or result.get('stderr') or 'Request failed'
+        if isinstance(result.get('data'), (dict, list)):
+            for leaf, value in flatten(result['data']).items():
+                name = leaf.rsplit('/', 1)[-1].split(':')[-1]
+                if name in PTP_LEAVES and name not in row:
+                    row[name] = ptp_number(value)
+        table[device] = row
+
+    offsets = [row['offset-from-master'] for row in table.values()
+               if row.get('offset-from-master') is not None]
+    response['results'] = table
+    response['summary'] = {
+        'devices': len(table),
+        'reporting': len(offsets),
+        'max_abs_offset': max((abs(offset) for offset in offsets), default=None),
+        'offset_spread': max(offsets) - min(offsets) if offsets else None
+    }
+    return jsonify(response)
+
+@app.route('/api/deploy', methods=['GET', 'POST'])
+def deploy_config():
+    """Apply one configuration or template to many devices"""
+    if request.method == 'GET':
+        return jsonify({'success': True, 'deployments': deploy_engine.list()})
+
+    data = request.json
+    content = data.get('data')
+    if not content:
+        return jsonify({'success': False, 'error': 'Configuration data required'})
+
+    try:
+        deployment = deploy_engine.start(
+            fleet_devices(data), content,
+            kind=data.get('kind', 'import'),
+            fmt=data.get('format', 'json'),
+            variables=data.get('variables'),
+            device_variables=data.get('device_variables'),
+            canary=data.get('canary', 0),
+            parallel=data.get('parallel'),
+            timeout=data.get('timeout', 60)
+        )
+    except (ValueError, TypeError) as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+    fmt = stream_format(request, data)
+    if fmt:
+        return stream_response(deployment.stream(), fmt)
+    return jsonify({'success': True, 'deployment': deployment.summary()}), 202
+
+@app.route('/api/deploy/<deploy_id>', methods=['GET', 'DELETE'])
+def deploy_status(deploy_id):
+    """Per-device progress of a deployment, or cancel its remaining devices"""
+    deployment = deploy_engine.get(deploy_id)
+    if deployment is None:
+        return jsonify({'success': False, 'error': f'Unknown deployment: {deploy_id}'}), 404
+    if request.method == 'DELETE':
+        return jsonify({'success': deploy_engine.cancel(deploy_id), 'deployment': deployment.summary()})
+    return jsonify({'success': True, 'deployment': deployment.summary()})
+
 # ==================== Advanced Operations ====================
 
 @app.route('/api/command/raw', methods=['POST'])
@@ -472,8 +1268,14 @@ def execute_raw_command():
     import shlex
     args = shlex.split(command)
 
+    if data.get('background'):
+        return job_response(start_cli_job(args, timeout=timeout))
+    fmt = stream_format(request, data)
+    if fmt:
+        return stream_response(stream_cli_command(args, timeout=timeout), fmt)
+
     result = execute_cli_command(args, timeout=timeout)
-    return jsonify(result)
+    return cli_response(result)
 
 @app.route('/api/log/config', methods=['POST'])
 def configure_logging():
@@ -504,24 +1306,78 @@ def execute_batch():
     data = request.json
     commands = data.get('commands', [])
     device = data.get('device', current_device or '/dev/ttyACM0')
+    mode = data.get('mode', 'ordered')
+    timeout = data.get('timeout', 30)
 
-    results = []
+    if mode not in BATCH_MODES:
+        return jsonify({'success': False, 'error': f'Mode must be one of: {", ".join(BATCH_MODES)}'})
+
+    batch_args = []
     for cmd in commands:
         if isinstance(cmd, str):
-            args = ['device', device] + cmd.split()
+            batch_args.append(['device', device] + cmd.split())
         else:
-            args = ['device', device] + cmd
-
-        result = execute_cli_command(args)
-        results.append({
-            'command': ' '.join(args),
-            'result': result
-        })
-
-    return jsonify({
-        'success': True,
-        'results': results
-    })
+            batch_args.append(['device', device] + cmd)
+
+    fmt = stream_format(request, data)
+    if fmt:
+        return stream_response(stream_batch(batch_args, mode, timeout), fmt)
+
+    return jsonify(batch_engine.run(batch_args, mode=mode, timeout=timeout))
+
+def stream_batch(batch_args, mode, timeout):
+    """Batch results as events, each sent as soon as it completes"""
+    started = time.time()
+    success = True
+    for item in batch_engine.run_iter(batch_args, mode=mode, timeout=timeout):
+        if mode == STOP_ON_ERROR and not item['result'].get('success'):
+            success = False
+        yield dict(item, type='result')
+    yield {'type': 'done', 'success': success, 'mode': mode,
+           'elapsed_ms': round((time.time() - started) * 1000, 2)}
+
+@app.route('/api/jobs')
+def list_jobs():
+    """Background jobs, without their results"""
+    return jsonify({'success': True, 'jobs': device_core.list_jobs()})
+
+@app.route('/api/jobs/<job_id>', methods=['GET', 'DELETE'])
+def job_status(job_id):
+    """Get a background job's state and result, or cancel it"""
+    if device_core.job(job_id) is None:
+        return jsonify({'success': False, 'error': f'Unknown job: {job_id}'}), 404
+    if request.method == 'DELETE':
+        cancelled = device_core.cancel_job(job_id)
+        return jsonify({'success': cancelled, 'job': device_core.job(job_id)})
+    return jsonify({'success': True, 'job': device_core.job(job_id)})
+
+@app.route('/api/simulator', methods=['GET', 'POST'])
+def simulator_config():
+    """Simulated device state, or change its latency_ms, jitter_ms, error_rate
+    and bandwidth (bytes/s), for all operations or one 'operation'"""
+    if request.method == 'POST':
+        data = dict(request.json or {})
+        try:
+            device_simulator.configure(data.pop('operation', None), **data)
+        except (ValueError, TypeError) as e:
+            return jsonify({'success': False, 'error': str(e)})
+    return jsonify(dict(device_simulator.status(), success=True, active=CLI_TRANSPORT == 'sim'))
+
+@app.route('/api/capture', methods=['GET', 'POST'])
+def capture_config():
+    """Capture log status, or start ('enabled': true, optional 'file' name in
+    VELOCITYDRIVE_CAPTURE_DIR) and stop recording device commands"""
+    if request.method == 'POST':
+        data = request.json or {}
+        try:
+            if data.get('enabled', True):
+                capture.start(capture_path(data.get('file')))
+            else:
+                capture.stop()
+        except (ValueError, OSError) as e:
+            return jsonify({'success': False, 'error': str(e)})
+    return jsonify(dict(capture.status(), success=True,
+                        replay=replay_transport.status() if replay_transport else None))
 
 @app.route('/api/health')
 def health_check():
@@ -531,9 +1387,29 @@ def health_check():
         'timestamp': datetime.now().isoformat(),
         'cli_path': CLI_PATH,
         'cli_exists': os.path.exists(CLI_PATH),
-        'current_device': current_device
+        'current_device': current_device,
+        'transport': CLI_TRANSPORT,
+        'cli_sessions': cli_pool.status(),
+        'device_core': device_core.status(),
+        'fleet': fleet.status(),
+        'transactions': transactions.status(),
+        'mup1_links': [link.status() for link in mup1_links.values()],
+        'cache': yang_cache.stats(),
+        'coalescing': read_flight.stats(),
+        'telemetry': telemetry.status(),
+        'history': statistics_history.status(),
+        'ptp_analytics': ptp_analytics.status(),
+        'metrics': metrics.summary(),
+        'tracing': tracer.status(),
+        'capture': capture.status(),
+        'replay': replay_transport.status() if replay_transport else None
     })
 
+@app.route('/api/metrics')
+def get_metrics():
+    """Counters and latency histograms in the Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/capabilities')
 def get_capabilities():
     """Get all supported CLI capabilities"""
@@ -561,5 +1437,16 @@ def get_capabilities():
         ]
     })
 
+def close_device_links():
+    """Release CLI sessions and MUP1 links on shutdown"""
+    telemetry.stop()
+    statistics_history.close()
+    device_core.close()
+    fleet.close()
+    cli_pool.close()
+    capture.stop()
+    for link in list(mup1_links.values()):
+        link.close()
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8080, debug=True)
\ No newline at end of file
+    serve.run(app, host='0.0.0.0', port=8080, on_shutdown=[close_device_links])
\ No newline at end of file
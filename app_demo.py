@@ -17,7 +17,10 @@ import time
 import logging
 from datetime import datetime
 import tempfile
-import random
+from cli_pool import CliSessionPool
+from fleet import DeviceRegistry
+from simulator import DeviceSimulator
+import serve
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -29,225 +32,17 @@ CORS(app)
 # CLI tool path
 CLI_PATH = "/home/kim/Downloads/Microchip_VelocityDRIVE_CT-CLI-linux-2025.07.12/mvdct.cli"
 
+# Command transport: 'subprocess' starts mvdct for every request,
+# 'pool' keeps one interactive CLI session open per device
+CLI_TRANSPORT = os.environ.get('VELOCITYDRIVE_TRANSPORT', 'subprocess')
+
 # Demo mode settings
 DEMO_MODE = True
 current_device = None
 demo_connected = False
 
-def generate_demo_response(command_type, success=True):
-    """Generate realistic demo responses"""
-
-    demo_responses = {
-        'device_type': {
-            'success': True,
-            'stdout': 'Microchip LAN9662 VelocityDRIVE Evaluation Board',
-            'stderr': '',
-            'command': 'demo command'
-        },
-        'yang_get_system': {
-            'success': True,
-            'stdout': '''{
-    "ietf-system:system-state": {
-        "platform": {
-            "os-name": "VelocityDRIVE",
-            "os-release": "2025.07.12",
-            "machine": "LAN9662",
-            "processor": "ARM Cortex-A7"
-        },
-        "clock": {
-            "current-datetime": "2025-09-15T12:00:00Z",
-            "boot-datetime": "2025-09-15T10:00:00Z"
-        }
-    }
-}''',
-            'stderr': '',
-            'command': 'demo command'
-        },
-        'interfaces': {
-            'success': True,
-            'stdout': '''{
-    "ietf-interfaces:interfaces": {
-        "interface": [
-            {
-                "name": "eth0",
-                "type": "iana-if-type:ethernetCsmacd",
-                "enabled": true,
-                "oper-status": "up",
-                "speed": 1000000000,
-                "mtu": 1500
-            },
-            {
-                "name": "eth1",
-                "type": "iana-if-type:ethernetCsmacd",
-                "enabled": true,
-                "oper-status": "up",
-                "speed": 1000000000,
-                "mtu": 1500
-            },
-            {
-                "name": "eth2",
-                "type": "iana-if-type:ethernetCsmacd",
-                "enabled": false,
-                "oper-status": "down",
-                "speed": 1000000000,
-                "mtu": 1500
-            }
-        ]
-    }
-}''',
-            'stderr': '',
-            'command': 'demo command'
-        },
-        'ptp_status': {
-            'success': True,
-            'stdout': '''{
-    "ieee1588-ptp:ptp": {
-        "instance-list": {
-            "instance": [
-                {
-                    "instance-index": 0,
-                    "default-ds": {
-                        "clock-identity": "00:04:A3:FF:FE:12:34:56",
-                        "clock-quality": {
-                            "clock-class": 248,
-                            "clock-accuracy": "0x21",
-                            "offset-scaled-log-variance": 17258
-                        },
-                        "priority1": 128,
-                        "priority2": 128,
-                        "domain-number": 0,
-                        "slave-only": false,
-                        "two-step-flag": true
-                    },
-                    "current-ds": {
-                        "steps-removed": 0,
-                        "offset-from-master": 125,
-                        "mean-path-delay": 250
-                    },
-                    "port-ds-list": {
-                        "port-ds": [
-                            {
-                                "port-number": 1,
-                                "port-state": "master",
-                                "log-min-delay-req-interval": 0,
-                                "peer-mean-path-delay": 0,
-                                "log-announce-interval": 1,
-                                "announce-receipt-timeout": 3,
-                                "log-sync-interval": 0,
-                                "delay-mechanism": "E2E",
-                                "log-min-pdelay-req-interval": 0,
-                                "version-number": 2
-                            }
-                        ]
-                    }
-                }
-            ]
-        }
-    }
-}''',
-            'stderr': '',
-            'command': 'demo command'
-        },
-        'statistics': {
-            'success': True,
-            'stdout': '''{
-    "ietf-interfaces:interfaces": {
-        "interface": [
-            {
-                "name": "eth0",
-                "statistics": {
-                    "in-octets": ''' + str(random.randint(1000000, 9999999)) + ''',
-                    "in-unicast-pkts": ''' + str(random.randint(10000, 99999)) + ''',
-                    "in-discards": ''' + str(random.randint(0, 100)) + ''',
-                    "in-errors": ''' + str(random.randint(0, 10)) + ''',
-                    "out-octets": ''' + str(random.randint(1000000, 9999999)) + ''',
-                    "out-unicast-pkts": ''' + str(random.randint(10000, 99999)) + ''',
-                    "out-discards": ''' + str(random.randint(0, 50)) + ''',
-                    "out-errors": ''' + str(random.randint(0, 5)) + '''
-                }
-            }
-        ]
-    }
-}''',
-            'stderr': '',
-            'command': 'demo command'
-        },
-        'firmware_version': {
-            'success': True,
-            'stdout': 'VelocityDRIVE Firmware v2025.07.12-release\nBuild: Jul 12 2025 14:30:00\nBootloader: v1.2.3',
-            'stderr': '',
-            'command': 'demo command'
-        },
-        'yang_catalogs': {
-            'success': True,
-            'stdout': '''Available YANG modules:
-- ietf-system
-- ietf-interfaces
-- ieee1588-ptp
-- ieee802-dot1q-sched
-- ieee802-dot1q-stream-filters-gates
-- ieee802-dot1cb-frer
-- microchip-lan966x''',
-            'stderr': '',
-            'command': 'demo command'
-        },
-        'success_operation': {
-            'success': True,
-            'stdout': 'Operation completed successfully',
-            'stderr': '',
-            'command': 'demo command'
-        },
-        'error_operation': {
-            'success': False,
-            'stdout': '',
-            'stderr': 'Demo error: Operation failed for demonstration',
-            'command': 'demo command'
-        }
-    }
-
-    if not success:
-        return demo_responses.get('error_operation', demo_responses['success_operation'])
-
-    return demo_responses.get(command_type, demo_responses['success_operation'])
-
-def execute_cli_command(args, timeout=30, demo_mode_override=None):
-    """Execute CLI command or return demo response"""
-    global demo_connected
-
-    # Check if we should use demo mode
-    use_demo = DEMO_MODE if demo_mode_override is None else demo_mode_override
-
-    if use_demo:
-        # Parse command to determine demo response type
-        command_str = ' '.join(args)
-
-        if 'list' in command_str:
-            return {
-                'success': True,
-                'stdout': '/dev/ttyACM0 - Demo VelocityDRIVE Device\n/dev/ttyUSB0 - Demo Serial Port\n192.168.1.100 - Demo Network Device',
-                'stderr': '',
-                'command': command_str
-            }
-        elif 'type' in command_str:
-            return generate_demo_response('device_type')
-        elif 'get /ietf-system' in command_str:
-            return generate_demo_response('yang_get_system')
-        elif 'get /ietf-interfaces' in command_str:
-            return generate_demo_response('interfaces')
-        elif 'get /ieee1588-ptp' in command_str:
-            return generate_demo_response('ptp_status')
-        elif 'statistics' in command_str:
-            return generate_demo_response('statistics')
-        elif 'firmware' in command_str and len(args) == 3:
-            return generate_demo_response('firmware_version')
-        elif 'yang' in command_str:
-            return generate_demo_response('yang_catalogs')
-        elif 'set' in command_str or 'delete' in command_str or 'call' in command_str:
-            return generate_demo_response('success_operation')
-        else:
-            return generate_demo_response('success_operation')
-
-    # Real CLI execution (for when hardware is connected)
+def run_cli_subprocess(args, timeout=30):
+    """Execute mvdct CLI command in a new process"""
     try:
         cmd = [CLI_PATH] + args
         logger.info(f"Executing: {' '.join(cmd)}")
@@ -279,6 +74,33 @@ def execute_cli_command(args, timeout=30, demo_mode_override=None):
             'command': ' '.join(args)
         }
 
+cli_pool = CliSessionPool(CLI_PATH, fallback=run_cli_subprocess)
+
+# Simulated boards answering demo mode commands; commands they do not model
+# still succeed so every GUI action can be shown
+simulator = DeviceSimulator(permissive=True)
+
+def execute_cli_command(args, timeout=30, demo_mode_override=None):
+    """Execute CLI command or return demo response"""
+    # Check if we should use demo mode
+    use_demo = DEMO_MODE if demo_mode_override is None else demo_mode_override
+
+    # Commands for one device run in order on that device's worker
+    return fleet.run(args, timeout, demo_cli_command if use_demo else run_on_transport)
+
+def demo_cli_command(args, timeout=30):
+    """Simulated response for a CLI command"""
+    return simulator.execute(args, timeout)
+
+def run_on_transport(args, timeout=30):
+    """Real CLI execution (for when hardware is connected)"""
+    if CLI_TRANSPORT == 'pool':
+        return cli_pool.execute(args, timeout=timeout)
+    return run_cli_subprocess(args, timeout)
+
+# Connected boards; each device's commands run in order on its own worker
+fleet = DeviceRegistry(run_on_transport)
+
 # ==================== Routes ====================
 
 @app.route('/')
@@ -339,6 +161,7 @@ def connect_device():
     if DEMO_MODE:
         current_device = device
         demo_connected = True
+        fleet.register(device, type='Microchip LAN9662 VelocityDRIVE (Demo Mode)', name=data.get('name'))
         return jsonify({
             'success': True,
             'device': device,
@@ -351,6 +174,7 @@ def connect_device():
 
     if result['success']:
         current_device = device
+        fleet.register(device, type=result['stdout'].strip(), name=data.get('name'))
         return jsonify({
             'success': True,
             'device': device,
@@ -405,7 +229,7 @@ def yang_set():
     if not path or value is None:
         return jsonify({'success': False, 'error': 'Path and value required'})
 
-    if isinstance(value, (dict, list)):
+    if not isinstance(value, str):
         value = json.dumps(value)
 
     result = execute_cli_command(['device', device, 'set', path, value])
@@ -484,6 +308,24 @@ def execute_raw_command():
     result = execute_cli_command(args, timeout=timeout)
     return jsonify(result)
 
+# ==================== Fleet Operations ====================
+
+@app.route('/api/fleet')
+def fleet_status():
+    """Registered devices with their worker queues"""
+    return jsonify({'success': True, 'current_device': current_device, 'devices': fleet.status()})
+
+@app.route('/api/fleet/ptp', methods=['POST'])
+def fleet_ptp():
+    """PTP status of every registered (or listed) device at once"""
+    data = request.json or {}
+    devices = data.get('devices') or fleet.registered()
+    if not devices:
+        return jsonify({'success': False, 'error': 'No devices registered'})
+
+    return jsonify(fleet.fan_out(devices, lambda device: ['device', device, 'get', '/ieee1588-ptp:ptp'],
+                                 execute=execute_cli_command))
+
 @app.route('/api/health')
 def health_check():
     """Health check endpoint"""
@@ -494,7 +336,11 @@ def health_check():
         'cli_exists': os.path.exists(CLI_PATH),
         'current_device': current_device,
         'demo_mode': DEMO_MODE,
-        'demo_connected': demo_connected
+        'demo_connected': demo_connected,
+        'transport': CLI_TRANSPORT,
+        'cli_sessions': cli_pool.status(),
+        'fleet': fleet.status(),
+        'simulator': simulator.status()
     })
 
 @app.route('/api/capabilities')
@@ -518,4 +364,4 @@ if __name__ == '__main__':
     if DEMO_MODE:
         print("💡 No hardware required - using simulated responses")
 
-    app.run(host='0.0.0.0', port=8080, debug=True)
\ No newline at end of file
+    serve.run(app, host='0.0.0.0', port=8080, on_shutdown=[fleet.close, cli_pool.close])
\ No newline at end of file
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+VelocityDRIVE Touch GUI - Async device execution core
+Runs CLI processes on one asyncio event loop in a background thread, with
+per-request deadlines, cancellation and a bound on concurrent and queued
+work. Synchronous code uses execute(); long operations can be started as
+jobs that no request thread waits on. The loop thread starts on first use
+and again in a forked child, which does not inherit it.
+"""
+
+import asyncio
+import contextvars
+import functools
+import itertools
+import os
+import signal
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Device processes running at the same time
+ASYNC_MAX_PROCESSES = int(os.environ.get('VELOCITYDRIVE_ASYNC_PROCESSES', '8'))
+# Requests allowed to wait for a process slot before new ones are refused
+ASYNC_MAX_PENDING = int(os.environ.get('VELOCITYDRIVE_ASYNC_PENDING', '64'))
+# Finished jobs kept for status queries
+JOB_HISTORY = 100
+
+
+class DeviceCore:
+    """Event loop thread that owns all device processes"""
+
+    def __init__(self, cli_path, max_processes=ASYNC_MAX_PROCESSES, max_pending=ASYNC_MAX_PENDING):
+        self.cli_path = cli_path
+        self.max_processes = max_processes
+        self.max_pending = max_pending
+        self.loop = None
+        self.thread = None
+        self.slots = None
+        self.pending = 0
+        self.running = 0
+        self.rejected = 0
+        self.jobs = {}
+        # Job id -> process futures started by a job with its own execute()
+        self.processes = {}
+        self.job_ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.loop_lock = threading.Lock()
+        # The job whose execute() is running in this context, if any
+        self.current_job = contextvars.ContextVar('device_core_job', default=None)
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # The child has the parent's loop but not the thread running it
+        self.loop = None
+        self.thread = None
+        self.pending = 0
+        self.running = 0
+        self.jobs = {}
+        self.processes = {}
+        self.lock = threading.Lock()
+        self.loop_lock = threading.Lock()
+
+    def _loop(self):
+        """The event loop, started on first use"""
+        with self.loop_lock:
+            if self.thread is None:
+                loop = asyncio.new_event_loop()
+                self.slots = None
+                self.thread = threading.Thread(target=self._run_loop, args=(loop,),
+                                               name='device-core', daemon=True)
+                self.loop = loop
+                self.thread.start()
+            return self.loop
+
+    def _run_loop(self, loop):
+        asyncio.set_event_loop(loop)
+        self.slots = asyncio.Semaphore(self.max_processes)
+        loop.run_forever()
+
+    async def run(self, args, timeout=30, deadline=None):
+        """Run a CLI command; awaitable from code running on this loop"""
+        command = ' '.join([self.cli_path] + args)
+        if deadline is None:
+            deadline = time.time() + timeout
+
+        if self.slots.locked():
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                return {'success': False, 'error': 'Device core busy, try again later',
+                        'busy': True, 'command': command}
+            self.pending += 1
+            try:
+                await asyncio.wait_for(self.slots.acquire(), max(deadline - time.time(), 0))
+            except asyncio.TimeoutError:
+                return {'success': False, 'error': 'Deadline passed while queued', 'command': command}
+            finally:
+                self.pending -= 1
+        else:
+            await self.slots.acquire()
+
+        self.running += 1
+        process = None
+        try:
+            logger.info(f"Executing: {command}")
+            process = await asyncio.create_subprocess_exec(
+                self.cli_path, *args,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                start_new_session=True
+            )
+            stdout, stderr = await asyncio.wait_for(process.communicate(),
+                                                    max(deadline - time.time(), 0))
+            return {
+                'success': process.returncode == 0,
+                'stdout': stdout.decode('utf-8', 'replace'),
+                'stderr': stderr.decode('utf-8', 'replace'),
+                'command': command,
+                'returncode': process.returncode
+            }
+        except asyncio.TimeoutError:
+            return {'success': False, 'error': f'Command timeout after {timeout}s', 'command': command}
+        except asyncio.CancelledError:
+            logger.info(f"Cancelled: {command}")
+            raise
+        except Exception as e:
+            return {'success': False, 'error': str(e), 'command': command}
+        finally:
+            if process and process.returncode is None:
+                # Kill the whole group so no child keeps the output pipes open
+                try:
+                    os.killpg(process.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                await process.wait()
+            self.running -= 1
+            self.slots.release()
+
+    def submit(self, args, timeout=30, deadline=None):
+        """Schedule a command from another thread; returns a concurrent Future"""
+        return asyncio.run_coroutine_threadsafe(self.run(args, timeout, deadline), self._loop())
+
+    def execute(self, args, timeout=30):
+        """Blocking bridge for synchronous callers
+
+        Called from a job's execute(), the process is killed when the job
+        is cancelled, and not started once it has been.
+        """
+        job = self.current_job.get()
+        if job is not None:
+            with self.lock:
+                if job.get('cancel_requested'):
+                    return {'success': False, 'error': 'Job cancelled', 'command': ' '.join(args)}
+                future = self.submit(args, timeout)
+                self.processes.setdefault(job['id'], []).append(future)
+        else:
+            future = self.submit(args, timeout)
+        try:
+            # The coroutine enforces the deadline; the margin covers process teardown
+            return future.result(timeout + 5)
+        except Exception as e:
+            future.cancel()
+            if future.cancelled() and job is not None:
+                return {'success': False, 'error': 'Job cancelled', 'command': ' '.join(args)}
+            return {'success': False, 'error': f'Command failed: {e!r}', 'command': ' '.join(args)}
+
+    def in_job(self):
+        """True when called from a job's execute()"""
+        return self.current_job.get() is not None
+
+    # ---- Jobs: commands that run without a request thread waiting ----
+
+    async def _call(self, job, execute, args, timeout):
+        # Transports without an asyncio implementation run on the loop's
+        # executor, in a context that lets execute() find the job
+        context = contextvars.copy_context()
+        context.run(self.current_job.set, job)
+        return await self._loop().run_in_executor(None, functools.partial(context.run, execute, args, timeout))
+
+    def start_job(self, args, timeout=30, description=None, execute=None, done=None):
+        """Start a command in the background and return its job id
+
+        execute(args, timeout) replaces the built-in process runner, and
+        done(result) is called with the result before the job is marked finished.
+        Processes execute() starts through execute() on this core can be
+        killed by cancel_job; anything else it does runs to completion.
+        """
+        job_id = str(next(self.job_ids))
+        job = {
+            'id': job_id,
+            'command': ' '.join(args),
+            'description': description,
+            'state': 'running',
+            'started': time.time(),
+            'result': None
+        }
+        if execute:
+            with self.lock:
+                self.processes[job_id] = []
+            future = asyncio.run_coroutine_threadsafe(self._call(job, execute, args, timeout), self._loop())
+        else:
+            future = self.submit(args, timeout)
+        with self.lock:
+            self.jobs[job_id] = (job, future)
+            self._trim_jobs()
+        future.add_done_callback(lambda f: self._finish_job(job, f, done))
+        logger.info(f"Started job {job_id}: {job['command']}")
+        return job_id
+
+    def _finish_job(self, job, future, done=None):
+        if future.cancelled():
+            state, result = 'cancelled', None
+        elif future.exception():
+            state, result = 'failed', {'success': False, 'error': str(future.exception())}
+        else:
+            result = future.result()
+            if result.get('success'):
+                state = 'done'
+            else:
+                state = 'cancelled' if job.get('cancel_requested') else 'failed'
+        if done:
+            try:
+                done(result)
+            except Exception as e:
+                logger.error(f"Job {job['id']} completion handler failed: {e}")
+        with self.lock:
+            job.update({'state': state, 'result': result, 'finished': time.time()})
+            self.processes.pop(job['id'], None)
+
+    def _trim_jobs(self):
+        # Called with lock held; drop the oldest finished jobs
+        finished = [job_id for job_id, (job, _) in self.jobs.items() if 'finished' in job]
+        for job_id in finished[:max(len(self.jobs) - JOB_HISTORY, 0)]:
+            del self.jobs[job_id]
+
+    def job(self, job_id):
+        with self.lock:
+            entry = self.jobs.get(job_id)
+            return dict(entry[0]) if entry else None
+
+    def cancel_job(self, job_id):
+        """Cancel a running job
+
+        A process job is killed and ends 'cancelled'. A job with its own
+        execute() becomes 'cancel_requested': processes it runs on this core
+        are killed, but other work (e.g. a pool session command) finishes,
+        and the job ends 'cancelled' only if its command did not succeed.
+        """
+        with self.lock:
+            entry = self.jobs.get(job_id)
+            if not entry or entry[0]['state'] not in ('running', 'cancel_requested'):
+                return False
+            job, future = entry
+            processes = self.processes.get(job_id)
+            if processes is not None:
+                job.update({'state': 'cancel_requested', 'cancel_requested': True})
+                processes = list(processes)
+        if processes is None:
+            return future.cancel()
+        for process in processes:
+            process.cancel()
+        return True
+
+    def list_jobs(self):
+        with self.lock:
+            return [dict(job, result=None) for job, _ in self.jobs.values()]
+
+    def close(self):
+        for job_id in list(self.jobs):
+            self.cancel_job(job_id)
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def status(self):
+        return {
+            'running': self.running,
+            'pending': self.pending,
+            'rejected': self.rejected,
+            'max_processes': self.max_processes,
+            'max_pending': self.max_pending,
+            'jobs': sum(1 for job in self.list_jobs() if 'finished' not in job)
+        }
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+VelocityDRIVE Touch GUI - Batch execution engine
+Runs independent reads in parallel on a bounded worker pool while writes
+to a device are serialized, with selectable result ordering
+"""
+
+import contextvars
+import os
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+logger = logging.getLogger(__name__)
+
+BATCH_WORKERS = int(os.environ.get('VELOCITYDRIVE_BATCH_WORKERS', '4'))
+
+# Result ordering modes
+ORDERED = 'ordered'
+UNORDERED = 'unordered'
+STOP_ON_ERROR = 'stop_on_error'
+MODES = (ORDERED, UNORDERED, STOP_ON_ERROR)
+
+# Sub-commands that only read from the device
+READ_COMMANDS = {'get', 'type', 'yang', 'fetch', 'export', 'get-capabilities'}
+
+
+def is_read_command(args):
+    """True if a 'device <dev> ...' command does not change device state"""
+    if len(args) < 3 or args[0] != 'device':
+        return False
+    command = args[2]
+    if command in READ_COMMANDS:
+        return True
+    if command == 'firmware':
+        return len(args) == 3
+    if command == 'import':
+        return len(args) == 3
+    if command == 'coap':
+        return len(args) > 3 and args[3].upper() in ('GET', 'FETCH')
+    return False
+
+
+class BatchEngine:
+    """Executes command lists on a shared, bounded worker pool"""
+
+    def __init__(self, execute, max_workers=BATCH_WORKERS):
+        self.execute = execute
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix='batch')
+        self.device_locks = {}
+        self.locks_lock = threading.Lock()
+
+    def device_lock(self, device):
+        with self.locks_lock:
+            return self.device_locks.setdefault(device, threading.Lock())
+
+    def _run_one(self, index, args, write, timeout, queued_at):
+        started = time.time()
+        if write:
+            # Writes to one device never overlap, even across batches
+            with self.device_lock(args[1] if len(args) > 1 else None):
+                started = time.time()
+                result = self.execute(args, timeout=timeout)
+        else:
+            result = self.execute(args, timeout=timeout)
+        finished = time.time()
+
+        return {
+            'index': index,
+            'command': ' '.join(args),
+            'result': result,
+            'timing': {
+                'wait_ms': round((started - queued_at) * 1000, 2),
+                'duration_ms': round((finished - started) * 1000, 2)
+            }
+        }
+
+    def _skipped(self, index, args):
+        return {
+            'index': index,
+            'command': ' '.join(args),
+            'result': {'success': False, 'error': 'Skipped after earlier error'},
+            'skipped': True
+        }
+
+    def run_iter(self, commands, mode=ORDERED, timeout=30):
+        """Yield one result dict per command as results become available
+
+        Consecutive reads run in parallel; each write runs on its own after
+        everything before it, so later reads see its effect.
+        """
+        if mode not in MODES:
+            raise ValueError(f'Unknown batch mode: {mode}')
+
+        groups = []
+        for index, args in enumerate(commands):
+            write = not is_read_command(args)
+            if write or not groups or groups[-1][0][2]:
+                groups.append([])
+            groups[-1].append((index, args, write))
+
+        failed = False
+        for group in groups:
+            if failed and mode == STOP_ON_ERROR:
+                for index, args, _ in group:
+                    yield self._skipped(index, args)
+                continue
+
+            queued_at = time.time()
+            # Each command runs in a copy of the caller's context, so its
+            # trace spans land in the request's trace
+            futures = [(self.executor.submit(contextvars.copy_context().run, self._run_one, index, args,
+                                             write, timeout, queued_at), index, args)
+                       for index, args, write in group]
+
+            if mode == UNORDERED:
+                order = as_completed([f for f, _, _ in futures])
+                lookup = {f: (index, args) for f, index, args in futures}
+                pending = ((f, *lookup[f]) for f in order)
+            else:
+                pending = iter(futures)
+
+            for future, index, args in pending:
+                if failed and mode == STOP_ON_ERROR and future.cancel():
+                    yield self._skipped(index, args)
+                    continue
+                item = future.result()
+                if not item['result'].get('success'):
+                    failed = True
+                yield item
+
+    def run(self, commands, mode=ORDERED, timeout=30):
+        """Run a batch and return all results with overall timing"""
+        started = time.time()
+        results = list(self.run_iter(commands, mode=mode, timeout=timeout))
+        return {
+            'success': not (mode == STOP_ON_ERROR and
+                            any(not r['result'].get('success') for r in results)),
+            'mode': mode,
+            'results': results,
+            'elapsed_ms': round((time.time() - started) * 1000, 2)
+        }
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+VelocityDRIVE Touch GUI - Load and latency benchmark
+Sends requests to app_complete.py endpoints at a fixed concurrency, either
+in-process through the Flask test client with a simulated device or over
+HTTP to a running server, and reports latency percentiles and throughput
+per endpoint as JSON that later runs can be compared against
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+DEVICE = '/dev/ttyACM0'
+
+# Name -> (method, path, JSON body builder taking the options)
+ENDPOINTS = {
+    'yang_get': ('POST', '/api/yang/get', lambda options: {
+        'device': options.device, 'path': '/ietf-interfaces:interfaces', 'cache': not options.no_cache}),
+    'batch': ('POST', '/api/batch', lambda options: {
+        'device': options.device, 'mode': 'unordered', 'commands': [
+            'get /ietf-system:system-state',
+            'get /ietf-interfaces:interfaces',
+            'get /ieee1588-ptp:ptp']}),
+    'tsn_statistics': ('POST', '/api/tsn/statistics', lambda options: {'device': options.device}),
+    'list_ports': ('GET', '/api/list-ports', lambda options: None),
+}
+
+
+def percentile(ordered, q):
+    """q-th percentile (0-100) of a sorted list, interpolating between ranks"""
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def succeeded(status, body):
+    if status >= 400:
+        return False
+    return not (isinstance(body, dict) and body.get('success') is False)
+
+
+class InProcessClient:
+    """Requests through the Flask test client, one client per thread"""
+
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+
+    def request(self, method, path, body):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body)
+        return response.status_code, response.get_json(silent=True)
+
+
+class HttpClient:
+    """Requests to a running server"""
+
+    def __init__(self, url, timeout=60):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def request(self, method, path, body):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.url + path, data=data, method=method,
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                status, payload = response.status, response.read()
+        except urllib.error.HTTPError as e:
+            status, payload = e.code, e.read()
+        try:
+            return status, json.loads(payload)
+        except ValueError:
+            return status, None
+
+
+def load_app(options):
+    """app_complete's Flask app with device commands answered by the chosen backend"""
+    import app_complete
+    if options.backend == 'sim':
+        app_complete.CLI_TRANSPORT = 'sim'
+        app_complete.device_simulator.configure(latency_ms=options.latency, jitter_ms=options.jitter,
+                                                error_rate=options.error_rate, bandwidth=options.bandwidth)
+    elif options.cli_path:
+        app_complete.CLI_PATH = options.cli_path
+    return app_complete
+
+
+def run_endpoint(client, name, options):
+    """Latency and throughput of one endpoint"""
+    method, path, build = ENDPOINTS[name]
+    body = build(options)
+    for _ in range(options.warmup):
+        client.request(method, path, body)
+
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            status, payload = client.request(method, path, body)
+            ok = succeeded(status, payload)
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=options.concurrency) as executor:
+        list(executor.map(one, range(options.requests)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+
+    def ms(value):
+        return None if value is None else round(value * 1000, 3)
+
+    return {
+        'method': method,
+        'path': path,
+        'requests': len(latencies),
+        'errors': errors,
+        'wall_s': round(wall, 3),
+        'throughput_rps': round(len(latencies) / wall, 2) if wall else None,
+        'mean_ms': ms(sum(latencies) / len(latencies)) if latencies else None,
+        'p50_ms': ms(percentile(latencies, 50)),
+        'p95_ms': ms(percentile(latencies, 95)),
+        'p99_ms': ms(percentile(latencies, 99)),
+        'max_ms': ms(latencies[-1]) if latencies else None
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(previous, current, threshold):
+    """Print p50/p95/throughput changes; returns endpoints whose p95 grew more than threshold %"""
+    regressions = []
+    for name, result in current['endpoints'].items():
+        old = previous.get('endpoints', {}).get(name)
+        if not old:
+            continue
+        changes = []
+        for key in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps'):
+            if old.get(key) and result.get(key) is not None:
+                change = (result[key] - old[key]) / old[key] * 100
+                changes.append(f'{key} {old[key]} -> {result[key]} ({change:+.1f}%)')
+                if key == 'p95_ms' and threshold is not None and change > threshold:
+                    regressions.append(name)
+        print(f'{name}: ' + ', '.join(changes))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[1])
+    parser.add_argument('--url', help='benchmark a running server instead of app_complete in-process')
+    parser.add_argument('--backend', choices=('sim', 'cli'), default='sim',
+                        help='in-process device: the simulator or the configured CLI transport')
+    parser.add_argument('--cli-path', help='mvdct (or a fake) for --backend cli')
+    parser.add_argument('--latency', type=float, help='simulated ms per device command')
+    parser.add_argument('--jitter', type=float, help='simulated latency jitter in ms')
+    parser.add_argument('--error-rate', type=float, help='share of simulated commands that fail')
+    parser.add_argument('--bandwidth', type=float, help='simulated link bytes/s (0 is unlimited)')
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS),
+                        help=f'comma-separated subset of: {", ".join(ENDPOINTS)}')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help='measured requests per endpoint')
+    parser.add_argument('--warmup', type=int, default=5, help='unmeasured requests per endpoint')
+    parser.add_argument('--device', default=DEVICE)
+    parser.add_argument('--no-cache', action='store_true', help='bypass the read cache for YANG gets')
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--compare', help='earlier results to compare against')
+    parser.add_argument('--fail-over', type=float,
+                        help='exit 1 when an endpoint p95 is this many percent above --compare')
+    options = parser.parse_args(argv)
+
+    names = [name.strip() for name in options.endpoints.split(',') if name.strip()]
+    unknown = [name for name in names if name not in ENDPOINTS]
+    if unknown:
+        parser.error(f'Unknown endpoints: {", ".join(unknown)}')
+
+    if options.url:
+        client = HttpClient(options.url)
+        target = options.url
+    else:
+        module = load_app(options)
+        client = InProcessClient(module.app)
+        target = f'app_complete in-process, {options.backend} backend'
+    target_sim = not options.url and options.backend == 'sim'
+
+    results = {
+        'meta': {
+            'started': datetime.now().isoformat(),
+            'target': target,
+            'transport': 'sim' if options.backend == 'sim' and not options.url else
+                         os.environ.get('VELOCITYDRIVE_TRANSPORT', 'subprocess'),
+            'concurrency': options.concurrency,
+            'requests': options.requests,
+            'simulator': module.device_simulator.status()['config'] if target_sim else None,
+            'cache': not options.no_cache,
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'machine': platform.machine()
+        },
+        'endpoints': {}
+    }
+    for name in names:
+        result = results['endpoints'][name] = run_endpoint(client, name, options)
+        print(f"{name:16} {result['throughput_rps']:>9} req/s  p50 {result['p50_ms']} ms  "
+              f"p95 {result['p95_ms']} ms  p99 {result['p99_ms']} ms  errors {result['errors']}")
+
+    if not options.url:
+        module.close_device_links()
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if options.compare:
+        with open(options.compare) as f:
+            regressions = compare(json.load(f), results, options.fail_over)
+        if regressions:
+            print(f'p95 regressed by more than {options.fail_over}%: {", ".join(regressions)}')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+VelocityDRIVE Touch GUI - Device read cache
+Per-device cache of read results keyed by YANG path, with per-subtree TTLs,
+LRU eviction and invalidation when a write touches an overlapping path
+"""
+
+import os
+import re
+import threading
+import time
+import logging
+from collections import OrderedDict
+
+from batch import is_read_command
+
+logger = logging.getLogger(__name__)
+
+CACHE_TTL = float(os.environ.get('VELOCITYDRIVE_CACHE_TTL', '5'))
+CACHE_SIZE = int(os.environ.get('VELOCITYDRIVE_CACHE_SIZE', '256'))
+
+# Seconds to keep a 'get' result, by path; first match wins, 0 disables.
+# Subtrees holding operational state (oper-status, counters, the PTP offset,
+# gate states) are never cached.
+PATH_TTLS = [
+    (re.compile(r'/statistics\b'), 0),
+    (re.compile(r'^/ietf-interfaces:interfaces'), 0),
+    (re.compile(r'^/ieee802-dot1q-bridge:bridges'), 0),
+    (re.compile(r'^/ieee1588-ptp:ptp'), 0),
+    (re.compile(r'^/ieee802-dot1q-sched:sched'), 0),
+    (re.compile(r'^/ietf-system:system-state'), 60),
+    (re.compile(r'^/ietf-yang-library:'), 300),
+]
+
+# Seconds to keep results of cacheable commands other than 'get'
+COMMAND_TTLS = {
+    'type': 300,
+    'yang': 300,
+    'get-capabilities': 300,
+}
+
+
+def paths_overlap(a, b):
+    """True if one path is the other or lies inside its subtree"""
+    a = a.rstrip('/') or '/'
+    b = b.rstrip('/') or '/'
+    if a == '/' or b == '/':
+        return True
+    shorter, longer = sorted((a, b), key=len)
+    return longer == shorter or (longer.startswith(shorter) and longer[len(shorter)] in '/[')
+
+
+class ReadCache:
+    """LRU cache of successful read results for 'device <dev> ...' commands"""
+
+    def __init__(self, max_entries=CACHE_SIZE, default_ttl=CACHE_TTL):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.entries = OrderedDict()
+        # Bumped on every invalidation so reads that raced a write are not stored
+        self.generations = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def key(self, args):
+        """Cache key for a read command, or None if it is not cacheable"""
+        if len(args) < 3 or args[0] != 'device':
+            return None
+        device, command = args[1], args[2]
+        if command == 'get' and len(args) == 4:
+            return (device, command, args[3])
+        if command in COMMAND_TTLS and len(args) == 3:
+            return (device, command, None)
+        return None
+
+    def ttl(self, key):
+        _, command, path = key
+        if path is None:
+            return COMMAND_TTLS.get(command, self.default_ttl)
+        for pattern, ttl in PATH_TTLS:
+            if pattern.search(path):
+                return ttl
+        return self.default_ttl
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] > time.time():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return dict(entry[1], cached=True)
+            if entry:
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, result, generation):
+        ttl = self.ttl(key)
+        if ttl <= 0 or not result.get('success'):
+            return
+        with self.lock:
+            if self.generations.get(key[0], 0) != generation:
+                return
+            self.entries[key] = (time.time() + ttl, result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def generation(self, device):
+        with self.lock:
+            return self.generations.get(device, 0)
+
+    def execute(self, args, execute, timeout=30, use_cache=True):
+        """Return a cached result for args or run execute and cache it"""
+        key = self.key(args)
+        if key is None or self.ttl(key) <= 0:
+            return execute(args, timeout=timeout)
+        if use_cache:
+            result = self.get(key)
+            if result is not None:
+                return result
+        generation = self.generation(key[0])
+        result = execute(args, timeout=timeout)
+        self.put(key, result, generation)
+        return result
+
+    def invalidate(self, device, path=None):
+        """Drop a device's entries overlapping path, or all of them"""
+        with self.lock:
+            self.generations[device] = self.generations.get(device, 0) + 1
+            for key in list(self.entries):
+                if key[0] != device:
+                    continue
+                if path is None or (key[2] is not None and paths_overlap(key[2], path)):
+                    del self.entries[key]
+                    self.invalidations += 1
+
+    def invalidate_for(self, args):
+        """Invalidate whatever a device command may have changed"""
+        if len(args) < 3 or args[0] != 'device' or is_read_command(args):
+            return
+        device, command = args[1], args[2]
+        if command in ('set', 'delete') and len(args) > 3:
+            self.invalidate(device, args[3])
+        elif command in ('patch', 'import', 'call', 'coap', 'mup'):
+            # Touched paths are not known from the arguments
+            self.invalidate(device, '/')
+        else:
+            self.invalidate(device)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
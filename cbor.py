@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+VelocityDRIVE Touch GUI - Minimal CBOR codec (RFC 8949)
+Covers the data model used by CORECONF payloads: integers, byte and text
+strings, arrays, maps, booleans, null, floats and tags
+"""
+
+import struct
+
+
+class CBORError(ValueError):
+    """Raised for malformed or unsupported CBOR data"""
+
+
+class Tag:
+    """Tagged CBOR value"""
+
+    def __init__(self, tag, value):
+        self.tag = tag
+        self.value = value
+
+    def __eq__(self, other):
+        return isinstance(other, Tag) and (self.tag, self.value) == (other.tag, other.value)
+
+    def __repr__(self):
+        return f'Tag({self.tag}, {self.value!r})'
+
+
+def _head(major, value):
+    if value < 24:
+        return bytes([(major << 5) | value])
+    if value < 0x100:
+        return bytes([(major << 5) | 24, value])
+    if value < 0x10000:
+        return bytes([(major << 5) | 25]) + struct.pack('>H', value)
+    if value < 0x100000000:
+        return bytes([(major << 5) | 26]) + struct.pack('>I', value)
+    return bytes([(major << 5) | 27]) + struct.pack('>Q', value)
+
+
+def _encode(value, out):
+    if value is False:
+        out.append(0xF4)
+    elif value is True:
+        out.append(0xF5)
+    elif value is None:
+        out.append(0xF6)
+    elif isinstance(value, int):
+        if value >= 0:
+            out += _head(0, value)
+        else:
+            out += _head(1, -1 - value)
+    elif isinstance(value, float):
+        out.append(0xFB)
+        out += struct.pack('>d', value)
+    elif isinstance(value, (bytes, bytearray)):
+        out += _head(2, len(value))
+        out += value
+    elif isinstance(value, str):
+        data = value.encode('utf-8')
+        out += _head(3, len(data))
+        out += data
+    elif isinstance(value, (list, tuple)):
+        out += _head(4, len(value))
+        for item in value:
+            _encode(item, out)
+    elif isinstance(value, dict):
+        out += _head(5, len(value))
+        for key, item in value.items():
+            _encode(key, out)
+            _encode(item, out)
+    elif isinstance(value, Tag):
+        out += _head(6, value.tag)
+        _encode(value.value, out)
+    else:
+        raise CBORError(f'Cannot encode {type(value).__name__}')
+
+
+def dumps(value):
+    """Encode a Python value as CBOR"""
+    out = bytearray()
+    _encode(value, out)
+    return bytes(out)
+
+
+def dumps_seq(values):
+    """Encode a CBOR sequence (RFC 8742)"""
+    return b''.join(dumps(value) for value in values)
+
+
+def _half_to_float(half):
+    exponent = (half >> 10) & 0x1F
+    mantissa = half & 0x3FF
+    if exponent == 0:
+        value = mantissa * 2 ** -24
+    elif exponent == 31:
+        value = float('inf') if mantissa == 0 else float('nan')
+    else:
+        value = (mantissa + 1024) * 2 ** (exponent - 25)
+    return -value if half & 0x8000 else value
+
+
+class _Decoder:
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def _take(self, n):
+        if self.pos + n > len(self.data):
+            raise CBORError('Unexpected end of CBOR data')
+        chunk = self.data[self.pos:self.pos + n]
+        self.pos += n
+        return chunk
+
+    def _at_break(self):
+        # Indefinite-length items end with a 0xFF break byte
+        if self.pos >= len(self.data):
+            raise CBORError('Unexpected end of CBOR data')
+        return self.data[self.pos] == 0xFF
+
+    def _argument(self, info):
+        if info < 24:
+            return info
+        if info == 24:
+            return self._take(1)[0]
+        if info == 25:
+            return struct.unpack('>H', self._take(2))[0]
+        if info == 26:
+            return struct.unpack('>I', self._take(4))[0]
+        if info == 27:
+            return struct.unpack('>Q', self._take(8))[0]
+        if info == 31:
+            return None
+        raise CBORError(f'Invalid additional information {info}')
+
+    def decode(self):
+        initial = self._take(1)[0]
+        major, info = initial >> 5, initial & 0x1F
+
+        if major == 7:
+            if info == 20:
+                return False
+            if info == 21:
+                return True
+            if info in (22, 23):
+                return None
+            if info == 25:
+                return _half_to_float(struct.unpack('>H', self._take(2))[0])
+            if info == 26:
+                return struct.unpack('>f', self._take(4))[0]
+            if info == 27:
+                return struct.unpack('>d', self._take(8))[0]
+            if info == 31:
+                raise CBORError('Unexpected break')
+            return self._argument(info)
+
+        arg = self._argument(info)
+        if major == 0:
+            return arg
+        if major == 1:
+            return -1 - arg
+        if major in (2, 3):
+            if arg is None:
+                chunks = []
+                while not self._at_break():
+                    chunks.append(self.decode())
+                self.pos += 1
+                raw = b''.join(c if isinstance(c, bytes) else c.encode() for c in chunks)
+            else:
+                raw = bytes(self._take(arg))
+            return raw if major == 2 else raw.decode('utf-8')
+        if major == 4:
+            if arg is None:
+                items = []
+                while not self._at_break():
+                    items.append(self.decode())
+                self.pos += 1
+                return items
+            return [self.decode() for _ in range(arg)]
+        if major == 5:
+            result = {}
+            count = 0
+            while arg is None or count < arg:
+                if arg is None and self._at_break():
+                    self.pos += 1
+                    break
+                key = self.decode()
+                if isinstance(key, list):
+                    key = tuple(key)
+                result[key] = self.decode()
+                count += 1
+            return result
+        return Tag(arg, self.decode())
+
+
+def loads(data):
+    """Decode a single CBOR data item"""
+    decoder = _Decoder(data)
+    value = decoder.decode()
+    if decoder.pos != len(data):
+        raise CBORError('Trailing data after CBOR item')
+    return value
+
+
+def loads_seq(data):
+    """Decode a CBOR sequence into a list of items"""
+    decoder = _Decoder(data)
+    items = []
+    while decoder.pos < len(data):
+        items.append(decoder.decode())
+    return items
+
+
+def to_json(value):
+    """Convert decoded CBOR into JSON-serializable data"""
+    if isinstance(value, (bytes, bytearray)):
+        return value.hex()
+    if isinstance(value, Tag):
+        return to_json(value.value)
+    if isinstance(value, (list, tuple)):
+        return [to_json(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key) if not isinstance(key, str) else key: to_json(item)
+                for key, item in value.items()}
+    return value
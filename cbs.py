@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+VelocityDRIVE Touch GUI - Credit-Based Shaper calculator
+Derives 802.1Qav idle/send slopes and hi/lo credits from link speed,
+reserved bandwidth and frame sizes, runs admission control over every
+class on a port and reports a per-class latency bound, so invalid
+parameters are rejected before they reach the device
+"""
+
+# Bytes on the wire around every frame: preamble, SFD and interframe gap
+FRAME_OVERHEAD = 20
+# Largest frame of the unshaped (best-effort) traffic below the CBS classes
+DEFAULT_MAX_FRAME = 1522
+MIN_FRAME = 64
+MAX_FRAME = 10240
+# Share of the link 802.1Qav lets SR classes reserve by default
+MAX_RESERVATION = 0.75
+# SR class A observation interval
+DEFAULT_INTERVAL_US = 125
+# Devices take slopes in kbit/s (idle 10000 and send -990000 on a 1 Gb/s link)
+SLOPE_UNIT = 1000
+
+
+class CbsError(ValueError):
+    pass
+
+
+def frame_bits(size):
+    """Bits a frame of size bytes occupies on the wire"""
+    size = int(size)
+    if not MIN_FRAME <= size <= MAX_FRAME:
+        raise CbsError(f'Frame size {size} outside {MIN_FRAME}-{MAX_FRAME} bytes')
+    return (size + FRAME_OVERHEAD) * 8
+
+
+def link_rate(data):
+    """Port transmit rate in bit/s from link_speed (bit/s) or link_speed_mbps"""
+    if data.get('link_speed_mbps') is not None:
+        rate = float(data['link_speed_mbps']) * 1e6
+    else:
+        rate = float(data.get('link_speed', 1e9))
+    if rate <= 0:
+        raise CbsError('Link speed must be positive')
+    return rate
+
+
+def class_load(cls, rate):
+    """(idle slope in bit/s, burst in bits per interval) for one class
+
+    The reservation comes from 'streams' ({max_frame_size,
+    frames_per_interval, interval_us}), from 'bandwidth_percent' of the link
+    or from an explicit 'idle_slope'.
+    """
+    max_frame = frame_bits(cls.get('max_frame_size', DEFAULT_MAX_FRAME))
+    streams = cls.get('streams')
+    if streams:
+        slope = 0.0
+        burst = 0
+        for stream in streams:
+            bits = frame_bits(stream.get('max_frame_size', cls.get('max_frame_size', DEFAULT_MAX_FRAME)))
+            frames = int(stream.get('frames_per_interval', 1))
+            interval = float(stream.get('interval_us', DEFAULT_INTERVAL_US)) / 1e6
+            if frames < 1 or interval <= 0:
+                raise CbsError('Streams need frames_per_interval >= 1 and a positive interval_us')
+            slope += bits * frames / interval
+            burst += bits * frames
+        return slope, burst
+    if cls.get('bandwidth_percent') is not None:
+        return rate * float(cls['bandwidth_percent']) / 100, max_frame
+    if cls.get('idle_slope') is not None:
+        return float(cls['idle_slope']), max_frame
+    raise CbsError('Class needs streams, bandwidth_percent or idle_slope')
+
+
+def calculate(data):
+    """Parameters and admission control for all CBS classes of a port
+
+    data: {link_speed | link_speed_mbps, max_frame_size_be, max_reservation,
+    classes: [{name, traffic_class, max_frame_size, streams |
+    bandwidth_percent | idle_slope, max_latency_us}]}. Classes are ordered by
+    traffic_class, highest priority first; 'index' in each result points
+    back into the request. Slopes are in bit/s, credits in bits.
+
+    hiCredit follows 802.1Q Annex L: a class can be blocked by one
+    best-effort frame, sent while higher classes take their share, plus one
+    frame of every higher class. The latency bound treats each class as a
+    rate-latency server: that blocking time, then the class burst drained at
+    its idle slope, with the last frame sent at line rate.
+    """
+    errors = []
+    warnings = []
+    report = {'valid': False, 'errors': errors, 'warnings': warnings, 'classes': []}
+
+    try:
+        rate = link_rate(data)
+        max_be = frame_bits(data.get('max_frame_size_be', DEFAULT_MAX_FRAME))
+        max_reservation = float(data.get('max_reservation', MAX_RESERVATION))
+    except (CbsError, TypeError, ValueError) as e:
+        errors.append(str(e))
+        return report
+
+    classes = list(enumerate(data.get('classes') or []))
+    if not classes:
+        errors.append('No CBS classes given')
+        return report
+    try:
+        if all('traffic_class' in cls for _, cls in classes):
+            classes.sort(key=lambda item: -int(item[1]['traffic_class']))
+    except (TypeError, ValueError):
+        errors.append('traffic_class must be a number')
+        return report
+
+    higher_slope = 0.0
+    higher_frames = 0
+    for index, cls in classes:
+        name = cls.get('name') or f"class {cls.get('traffic_class', index)}"
+        try:
+            max_frame = frame_bits(cls.get('max_frame_size', DEFAULT_MAX_FRAME))
+            idle_slope, burst = class_load(cls, rate)
+        except (CbsError, TypeError, ValueError) as e:
+            errors.append(f'{name}: {e}')
+            continue
+        if idle_slope <= 0:
+            errors.append(f'{name}: reserved bandwidth must be positive')
+            continue
+
+        send_slope = idle_slope - rate
+        available = rate - higher_slope
+        entry = {
+            'index': index,
+            'name': name,
+            'traffic_class': cls.get('traffic_class'),
+            'idle_slope': round(idle_slope),
+            'send_slope': round(send_slope),
+            'bandwidth_fraction': round(idle_slope / rate, 6),
+            'lo_credit': round(max_frame * send_slope / rate)
+        }
+        if available <= idle_slope:
+            errors.append(f'{name}: higher classes leave {available:.0f} bit/s, '
+                          f'{idle_slope:.0f} bit/s needed')
+            report['classes'].append(entry)
+            continue
+
+        blocking = max_be / available + higher_frames / rate
+        entry['hi_credit'] = round(idle_slope * blocking)
+        latency = blocking + max(burst - max_frame, 0) / idle_slope + max_frame / rate
+        entry['latency_bound_us'] = round(latency * 1e6, 3)
+        if cls.get('max_latency_us') is not None and latency * 1e6 > float(cls['max_latency_us']):
+            errors.append(f"{name}: latency bound {latency * 1e6:.1f} us exceeds "
+                          f"the required {float(cls['max_latency_us']):.1f} us")
+        report['classes'].append(entry)
+
+        higher_slope += idle_slope
+        higher_frames += max_frame
+
+    report['link_speed'] = rate
+    report['reserved'] = round(higher_slope)
+    report['reserved_fraction'] = round(higher_slope / rate, 6)
+    if higher_slope > max_reservation * rate:
+        errors.append(f'Classes reserve {higher_slope / rate:.1%} of the link, '
+                      f'more than the {max_reservation:.0%} allowed')
+    elif higher_slope > 0.9 * max_reservation * rate:
+        warnings.append(f'Reservation is close to the {max_reservation:.0%} limit')
+    report['valid'] = not errors
+    return report
+
+
+def device_parameters(entry):
+    """The device's CBS leaves for one class of a calculate() report, with
+    slopes converted to kbit/s"""
+    return {
+        'idle-slope': round(entry['idle_slope'] / SLOPE_UNIT),
+        'send-slope': round(entry['send_slope'] / SLOPE_UNIT),
+        'hi-credit': entry['hi_credit'],
+        'lo-credit': entry['lo_credit']
+    }
+
+
+def check_parameters(idle_slope, send_slope, hi_credit=None, lo_credit=None, rate=None):
+    """Errors in explicitly given CBS parameters (empty when they are consistent)
+
+    Slopes are in the device's kbit/s, rate (the link speed) in bit/s.
+    Parameters given as None are not checked.
+    """
+    errors = []
+    try:
+        idle_slope, send_slope, hi_credit, lo_credit, rate = (
+            None if value is None else float(value)
+            for value in (idle_slope, send_slope, hi_credit, lo_credit, rate))
+    except (TypeError, ValueError):
+        return ['CBS parameters must be numbers']
+    if idle_slope is not None and idle_slope <= 0:
+        errors.append('Idle slope must be positive')
+    if send_slope is not None and send_slope >= 0:
+        errors.append('Send slope must be negative')
+    if hi_credit is not None and hi_credit <= 0:
+        errors.append('hiCredit must be positive')
+    if lo_credit is not None and lo_credit >= 0:
+        errors.append('loCredit must be negative')
+    if rate and None not in (idle_slope, send_slope) and \
+            abs((idle_slope - send_slope) * SLOPE_UNIT - rate) >= SLOPE_UNIT:
+        errors.append(f'Idle slope minus send slope must equal the link rate '
+                      f'({rate / SLOPE_UNIT:.0f} kbit/s)')
+    return errors
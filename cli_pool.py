@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+VelocityDRIVE Touch GUI - Persistent CLI session pool
+Keeps one long-lived mvdct process per device so that the serial link,
+handshake and YANG catalog are set up once instead of on every request
+"""
+
+import queue
+import subprocess
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Arguments used to start an interactive mvdct session for one device
+CLI_SESSION_ARGS = ['device', '{device}', 'shell']
+# Prompt printed by the interactive CLI when it is ready for the next command
+CLI_SESSION_PROMPT = 'mvdct> '
+# Line prefix (any case) the interactive CLI prints when a command fails. A
+# session has no per-command exit code, and stderr also carries warnings.
+CLI_SESSION_ERROR_MARKER = 'error:'
+
+SESSION_STARTUP_TIMEOUT = 30
+SESSION_QUEUE_SIZE = 16
+SESSION_HEALTH_INTERVAL = 30
+SESSION_MAX_RESTARTS = 5
+
+
+class CliSessionError(Exception):
+    """Raised when an interactive CLI session cannot be used"""
+
+
+class CliSessionStartError(CliSessionError):
+    """Raised when the CLI process never reaches its interactive prompt"""
+
+
+class CliSession:
+    """Single long-lived mvdct process bound to one device"""
+
+    def __init__(self, cli_path, device, queue_size=SESSION_QUEUE_SIZE,
+                 health_interval=SESSION_HEALTH_INTERVAL):
+        self.cli_path = cli_path
+        self.device = device
+        self.health_interval = health_interval
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.proc = None
+        self.chunks = queue.Queue()
+        self.stderr_lines = []
+        self.stderr_lock = threading.Lock()
+        self.restarts = 0
+        self.commands = 0
+        self.last_used = time.time()
+        self.last_error = None
+        self.running = True
+        self.started = False
+        self.worker = threading.Thread(target=self._worker_loop, daemon=True,
+                                       name=f'cli-session-{device}')
+        self.worker.start()
+
+    # ---------- process management ----------
+
+    def _start(self):
+        """Start the CLI process and wait for its first prompt"""
+        args = [arg.replace('{device}', self.device) for arg in CLI_SESSION_ARGS]
+        cmd = [self.cli_path] + args
+        logger.info(f"Starting CLI session: {' '.join(cmd)}")
+
+        self.proc = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            bufsize=1
+        )
+        self.chunks = queue.Queue()
+        with self.stderr_lock:
+            self.stderr_lines = []
+
+        threading.Thread(target=self._pump_stdout, args=(self.proc, self.chunks),
+                         daemon=True).start()
+        threading.Thread(target=self._pump_stderr, args=(self.proc,),
+                         daemon=True).start()
+
+        try:
+            self._read_until_prompt(SESSION_STARTUP_TIMEOUT)
+        except (CliSessionError, subprocess.TimeoutExpired) as e:
+            self._stop()
+            raise CliSessionStartError(f'CLI session did not start: {e}')
+        self.started = True
+
+    def _stop(self):
+        """Terminate the CLI process if it is still alive"""
+        proc, self.proc = self.proc, None
+        if proc and proc.poll() is None:
+            try:
+                proc.stdin.close()
+                proc.wait(timeout=2)
+            except Exception:
+                proc.kill()
+                proc.wait()
+
+    def _restart(self, reason):
+        """Restart the CLI process after a crash, timeout or failed health check"""
+        logger.warning(f"Restarting CLI session for {self.device}: {reason}")
+        self.last_error = reason
+        self._stop()
+        self.restarts += 1
+        if self.restarts > SESSION_MAX_RESTARTS:
+            raise CliSessionError(f'Too many session restarts ({reason})')
+        time.sleep(min(0.5 * self.restarts, 5))
+        self._start()
+
+    def _pump_stdout(self, proc, chunks):
+        """Forward stdout to the chunk queue; None marks end of stream"""
+        while True:
+            data = proc.stdout.read(1) if proc.stdout else ''
+            if not data:
+                chunks.put(None)
+                return
+            chunks.put(data)
+
+    def _pump_stderr(self, proc):
+        """Collect stderr lines for the command currently in progress"""
+        for line in proc.stderr:
+            with self.stderr_lock:
+                self.stderr_lines.append(line)
+
+    def _read_until_prompt(self, timeout):
+        """Read stdout until the prompt appears and return the text before it"""
+        deadline = time.time() + timeout
+        buffer = []
+        tail = ''
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise subprocess.TimeoutExpired(self.cli_path, timeout)
+            try:
+                chunk = self.chunks.get(timeout=remaining)
+            except queue.Empty:
+                raise subprocess.TimeoutExpired(self.cli_path, timeout)
+            if chunk is None:
+                raise CliSessionError('CLI session exited')
+            buffer.append(chunk)
+            tail = (tail + chunk)[-len(CLI_SESSION_PROMPT):]
+            if tail == CLI_SESSION_PROMPT:
+                return ''.join(buffer)[:-len(CLI_SESSION_PROMPT)]
+
+    @staticmethod
+    def _failed(*outputs):
+        """True if any output line carries the CLI's error marker"""
+        return any(line.strip().lower().startswith(CLI_SESSION_ERROR_MARKER)
+                   for output in outputs for line in output.splitlines())
+
+    def _is_alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    # ---------- command execution ----------
+
+    def _run(self, args, timeout):
+        """Send one command line and wait for its output"""
+        if not self._is_alive():
+            if self.proc is None:
+                self._start()
+            else:
+                self._restart(f'process exited with code {self.proc.returncode}')
+
+        with self.stderr_lock:
+            self.stderr_lines = []
+
+        line = subprocess.list2cmdline(args)
+        self.proc.stdin.write(line + '\n')
+        self.proc.stdin.flush()
+
+        try:
+            stdout = self._read_until_prompt(timeout)
+        except subprocess.TimeoutExpired:
+            # The session state is unknown after a timeout, start over
+            self._restart('command timeout')
+            raise
+        except CliSessionError:
+            # Crashed mid-command; the next command restarts the process
+            self.last_error = 'CLI session exited during command'
+            raise
+
+        # Drop the echoed command line if the CLI echoes its input
+        if stdout.startswith(line):
+            stdout = stdout[len(line):].lstrip('\r\n')
+
+        with self.stderr_lock:
+            stderr = ''.join(self.stderr_lines)
+
+        self.commands += 1
+        self.restarts = 0
+        returncode = 1 if self._failed(stdout, stderr) else 0
+        return {
+            'success': returncode == 0,
+            'stdout': stdout,
+            'stderr': stderr,
+            'command': ' '.join(['device', self.device] + args),
+            'returncode': returncode
+        }
+
+    def _health_check(self):
+        """Verify an idle session still answers with a prompt"""
+        if self.proc is None:
+            return
+        try:
+            if not self._is_alive():
+                self._restart('process died while idle')
+                return
+            self.proc.stdin.write('\n')
+            self.proc.stdin.flush()
+            self._read_until_prompt(SESSION_STARTUP_TIMEOUT)
+        except (CliSessionError, subprocess.TimeoutExpired, OSError) as e:
+            try:
+                self._restart(f'health check failed: {e}')
+            except Exception as restart_error:
+                self.last_error = str(restart_error)
+
+    def _worker_loop(self):
+        """Process queued commands one at a time"""
+        while self.running:
+            try:
+                job = self.jobs.get(timeout=self.health_interval)
+            except queue.Empty:
+                self._health_check()
+                continue
+
+            if job is None:
+                break
+
+            args, timeout, done = job
+            try:
+                done['result'] = self._run(args, timeout)
+            except Exception as e:
+                done['error'] = e
+            finally:
+                self.last_used = time.time()
+                done['event'].set()
+
+        self._stop()
+
+    def submit(self, args, timeout=30):
+        """Queue a command for this device and wait for the result"""
+        done = {'event': threading.Event()}
+        try:
+            self.jobs.put_nowait((args, timeout, done))
+        except queue.Full:
+            raise CliSessionError(f'CLI session queue full for {self.device}')
+
+        # Allow for the time spent waiting behind other queued commands
+        done['event'].wait()
+        if 'error' in done:
+            raise done['error']
+        return done['result']
+
+    def close(self):
+        """Stop the worker and the CLI process"""
+        self.running = False
+        try:
+            self.jobs.put_nowait(None)
+        except queue.Full:
+            pass
+
+    def status(self):
+        """Session health summary"""
+        return {
+            'device': self.device,
+            'alive': self._is_alive(),
+            'pid': self.proc.pid if self.proc else None,
+            'queued': self.jobs.qsize(),
+            'commands': self.commands,
+            'restarts': self.restarts,
+            'last_used': self.last_used,
+            'last_error': self.last_error
+        }
+
+
+class CliSessionPool:
+    """One CliSession per device, created on first use"""
+
+    def __init__(self, cli_path, fallback=None, queue_size=SESSION_QUEUE_SIZE):
+        self.cli_path = cli_path
+        self.fallback = fallback
+        self.queue_size = queue_size
+        self.sessions = {}
+        self.unsupported = set()
+        self.lock = threading.Lock()
+
+    def get_session(self, device):
+        with self.lock:
+            session = self.sessions.get(device)
+            if session is None or not session.worker.is_alive():
+                session = CliSession(self.cli_path, device, queue_size=self.queue_size)
+                self.sessions[device] = session
+            return session
+
+    def execute(self, args, timeout=30):
+        """Run a CLI command through the device session when possible"""
+        # Only 'device <dev> ...' commands benefit from a persistent session
+        if len(args) < 3 or args[0] != 'device' or args[1] in self.unsupported:
+            return self.fallback(args, timeout)
+
+        device = args[1]
+        try:
+            return self.get_session(device).submit(args[2:], timeout=timeout)
+        except subprocess.TimeoutExpired:
+            return {
+                'success': False,
+                'error': f'Command timeout after {timeout}s',
+                'command': ' '.join(args)
+            }
+        except CliSessionStartError as e:
+            if self.sessions.get(device) and self.sessions[device].started:
+                return {
+                    'success': False,
+                    'error': str(e),
+                    'command': ' '.join(args)
+                }
+            # The CLI could not hold a session open, use one process per command
+            logger.warning(f"CLI session unavailable for {device}: {e}")
+            self.unsupported.add(device)
+            self.close(device)
+            return self.fallback(args, timeout)
+        except CliSessionError as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'command': ' '.join(args)
+            }
+
+    def close(self, device=None):
+        """Close one device session, or all sessions"""
+        with self.lock:
+            devices = [device] if device else list(self.sessions)
+            for dev in devices:
+                session = self.sessions.pop(dev, None)
+                if session:
+                    session.close()
+
+    def status(self):
+        """Status of every open session"""
+        with self.lock:
+            return [session.status() for session in self.sessions.values()]
@@ -0,0 +1,562 @@
+#!/usr/bin/env python3
+"""
+VelocityDRIVE Touch GUI - In-process CoAP / CORECONF client
+CoAP (RFC 7252) with block-wise transfer (RFC 7959) over a MUP1 link,
+with several requests in flight at once, and a CORECONF layer that maps
+YANG paths to SIDs and exchanges CBOR payloads
+"""
+
+import json
+import os
+import struct
+import threading
+import time
+import logging
+
+import cbor
+from mup1 import TYPE_COAP, Mup1Error
+
+logger = logging.getLogger(__name__)
+
+# Message types
+CON, NON, ACK, RST = 0, 1, 2, 3
+
+# Method codes
+METHODS = {'GET': 1, 'POST': 2, 'PUT': 3, 'DELETE': 4, 'FETCH': 5, 'PATCH': 6, 'IPATCH': 7}
+
+# Option numbers
+OPT_URI_PATH = 11
+OPT_CONTENT_FORMAT = 12
+OPT_URI_QUERY = 15
+OPT_ACCEPT = 17
+OPT_BLOCK2 = 23
+OPT_BLOCK1 = 27
+OPT_SIZE2 = 28
+
+# Content formats
+CF_CBOR = 60
+CF_YANG_DATA_CBOR_SID = 140
+CF_YANG_IDENTIFIERS_CBOR_SEQ = 141
+CF_YANG_INSTANCES_CBOR_SEQ = 142
+
+COAP_BLOCK_SZX = 4  # 256-byte blocks fit comfortably in a MUP1 frame
+COAP_MAX_IN_FLIGHT = 8
+COAP_TIMEOUT = 10
+
+# CORECONF datastore resource
+CORECONF_URI = '/c'
+
+
+class CoapError(Exception):
+    """Raised for CoAP protocol errors and error responses"""
+
+
+def code_string(code):
+    """Format a CoAP code as 'c.dd'"""
+    return f'{code >> 5}.{code & 0x1F:02d}'
+
+
+def _encode_uint(value):
+    if value == 0:
+        return b''
+    length = (value.bit_length() + 7) // 8
+    return value.to_bytes(length, 'big')
+
+
+def _decode_uint(data):
+    return int.from_bytes(data, 'big') if data else 0
+
+
+def _option_nibble(value):
+    if value < 13:
+        return value, b''
+    if value < 269:
+        return 13, bytes([value - 13])
+    return 14, struct.pack('>H', value - 269)
+
+
+class Message:
+    """CoAP message"""
+
+    def __init__(self, mtype=CON, code=0, message_id=0, token=b'', options=None, payload=b''):
+        self.mtype = mtype
+        self.code = code
+        self.message_id = message_id
+        self.token = token
+        self.options = options or []
+        self.payload = payload
+
+    def option(self, number, default=None):
+        for opt, value in self.options:
+            if opt == number:
+                return value
+        return default
+
+    def option_uint(self, number, default=None):
+        value = self.option(number)
+        return default if value is None else _decode_uint(value)
+
+    def encode(self):
+        out = bytearray()
+        out.append(0x40 | (self.mtype << 4) | len(self.token))
+        out.append(self.code)
+        out += struct.pack('>H', self.message_id)
+        out += self.token
+
+        previous = 0
+        for number, value in sorted(self.options, key=lambda o: o[0]):
+            delta, delta_ext = _option_nibble(number - previous)
+            length, length_ext = _option_nibble(len(value))
+            out.append((delta << 4) | length)
+            out += delta_ext + length_ext + value
+            previous = number
+
+        if self.payload:
+            out.append(0xFF)
+            out += self.payload
+        return bytes(out)
+
+    @classmethod
+    def decode(cls, data):
+        if len(data) < 4 or data[0] >> 6 != 1:
+            raise CoapError('Invalid CoAP header')
+        tkl = data[0] & 0x0F
+        msg = cls(mtype=(data[0] >> 4) & 0x03, code=data[1],
+                  message_id=struct.unpack('>H', data[2:4])[0],
+                  token=bytes(data[4:4 + tkl]))
+        pos = 4 + tkl
+        number = 0
+        while pos < len(data):
+            if data[pos] == 0xFF:
+                msg.payload = bytes(data[pos + 1:])
+                break
+            delta, length = data[pos] >> 4, data[pos] & 0x0F
+            pos += 1
+            for field in ('delta', 'length'):
+                nibble = delta if field == 'delta' else length
+                if nibble == 13:
+                    nibble = data[pos] + 13
+                    pos += 1
+                elif nibble == 14:
+                    nibble = struct.unpack('>H', data[pos:pos + 2])[0] + 269
+                    pos += 2
+                elif nibble == 15:
+                    raise CoapError('Invalid option nibble')
+                if field == 'delta':
+                    delta = nibble
+                else:
+                    length = nibble
+            number += delta
+            msg.options.append((number, bytes(data[pos:pos + length])))
+            pos += length
+        return msg
+
+
+def uri_options(uri):
+    """Split a URI path/query into Uri-Path and Uri-Query options"""
+    path, _, query = uri.partition('?')
+    options = [(OPT_URI_PATH, seg.encode()) for seg in path.split('/') if seg]
+    if query:
+        options += [(OPT_URI_QUERY, q.encode()) for q in query.split('&') if q]
+    return options
+
+
+def path_segments(path):
+    """[(node name, {key: value})] of '/mod:a/b[name="x"]/c'"""
+    segments = []
+    for segment in path.strip('/').split('/'):
+        name, _, predicate = segment.partition('[')
+        keys = {}
+        while predicate:
+            key, _, rest = predicate.partition('=')
+            value, _, predicate = rest.partition(']')
+            keys[key.strip()] = value.strip('"\'')
+            predicate = predicate.lstrip('[')
+        segments.append((name, keys))
+    return segments
+
+
+def block_value(num, more, szx):
+    return _encode_uint((num << 4) | (0x08 if more else 0) | szx)
+
+
+def parse_block(value):
+    raw = _decode_uint(value)
+    return raw >> 4, bool(raw & 0x08), raw & 0x07
+
+
+class CoapClient:
+    """CoAP client sharing one MUP1 link between many in-flight requests"""
+
+    def __init__(self, link, max_in_flight=COAP_MAX_IN_FLIGHT, block_szx=COAP_BLOCK_SZX):
+        self.link = link
+        self.block_szx = block_szx
+        self.slots = threading.BoundedSemaphore(max_in_flight)
+        self.lock = threading.Lock()
+        self.message_id = int.from_bytes(os.urandom(2), 'big')
+        self.token_counter = int.from_bytes(os.urandom(4), 'big')
+        self.in_flight = {}
+        self.requests = 0
+        link.add_listener(TYPE_COAP, self._on_frame)
+
+    def _next_ids(self):
+        with self.lock:
+            self.message_id = (self.message_id + 1) & 0xFFFF
+            self.token_counter = (self.token_counter + 1) & 0xFFFFFFFF
+            return self.message_id, self.token_counter.to_bytes(4, 'big')
+
+    def _on_frame(self, payload):
+        try:
+            msg = Message.decode(payload)
+        except (CoapError, IndexError, struct.error) as e:
+            logger.warning(f"Dropping malformed CoAP frame: {e}")
+            return
+
+        # Empty ACK: the response follows separately with the same token
+        if msg.mtype == ACK and msg.code == 0:
+            return
+
+        with self.lock:
+            waiter = self.in_flight.pop(msg.token, None)
+        if waiter is None:
+            logger.debug(f"Unmatched CoAP response token {msg.token.hex()}")
+            return
+
+        if msg.mtype == CON:
+            self.link.send(TYPE_COAP.lower(), Message(ACK, 0, msg.message_id).encode())
+        waiter['response'] = msg
+        waiter['event'].set()
+
+    def _exchange(self, method, options, payload, timeout):
+        """Send one request message and wait for the response with its token"""
+        message_id, token = self._next_ids()
+        waiter = {'event': threading.Event()}
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            self.in_flight[token] = waiter
+
+        msg = Message(CON, METHODS[method], message_id, token, options, payload)
+        try:
+            self.link.send(TYPE_COAP.lower(), msg.encode(), timeout)
+        except Mup1Error:
+            with self.lock:
+                self.in_flight.pop(token, None)
+            raise
+        self.requests += 1
+
+        if not waiter['event'].wait(max(0, deadline - time.monotonic())):
+            with self.lock:
+                self.in_flight.pop(token, None)
+            raise TimeoutError(f'No CoAP response within {timeout}s')
+        return waiter['response']
+
+    def request(self, method, uri, payload=b'', content_format=None, accept=None,
+                timeout=COAP_TIMEOUT):
+        """Send a request, handling Block1 uploads and Block2 downloads"""
+        method = method.upper()
+        if method not in METHODS:
+            raise CoapError(f'Unsupported method {method}')
+
+        base = uri_options(uri)
+        if content_format is not None:
+            base.append((OPT_CONTENT_FORMAT, _encode_uint(content_format)))
+        if accept is not None:
+            base.append((OPT_ACCEPT, _encode_uint(accept)))
+
+        with self.slots:
+            block_size = 1 << (self.block_szx + 4)
+            if len(payload) > block_size:
+                # Block1: upload the request body in sequence
+                num = 0
+                while True:
+                    chunk = payload[num * block_size:(num + 1) * block_size]
+                    more = (num + 1) * block_size < len(payload)
+                    options = base + [(OPT_BLOCK1, block_value(num, more, self.block_szx))]
+                    response = self._exchange(method, options, chunk, timeout)
+                    if not more or response.code >> 5 != 2:
+                        break
+                    num += 1
+            else:
+                response = self._exchange(method, base, payload, timeout)
+
+            # Block2: fetch remaining response blocks
+            body = bytearray(response.payload)
+            block2 = response.option(OPT_BLOCK2)
+            while block2 is not None:
+                num, more, szx = parse_block(block2)
+                if not more:
+                    break
+                # A FETCH is repeated with its body, which needs its Content-Format
+                if method == 'FETCH':
+                    options, body_payload = list(base), payload
+                else:
+                    options, body_payload = [o for o in base if o[0] != OPT_CONTENT_FORMAT], b''
+                options.append((OPT_BLOCK2, block_value(num + 1, False, szx)))
+                response = self._exchange(method, options, body_payload, timeout)
+                body += response.payload
+                block2 = response.option(OPT_BLOCK2)
+
+        response.payload = bytes(body)
+        return response
+
+    def request_many(self, requests, timeout=COAP_TIMEOUT):
+        """Pipeline several requests on the link and return responses in order"""
+        results = [None] * len(requests)
+
+        def run(index, spec):
+            try:
+                results[index] = self.request(timeout=timeout, **spec)
+            except Exception as e:
+                results[index] = e
+
+        threads = [threading.Thread(target=run, args=(i, spec), daemon=True)
+                   for i, spec in enumerate(requests)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+
+class SidMap:
+    """YANG schema node path <-> SID mapping loaded from .sid files"""
+
+    def __init__(self):
+        self.by_path = {}
+        self.by_sid = {}
+
+    @classmethod
+    def load_dir(cls, directory):
+        sids = cls()
+        if directory and os.path.isdir(directory):
+            for name in sorted(os.listdir(directory)):
+                if name.endswith('.sid'):
+                    sids.load_file(os.path.join(directory, name))
+        return sids
+
+    def load_file(self, filename):
+        with open(filename) as f:
+            content = json.load(f)
+        sid_file = content.get('ietf-sid-file:sid-file', content)
+        for item in sid_file.get('item', sid_file.get('items', [])):
+            if item.get('namespace', 'data') != 'data':
+                continue
+            self.by_path[item['identifier']] = int(item['sid'])
+            self.by_sid[int(item['sid'])] = item['identifier']
+
+    def __len__(self):
+        return len(self.by_path)
+
+    def instance_identifier(self, path):
+        """Convert '/mod:a/b[name="x"]/c' into a CORECONF instance identifier"""
+        schema = []
+        keys = []
+        for name, predicates in path_segments(path):
+            schema.append(name)
+            keys.extend(predicates.values())
+        # Module prefixes are only kept where the module changes
+        normalized = []
+        module = None
+        for name in schema:
+            prefix, sep, local = name.rpartition(':')
+            if sep and prefix != module:
+                module = prefix
+                normalized.append(name)
+            else:
+                normalized.append(local)
+        schema_path = '/' + '/'.join(normalized)
+        sid = self.by_path.get(schema_path)
+        if sid is None:
+            return None
+        return [sid] + keys if keys else sid
+
+    def member_name(self, sid):
+        """RFC 7951 member name of a SID: the node name, prefixed with its
+        module where that differs from the parent's, as in the SID file"""
+        identifier = self.by_sid.get(sid)
+        if identifier is None:
+            return str(sid)
+        return identifier.rsplit('/', 1)[-1]
+
+    def to_names(self, value, parent=0):
+        """Replace (delta) SID keys with RFC 7951 member names"""
+        if isinstance(value, dict):
+            named = {}
+            for key, item in value.items():
+                if isinstance(key, int):
+                    sid = parent + key
+                    named[self.member_name(sid)] = self.to_names(item, sid)
+                else:
+                    named[str(key)] = self.to_names(item, parent)
+            return named
+        if isinstance(value, list):
+            return [self.to_names(item, parent) for item in value]
+        return cbor.to_json(value)
+
+
+class CoreconfClient:
+    """CORECONF datastore operations addressed by YANG path"""
+
+    def __init__(self, coap_client, sids):
+        self.coap = coap_client
+        self.sids = sids
+
+    def supports(self, path):
+        return self.sids.instance_identifier(path) is not None
+
+    def _decode_instances(self, payload):
+        """[(instance identifier, value)] of a yang-instances CBOR sequence"""
+        instances = []
+        for item in cbor.loads_seq(payload):
+            if isinstance(item, dict):
+                instances.extend(item.items())
+        return instances
+
+    def tree(self, path, value):
+        """A fetched instance as the CLI prints it: RFC 7951 JSON from the
+        datastore root down to path, with list keys taken from the path"""
+        segments = path_segments(path)
+        sid = self.sids.instance_identifier(path)
+        node = self.sids.to_names(value, sid[0] if isinstance(sid, list) else sid)
+        for name, keys in reversed(segments):
+            if keys:
+                entry = dict(keys)
+                if isinstance(node, dict):
+                    entry.update(node)
+                node = {name: [entry]}
+            else:
+                node = {name: node}
+        return node
+
+    def _trees(self, paths, payload):
+        # Instances are matched to paths by identifier, not by position
+        by_identifier = {}
+        for path in paths:
+            identifier = self.sids.instance_identifier(path)
+            by_identifier[tuple(identifier) if isinstance(identifier, list) else identifier] = path
+        trees = {}
+        for identifier, value in self._decode_instances(payload):
+            path = by_identifier.get(identifier)
+            if path is not None:
+                trees[path] = self.tree(path, value)
+        return trees
+
+    def fetch(self, paths, timeout=COAP_TIMEOUT):
+        """Read several paths in one FETCH round trip; returns {path: data}"""
+        identifiers = [self.sids.instance_identifier(path) for path in paths]
+        if None in identifiers:
+            raise CoapError('Path not covered by the loaded SID files')
+        response = self.coap.request(
+            'FETCH', CORECONF_URI, cbor.dumps_seq(identifiers),
+            content_format=CF_YANG_IDENTIFIERS_CBOR_SEQ,
+            accept=CF_YANG_INSTANCES_CBOR_SEQ, timeout=timeout)
+        if response.code >> 5 != 2:
+            raise CoapError(f'FETCH failed with {code_string(response.code)}')
+        return self._trees(paths, response.payload)
+
+    def fetch_many(self, paths, timeout=COAP_TIMEOUT):
+        """Pipeline one FETCH per path; returns {path: data or error}"""
+        requests = [{
+            'method': 'FETCH',
+            'uri': CORECONF_URI,
+            'payload': cbor.dumps_seq([self.sids.instance_identifier(path)]),
+            'content_format': CF_YANG_IDENTIFIERS_CBOR_SEQ,
+            'accept': CF_YANG_INSTANCES_CBOR_SEQ
+        } for path in paths]
+        results = {}
+        for path, response in zip(paths, self.coap.request_many(requests, timeout=timeout)):
+            if isinstance(response, Exception):
+                results[path] = response
+            elif response.code >> 5 != 2:
+                results[path] = CoapError(f'FETCH failed with {code_string(response.code)}')
+            else:
+                results[path] = self._trees([path], response.payload).get(path)
+        return results
+
+    def ipatch(self, edits, timeout=COAP_TIMEOUT):
+        """Apply {path: value} edits in one iPATCH; None deletes the node"""
+        instances = []
+        for path, value in edits.items():
+            identifier = self.sids.instance_identifier(path)
+            if identifier is None:
+                raise CoapError(f'Path not covered by the loaded SID files: {path}')
+            if isinstance(identifier, list):
+                identifier = tuple(identifier)
+            instances.append({identifier: value})
+        payload = cbor.dumps_seq(instances)
+        response = self.coap.request('IPATCH', CORECONF_URI, payload,
+                                     content_format=CF_YANG_INSTANCES_CBOR_SEQ,
+                                     timeout=timeout)
+        if response.code >> 5 != 2:
+            raise CoapError(f'iPATCH failed with {code_string(response.code)}')
+        return response
+
+    def execute(self, args, timeout=COAP_TIMEOUT):
+        """Handle 'coap' and 'get' CLI commands natively, or return None"""
+        if len(args) < 4 or args[0] != 'device':
+            return None
+
+        command = ' '.join(args)
+        try:
+            if args[2] == 'coap' and len(args) in (5, 6):
+                data, code = self._send_coap(args[3], args[4], args[5] if len(args) == 6 else '',
+                                             timeout)
+                success = code >> 5 == 2
+            elif args[2] == 'get' and len(args) == 4 and self.supports(args[3]):
+                data = self.fetch([args[3]], timeout=timeout).get(args[3])
+                if data is None:
+                    raise CoapError(f'Path not found: {args[3]}')
+                code, success = 69, True
+            else:
+                return None
+        except TimeoutError:
+            return {
+                'success': False,
+                'error': f'Command timeout after {timeout}s',
+                'command': command
+            }
+        except (CoapError, cbor.CBORError) as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'command': command
+            }
+        except Mup1Error as e:
+            # Link closed or lent to mvdct: let the caller fall back to the CLI
+            logger.debug(f"CORECONF unavailable for {command}: {e}")
+            return None
+
+        return {
+            'success': success,
+            'stdout': data if isinstance(data, str) else json.dumps(data, indent=2),
+            'stderr': '' if success else f'CoAP {code_string(code)}',
+            'data': data,
+            'code': code_string(code),
+            'command': command,
+            'returncode': 0 if success else 1
+        }
+
+    def _send_coap(self, method, uri, payload, timeout):
+        """Send a raw CoAP request; JSON payloads are sent as CBOR"""
+        content_format = None
+        body = b''
+        if payload:
+            try:
+                body = cbor.dumps(json.loads(payload))
+                content_format = CF_CBOR
+            except ValueError:
+                body = payload.encode()
+
+        response = self.coap.request(method, uri, body, content_format=content_format,
+                                     timeout=timeout)
+        response_format = response.option_uint(OPT_CONTENT_FORMAT)
+        if response_format in (CF_CBOR, CF_YANG_DATA_CBOR_SID):
+            data = self.sids.to_names(cbor.loads(response.payload))
+        elif response_format == CF_YANG_INSTANCES_CBOR_SEQ:
+            data = {}
+            for identifier, value in self._decode_instances(response.payload):
+                sid = identifier[0] if isinstance(identifier, tuple) else identifier
+                data[self.sids.by_sid.get(sid, str(sid))] = self.sids.to_names(value, sid)
+        else:
+            data = response.payload.decode(errors='replace')
+        return data, response.code
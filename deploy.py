@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+VelocityDRIVE Touch GUI - Bulk configuration deploy
+Applies one configuration, or a template rendered with per-device
+variables, to many devices with bounded parallelism and an optional canary
+stage, keeping per-device progress that clients can poll or stream
+"""
+
+import contextvars
+import itertools
+import json
+import os
+import string
+import tempfile
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Devices configured at the same time unless a deployment asks otherwise
+DEPLOY_PARALLEL = int(os.environ.get('VELOCITYDRIVE_DEPLOY_PARALLEL', '4'))
+# Finished deployments kept for status queries
+DEPLOY_HISTORY = 20
+
+# How a configuration is applied: 'import' (json/yaml/...) or 'patch'
+KINDS = ('import', 'patch')
+
+PENDING = 'pending'
+APPLYING = 'applying'
+DONE = 'done'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+
+def render(template, variables):
+    """Substitute ${name} placeholders ($$ for a literal $); raises KeyError
+    for a missing variable. Content without placeholders is used as is."""
+    if '${' not in template:
+        return template
+    return string.Template(template).substitute(variables)
+
+
+class Deployment:
+    """State and event log of one deployment"""
+
+    def __init__(self, deploy_id, devices, kind, fmt, canary, parallel):
+        self.id = deploy_id
+        self.kind = kind
+        self.format = fmt
+        self.canary = canary
+        self.parallel = parallel
+        self.devices = {device: {'device': device, 'state': PENDING} for device in devices}
+        self.order = list(devices)
+        self.events = []
+        self.started = time.time()
+        self.finished = None
+        self.cancelled = False
+        self.stage = None
+        self.cond = threading.Condition()
+
+    def emit(self, event):
+        with self.cond:
+            self.events.append(dict(event, time=time.time()))
+            self.cond.notify_all()
+
+    def update(self, device, **fields):
+        with self.cond:
+            self.devices[device].update(fields)
+            event = dict(self.devices[device], type='device', stage=self.stage)
+        self.emit(event)
+
+    def counts(self):
+        with self.cond:
+            states = [entry['state'] for entry in self.devices.values()]
+        return {state: states.count(state) for state in (PENDING, APPLYING, DONE, FAILED, SKIPPED)}
+
+    def summary(self, details=True):
+        counts = self.counts()
+        summary = {
+            'id': self.id,
+            'kind': self.kind,
+            'format': self.format,
+            'canary': self.canary,
+            'parallel': self.parallel,
+            'stage': self.stage,
+            'running': self.finished is None,
+            'cancelled': self.cancelled,
+            'success': self.finished is not None and counts[DONE] == len(self.devices),
+            'counts': counts,
+            'elapsed_ms': round(((self.finished or time.time()) - self.started) * 1000, 2)
+        }
+        if details:
+            with self.cond:
+                summary['devices'] = [dict(self.devices[device]) for device in self.order]
+        return summary
+
+    def finish(self):
+        with self.cond:
+            self.finished = time.time()
+            self.events.append(dict(self.summary(details=False), type='done', time=self.finished))
+            self.cond.notify_all()
+
+    def stream(self, heartbeat=15):
+        """Events from the start of the deployment until it finishes"""
+        index = 0
+        while True:
+            with self.cond:
+                if index >= len(self.events) and self.finished is None:
+                    self.cond.wait(heartbeat)
+                pending = self.events[index:]
+                finished = self.finished is not None
+            index += len(pending)
+            yield from pending
+            if finished and not pending:
+                return
+            if not pending:
+                yield {'type': 'heartbeat', 'time': time.time()}
+
+
+class DeployEngine:
+    """Runs deployments in the background"""
+
+    def __init__(self, execute, parallel=DEPLOY_PARALLEL):
+        self.execute = execute
+        self.parallel = parallel
+        self.deployments = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def start(self, devices, content, kind='import', fmt='json', variables=None,
+              device_variables=None, canary=0, parallel=None, timeout=60):
+        """Start deploying content to devices and return the Deployment
+
+        content is a template when it contains ${name} placeholders; each
+        device sees variables, then its own device_variables entry, and
+        ${device} itself. The first `canary` devices are configured first and
+        the rollout is abandoned if any of them fails. A JSON import may give
+        content as an object or list instead of text.
+        """
+        if kind not in KINDS:
+            raise ValueError(f'Kind must be one of: {", ".join(KINDS)}')
+        if kind == 'import' and fmt == 'json' and isinstance(content, (dict, list)):
+            content = json.dumps(content, indent=2)
+        if not isinstance(content, str):
+            raise ValueError('Configuration data must be text (or an object for a JSON import)')
+        if not devices:
+            raise ValueError('No devices to deploy to')
+        devices = list(dict.fromkeys(devices))
+        parallel = max(1, int(parallel or self.parallel))
+        canary = max(0, min(int(canary or 0), len(devices)))
+
+        deployment = Deployment(str(next(self.ids)), devices, kind, fmt, canary, parallel)
+        with self.lock:
+            self.deployments[deployment.id] = deployment
+            finished = [key for key, value in self.deployments.items() if value.finished]
+            for key in finished[:max(len(self.deployments) - DEPLOY_HISTORY, 0)]:
+                del self.deployments[key]
+
+        # Render every device up front so a template error fails nothing on the wire
+        rendered = {}
+        for device in devices:
+            values = dict(variables or {}, device=device)
+            values.update((device_variables or {}).get(device, {}))
+            try:
+                rendered[device] = render(content, values)
+            except (KeyError, ValueError) as e:
+                deployment.update(device, state=FAILED, error=f'Template error: {e}')
+
+        # Run in a copy of the caller's context so a traced request keeps its spans
+        thread = threading.Thread(target=contextvars.copy_context().run,
+                                  args=(self._run, deployment, rendered, timeout),
+                                  name=f'deploy-{deployment.id}', daemon=True)
+        thread.start()
+        logger.info(f"Deployment {deployment.id}: {kind} to {len(devices)} devices")
+        return deployment
+
+    def _apply(self, deployment, device, content, timeout):
+        if deployment.cancelled:
+            deployment.update(device, state=SKIPPED, error='Deployment cancelled')
+            return False
+        started = time.time()
+        deployment.update(device, state=APPLYING, started=started)
+        suffix = '.patch' if deployment.kind == 'patch' else f'.{deployment.format}'
+        path = None
+        try:
+            with tempfile.NamedTemporaryFile(mode='w', suffix=suffix, delete=False) as f:
+                path = f.name
+                f.write(content)
+            if deployment.kind == 'patch':
+                args = ['device', device, 'patch', path]
+            else:
+                args = ['device', device, 'import', deployment.format, path]
+            result = self.execute(args, timeout)
+        except Exception as e:
+            result = {'success': False, 'error': str(e)}
+        finally:
+            if path:
+                os.unlink(path)
+
+        fields = {'state': DONE if result.get('success') else FAILED,
+                  'duration_ms': round((time.time() - started) * 1000, 2)}
+        if not result.get('success'):
+            fields['error'] = result.get('error') or result.get('stderr') or 'Deploy failed'
+        deployment.update(device, **fields)
+        return result.get('success')
+
+    def _stage(self, deployment, name, devices, rendered, timeout):
+        deployment.stage = name
+        deployment.emit({'type': 'stage', 'stage': name, 'devices': devices})
+        with ThreadPoolExecutor(max_workers=deployment.parallel,
+                                thread_name_prefix=f'deploy-{deployment.id}') as executor:
+            futures = [executor.submit(contextvars.copy_context().run, self._apply,
+                                       deployment, device, rendered[device], timeout)
+                       for device in devices]
+            return all([future.result() for future in futures])
+
+    def _run(self, deployment, rendered, timeout):
+        devices = [device for device in deployment.order if device in rendered]
+        try:
+            canaries, rollout = devices[:deployment.canary], devices[deployment.canary:]
+            ok = True
+            if canaries:
+                ok = self._stage(deployment, 'canary', canaries, rendered, timeout)
+            if ok and rollout:
+                self._stage(deployment, 'rollout', rollout, rendered, timeout)
+            elif rollout:
+                for device in rollout:
+                    deployment.update(device, state=SKIPPED, error='Canary stage failed')
+        except Exception as e:
+            logger.error(f"Deployment {deployment.id} failed: {e}")
+        finally:
+            deployment.finish()
+
+    def get(self, deploy_id):
+        with self.lock:
+            return self.deployments.get(deploy_id)
+
+    def cancel(self, deploy_id):
+        """Skip devices not yet started; running ones finish"""
+        deployment = self.get(deploy_id)
+        if deployment is None or deployment.finished:
+            return False
+        deployment.cancelled = True
+        return True
+
+    def list(self):
+        with self.lock:
+            deployments = list(self.deployments.values())
+        return [deployment.summary(details=False) for deployment in deployments]
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+VelocityDRIVE Touch GUI - Device fleet registry
+One worker thread and bounded queue per device: commands to different
+boards run in parallel, reads to one board run concurrently and writes to
+it run alone in arrival order, plus fan-out of one read to many devices
+with aggregated results
+"""
+
+import contextvars
+import os
+import queue
+import threading
+import time
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from batch import is_read_command
+
+logger = logging.getLogger(__name__)
+
+# Commands allowed to wait for one device before new ones are refused
+DEVICE_QUEUE_SIZE = int(os.environ.get('VELOCITYDRIVE_DEVICE_QUEUE', '32'))
+# Reads running on one device at the same time
+DEVICE_READS = int(os.environ.get('VELOCITYDRIVE_DEVICE_READS', '4'))
+# Devices queried at the same time by fleet-wide requests
+FANOUT_WORKERS = int(os.environ.get('VELOCITYDRIVE_FANOUT_WORKERS', '16'))
+# Seconds an unregistered device's worker may sit idle before it is removed
+WORKER_IDLE = float(os.environ.get('VELOCITYDRIVE_WORKER_IDLE', '60'))
+# Events a streamed command may run ahead of its client
+STREAM_RELAY_SIZE = 256
+
+
+class DeviceWorker:
+    """Takes one device's commands in arrival order on its own thread; reads
+    run concurrently on the shared read pool, a write waits for the reads
+    before it and runs alone"""
+
+    def __init__(self, device, execute, queue_size=DEVICE_QUEUE_SIZE, on_wait=None,
+                 reads=None, max_reads=DEVICE_READS, is_read=is_read_command, on_idle=None):
+        self.device = device
+        self.execute = execute
+        # on_wait(device, seconds) is told how long each command sat in the queue
+        self.on_wait = on_wait
+        # on_idle(worker) returns True when an idle worker should stop
+        self.on_idle = on_idle
+        self.reads = reads
+        self.is_read = is_read
+        self.read_slots = threading.Semaphore(max_reads)
+        self.in_flight = 0
+        self.idle = threading.Condition()
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.executed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.busy_since = None
+        self.last_error = None
+        self.last_seen = None
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name=f'device-{device}', daemon=True)
+        self.thread.start()
+
+    def submit(self, args, timeout=30, execute=None):
+        """Queue a command, optionally with its own execute(args, timeout);
+        returns a Future with its result. The command runs in the caller's
+        context, so request-scoped state such as trace spans follows it."""
+        future = Future()
+        item = (args, timeout, execute or self.execute, time.time(), future, contextvars.copy_context())
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.rejected += 1
+            future.set_result({'success': False, 'busy': True, 'command': ' '.join(map(str, args)),
+                               'error': f'Too many commands queued for {self.device}'})
+        return future
+
+    def _run(self):
+        while self.running:
+            try:
+                item = self.queue.get(timeout=WORKER_IDLE)
+            except queue.Empty:
+                if self.on_idle and self.on_idle(self):
+                    return
+                continue
+            if item is None:
+                return
+            args, timeout, execute, queued_at, future, context = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            if self.on_wait:
+                context.run(self.on_wait, self.device, time.time() - queued_at)
+            if time.time() - queued_at > timeout:
+                # The caller's deadline passed while earlier commands ran
+                future.set_result({'success': False, 'command': ' '.join(map(str, args)),
+                                   'error': f'Timed out after {timeout}s waiting for {self.device}'})
+                continue
+
+            if self.reads is not None and self.is_read(args):
+                self.read_slots.acquire()
+                with self.idle:
+                    self.in_flight += 1
+                try:
+                    self.reads.submit(self._read, args, timeout, execute, future, context)
+                except RuntimeError:
+                    # Read pool shut down on close
+                    self._read(args, timeout, execute, future, context)
+                continue
+            with self.idle:
+                self.idle.wait_for(lambda: self.in_flight == 0)
+            self.busy_since = time.time()
+            self._execute(args, timeout, execute, future, context)
+            self.busy_since = None
+
+    def _read(self, args, timeout, execute, future, context):
+        try:
+            self._execute(args, timeout, execute, future, context)
+        finally:
+            self.read_slots.release()
+            with self.idle:
+                self.in_flight -= 1
+                self.idle.notify_all()
+
+    def _execute(self, args, timeout, execute, future, context):
+        try:
+            result = context.run(execute, args, timeout)
+        except Exception as e:
+            result = {'success': False, 'error': str(e), 'command': ' '.join(map(str, args))}
+        self.executed += 1
+        if result.get('success'):
+            self.last_seen = time.time()
+        else:
+            self.failed += 1
+            self.last_error = result.get('error') or result.get('stderr')
+        future.set_result(result)
+
+    def stop(self):
+        """Stop after the running command; queued commands fail at once"""
+        self.running = False
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                continue
+            args, _, _, _, future, _ = item
+            if future.set_running_or_notify_cancel():
+                future.set_result({'success': False, 'command': ' '.join(map(str, args)),
+                                   'error': f'Device {self.device} was removed'})
+        self.queue.put(None)
+
+    def status(self):
+        return {
+            'queued': self.queue.qsize(),
+            'reads': self.in_flight,
+            'busy_ms': round((time.time() - self.busy_since) * 1000, 2) if self.busy_since else None,
+            'executed': self.executed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'last_error': self.last_error,
+            'last_seen': self.last_seen
+        }
+
+
+class DeviceRegistry:
+    """Known devices and their workers"""
+
+    def __init__(self, execute, queue_size=DEVICE_QUEUE_SIZE, fanout_workers=FANOUT_WORKERS,
+                 on_wait=None):
+        self.execute = execute
+        self.queue_size = queue_size
+        self.on_wait = on_wait
+        self.workers = {}
+        self.devices = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=fanout_workers, thread_name_prefix='fanout')
+        # Shared by all workers for concurrent reads
+        self.reads = ThreadPoolExecutor(max_workers=fanout_workers, thread_name_prefix='device-read')
+
+    def _worker(self, device):
+        # Called with lock held
+        worker = self.workers.get(device)
+        if worker is None:
+            worker = self.workers[device] = DeviceWorker(device, self.execute, self.queue_size,
+                                                         self.on_wait, reads=self.reads,
+                                                         on_idle=self._expire)
+        return worker
+
+    def _expire(self, worker):
+        # Workers of unregistered devices go once idle; submitting holds the
+        # lock, so nothing can be queued between this check and the removal
+        with self.lock:
+            if worker.device in self.devices or not worker.queue.empty() or worker.in_flight:
+                return False
+            if self.workers.get(worker.device) is worker:
+                del self.workers[worker.device]
+            worker.running = False
+            return True
+
+    def run(self, args, timeout=30, execute=None):
+        """Execute a command, on its device's worker for 'device <dev> ...'"""
+        execute = execute or self.execute
+        if len(args) < 2 or args[0] != 'device':
+            return execute(args, timeout)
+        with self.lock:
+            future = self._worker(args[1]).submit(args, timeout, execute)
+        try:
+            # At most timeout waiting in the queue plus timeout running
+            return future.result(timeout=2 * timeout + 5)
+        except FutureTimeout:
+            return {'success': False, 'command': ' '.join(map(str, args)),
+                    'error': f'Timed out after {timeout}s waiting for {args[1]}'}
+
+    def stream(self, args, events, timeout=30):
+        """Yield events(args, timeout) for a 'device <dev> ...' command
+
+        The generator runs on the device's worker as a write: it waits for
+        the reads in flight and later commands wait until it finishes. It
+        returns the last 'done' event without its type as the command result.
+        If the client goes away the generator is closed on the worker.
+        """
+        if len(args) < 2 or args[0] != 'device':
+            yield from events(args, timeout)
+            return
+        relay = queue.Queue(maxsize=STREAM_RELAY_SIZE)
+        started = threading.Event()
+        closed = threading.Event()
+
+        def offer(item):
+            while not closed.is_set():
+                try:
+                    relay.put(item, timeout=1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def produce(args, timeout):
+            started.set()
+            done = {'type': 'done', 'success': False, 'command': ' '.join(map(str, args)),
+                    'error': 'Stream closed before the command finished'}
+            generator = events(args, timeout)
+            try:
+                for event in generator:
+                    if event.get('type') == 'done':
+                        done = event
+                    if not offer(event):
+                        break
+            finally:
+                generator.close()
+                offer(None)
+            return {key: value for key, value in done.items() if key != 'type'}
+
+        with self.lock:
+            future = self._worker(args[1]).submit(args, timeout, produce)
+        try:
+            while True:
+                try:
+                    event = relay.get(timeout=1)
+                except queue.Empty:
+                    if future.done() and not started.is_set():
+                        # Refused or timed out before it reached the device
+                        yield dict(future.result(), type='done')
+                        return
+                    continue
+                if event is None:
+                    return
+                yield event
+        finally:
+            closed.set()
+
+    def register(self, device, **info):
+        """Add or update a device, e.g. with its name or type"""
+        with self.lock:
+            entry = self.devices.setdefault(device, {'device': device, 'registered': time.time()})
+            entry.update({key: value for key, value in info.items() if value is not None})
+            self._worker(device)
+        return dict(entry)
+
+    def unregister(self, device):
+        with self.lock:
+            entry = self.devices.pop(device, None)
+            worker = self.workers.pop(device, None)
+        if worker:
+            worker.stop()
+        return entry is not None
+
+    def registered(self):
+        with self.lock:
+            return list(self.devices)
+
+    def fan_out(self, devices, build_args, execute=None, timeout=30):
+        """Run build_args(device) on every device at once
+
+        Returns {'success', 'results': {device: result}, 'succeeded', 'failed',
+        'elapsed_ms'}; success means every device answered.
+        """
+        execute = execute or self.run
+        started = time.time()
+        futures = {device: self.executor.submit(contextvars.copy_context().run, execute,
+                                                build_args(device), timeout)
+                   for device in devices}
+        results = {}
+        for device, future in futures.items():
+            try:
+                results[device] = future.result()
+            except Exception as e:
+                results[device] = {'success': False, 'error': str(e)}
+        succeeded = [device for device, result in results.items() if result.get('success')]
+        return {
+            'success': bool(results) and len(succeeded) == len(results),
+            'results': results,
+            'succeeded': len(succeeded),
+            'failed': len(results) - len(succeeded),
+            'elapsed_ms': round((time.time() - started) * 1000, 2)
+        }
+
+    def close(self):
+        with self.lock:
+            workers = list(self.workers.values())
+            self.workers.clear()
+        for worker in workers:
+            worker.stop()
+        self.executor.shutdown(wait=False)
+        self.reads.shutdown(wait=False)
+
+    def status(self):
+        with self.lock:
+            devices = {device: dict(entry) for device, entry in self.devices.items()}
+            workers = dict(self.workers)
+        for device, worker in workers.items():
+            devices.setdefault(device, {'device': device})['worker'] = worker.status()
+        return devices
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+VelocityDRIVE Touch GUI - Gate Control List compiler
+Validates TAS (802.1Qbv) schedules before they are sent to a device,
+merges adjacent identical entries and reports per-queue open time and the
+longest time each queue's gate stays closed
+"""
+
+import time
+
+# Traffic classes on a LAN9662 port
+NUM_QUEUES = 8
+NS_PER_SECOND = 1000000000
+
+# Spellings used by the GUIs and by ieee802-dot1q-sched
+LIST_KEYS = ('adminControlList', 'admin-control-list', 'gate_list', 'gate-control-entry')
+STATE_KEYS = ('gateStates', 'gate_states', 'gate-states-value')
+INTERVAL_KEYS = ('timeInterval', 'time_interval', 'time-interval-value')
+CYCLE_KEYS = ('adminCycleTime', 'admin_cycle_time', 'admin-cycle-time')
+
+
+class ScheduleError(ValueError):
+    pass
+
+
+def _find(mapping, keys):
+    for key in keys:
+        if key in mapping:
+            return key
+    return None
+
+
+def _control_list(schedule):
+    """(container, key) holding the entry list, following admin-control-list/gate-control-entry"""
+    key = _find(schedule, LIST_KEYS)
+    if key is None:
+        raise ScheduleError('Schedule has no gate control list')
+    value = schedule[key]
+    if isinstance(value, dict):
+        return _control_list(value)
+    if not isinstance(value, list):
+        raise ScheduleError('Gate control list must be a list of entries')
+    return schedule, key
+
+
+def cycle_time_ns(value):
+    """Cycle time in ns from an integer or a YANG rational of seconds"""
+    if isinstance(value, dict):
+        numerator = int(value.get('numerator', 0))
+        denominator = int(value.get('denominator', 1))
+        if denominator <= 0:
+            raise ScheduleError('Cycle time denominator must be positive')
+        return numerator * NS_PER_SECOND // denominator
+    if isinstance(value, bool):
+        raise ScheduleError('Cycle time must be a number')
+    return int(value)
+
+
+def gate_states(value, queues=NUM_QUEUES):
+    """Gate mask as an int from an int or a '0xFF'/'255'/'0b11' string"""
+    if isinstance(value, str):
+        try:
+            value = int(value.strip(), 0)
+        except ValueError:
+            raise ScheduleError(f'Gate states {value!r} is not a number')
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ScheduleError(f'Gate states must be an integer mask, not {value!r}')
+    if not 0 <= value < 1 << queues:
+        raise ScheduleError(f'Gate states 0x{value:X} outside the {queues}-queue mask')
+    return value
+
+
+def merge(entries):
+    """Combine consecutive entries with the same gate states"""
+    merged = []
+    for states, interval in entries:
+        if merged and merged[-1][0] == states:
+            merged[-1] = (states, merged[-1][1] + interval)
+        else:
+            merged.append((states, interval))
+    return merged
+
+
+def analyze(entries, cycle, queues=NUM_QUEUES):
+    """Per-queue open time and longest closed stretch over one cycle
+
+    entries must already fill exactly one cycle. A closed stretch that ends
+    the cycle continues into the first entry of the next one.
+    """
+    report = []
+    for queue in range(queues):
+        bit = 1 << queue
+        open_ns = 0
+        longest = run = 0
+        leading = None
+        for states, interval in entries:
+            if states & bit:
+                open_ns += interval
+                if leading is None:
+                    leading = run
+                longest = max(longest, run)
+                run = 0
+            else:
+                run += interval
+        if leading is None:
+            # Never open: frames in this class wait forever
+            max_closed = None
+        else:
+            max_closed = max(longest, run + leading)
+        report.append({
+            'queue': queue,
+            'open_ns': open_ns,
+            'open_fraction': round(open_ns / cycle, 6) if cycle else 0,
+            'max_closed_ns': max_closed
+        })
+    return report
+
+
+def compile_schedule(schedule, queues=NUM_QUEUES, merge_entries=True):
+    """Validate a schedule; returns (schedule to send, report)
+
+    The returned schedule keeps the caller's key names, with adjacent
+    identical entries merged when merge_entries is set. report['valid'] is
+    False when the schedule must not be sent; 'errors' says why.
+    """
+    started = time.time()
+    errors = []
+    warnings = []
+    report = {'valid': False, 'errors': errors, 'warnings': warnings}
+
+    try:
+        container, list_key = _control_list(schedule)
+        raw = container[list_key]
+        if not raw:
+            raise ScheduleError('Gate control list is empty')
+        cycle_key = _find(schedule, CYCLE_KEYS)
+        cycle = cycle_time_ns(schedule[cycle_key]) if cycle_key else None
+    except (ScheduleError, TypeError, ValueError) as e:
+        errors.append(str(e))
+        return schedule, report
+
+    entries = []
+    for index, entry in enumerate(raw):
+        if not isinstance(entry, dict):
+            errors.append(f'Entry {index}: must be an object')
+            continue
+        state_key = _find(entry, STATE_KEYS)
+        interval_key = _find(entry, INTERVAL_KEYS)
+        if state_key is None or interval_key is None:
+            errors.append(f'Entry {index}: needs gate states and a time interval')
+            continue
+        try:
+            states = gate_states(entry[state_key], queues)
+            interval = entry[interval_key]
+            if isinstance(interval, bool) or int(interval) != interval or interval <= 0:
+                raise ScheduleError(f'Time interval must be a positive integer of ns, not {interval!r}')
+            entries.append((states, int(interval)))
+        except (ScheduleError, TypeError, ValueError) as e:
+            errors.append(f'Entry {index}: {e}')
+    if errors:
+        return schedule, report
+
+    list_time = sum(interval for _, interval in entries)
+    if cycle is None:
+        cycle = list_time
+        warnings.append('No cycle time given; using the sum of the intervals')
+    if cycle <= 0:
+        errors.append('Cycle time must be positive')
+        return schedule, report
+    if list_time > cycle:
+        errors.append(f'Intervals add up to {list_time} ns, more than the {cycle} ns cycle; '
+                      'the device would cut the list short')
+        return schedule, report
+
+    operations = {entry.get('operation-name', 'set-gate-states') for entry in raw}
+    if merge_entries and operations != {'set-gate-states'}:
+        # Hold/release operations change more than the gate states
+        warnings.append('Entries with other operations than set-gate-states are not merged')
+        merge_entries = False
+    compiled = merge(entries) if merge_entries else list(entries)
+    # The device holds the last entry's gate states until the cycle restarts
+    effective = list(compiled)
+    if list_time < cycle:
+        warnings.append(f'Intervals add up to {list_time} ns; the last entry is held '
+                        f'for the remaining {cycle - list_time} ns of the cycle')
+        effective[-1] = (effective[-1][0], effective[-1][1] + cycle - list_time)
+    effective = merge(effective)
+
+    queue_report = analyze(effective, cycle, queues)
+    for item in queue_report:
+        if item['max_closed_ns'] is None:
+            warnings.append(f"Queue {item['queue']} is never open")
+
+    out = dict(schedule)
+    if compiled != entries:
+        sample = raw[0]
+        state_key = _find(sample, STATE_KEYS)
+        interval_key = _find(sample, INTERVAL_KEYS)
+        as_text = isinstance(sample[state_key], str)
+        new_entries = []
+        for index, (states, interval) in enumerate(compiled):
+            entry = {key: value for key, value in sample.items() if key != 'index'}
+            entry[state_key] = f'0x{states:02X}' if as_text else states
+            entry[interval_key] = interval
+            if 'index' in sample:
+                entry['index'] = index
+            new_entries.append(entry)
+        out = _replace_list(schedule, new_entries)
+
+    report.update({
+        'valid': True,
+        'cycle_time_ns': cycle,
+        'list_time_ns': list_time,
+        'entries': len(entries),
+        'compiled_entries': len(compiled),
+        'queues': queue_report,
+        'elapsed_ms': round((time.time() - started) * 1000, 3)
+    })
+    return out, report
+
+
+def _replace_list(schedule, entries):
+    """Copy of schedule with its gate control list replaced"""
+    key = _find(schedule, LIST_KEYS)
+    copy = dict(schedule)
+    if isinstance(schedule[key], dict):
+        copy[key] = _replace_list(schedule[key], entries)
+    else:
+        copy[key] = entries
+    return copy
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+VelocityDRIVE Touch GUI - Request metrics
+Counters and latency histograms labelled by operation, YANG path, transport
+and endpoint, rendered in the Prometheus text format for /api/metrics and
+condensed into a summary for /api/health
+"""
+
+import os
+import re
+import threading
+
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Label combinations kept per metric; later ones are counted under 'other'
+MAX_SERIES = int(os.environ.get('VELOCITYDRIVE_METRICS_SERIES', '500'))
+
+COUNTER = 'counter'
+GAUGE = 'gauge'
+HISTOGRAM = 'histogram'
+
+# List keys in a path ([name="eth0"]) would make one series per instance
+_PREDICATE = re.compile(r'\[[^\]]*\]')
+# A YANG path starts with a module-qualified node; file arguments
+# (fetch, patch and import files) do not and get no path label
+_YANG_PATH = re.compile(r'^/[A-Za-z_][\w.-]*:')
+
+
+def operation(args):
+    """(operation, YANG path) of a CLI command, path without list keys"""
+    if len(args) > 2 and args[0] == 'device':
+        path = str(args[3]) if len(args) > 3 else ''
+        if not _YANG_PATH.match(path):
+            path = ''
+        return args[2], _PREDICATE.sub('', path)
+    return (args[0] if args else ''), ''
+
+
+def outcome(result):
+    """'ok', 'timeout', 'busy' or 'error' for a command result"""
+    if result.get('success'):
+        return 'ok'
+    if result.get('busy'):
+        return 'busy'
+    error = (result.get('error') or '').lower()
+    if 'timeout' in error or 'timed out' in error:
+        return 'timeout'
+    return 'error'
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.sum += other.sum
+        self.count += other.count
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        """Estimate by linear interpolation inside the bucket holding q,
+        capped at the largest value seen"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                if index == len(self.buckets):
+                    return self.max
+                upper = min(self.buckets[index], self.max)
+                return lower + max(upper - lower, 0.0) * (rank - seen) / count
+            seen += count
+            if index < len(self.buckets):
+                lower = self.buckets[index]
+        return lower
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs, extra=()):
+    pairs = tuple(pairs) + tuple(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class Metrics:
+    """Registry of labelled counters, gauges and histograms"""
+
+    def __init__(self, prefix='velocitydrive', buckets=LATENCY_BUCKETS, max_series=MAX_SERIES):
+        self.prefix = prefix
+        self.buckets = buckets
+        self.max_series = max_series
+        # name -> {'type', 'help', 'series': {label pairs: value or Histogram}}
+        self.metrics = {}
+        self.collectors = []
+        self.lock = threading.Lock()
+
+    def define(self, name, kind, help_text):
+        with self.lock:
+            self.metrics.setdefault(name, {'type': kind, 'help': help_text, 'series': {}})
+
+    def add_collector(self, callback):
+        """callback() -> [(name, type, help, {label pairs: value})] read at render time"""
+        self.collectors.append(callback)
+
+    def _series(self, name, labels, factory):
+        # Called with lock held
+        series = self.metrics[name]['series']
+        key = tuple(sorted(labels.items()))
+        if key not in series and len(series) >= self.max_series:
+            key = tuple((label, 'other') for label, _ in key)
+        if key not in series:
+            series[key] = factory()
+        return key, series
+
+    def inc(self, name, amount=1, **labels):
+        with self.lock:
+            key, series = self._series(name, labels, int)
+            series[key] += amount
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            key, series = self._series(name, labels, float)
+            series[key] = value
+
+    def observe(self, name, value, **labels):
+        with self.lock:
+            key, series = self._series(name, labels, lambda: Histogram(self.buckets))
+            series[key].observe(value)
+
+    def _collected(self):
+        for callback in self.collectors:
+            yield from callback()
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            metrics = [(name, metric['type'], metric['help'], dict(metric['series']))
+                       for name, metric in sorted(self.metrics.items())]
+            for _, kind, _, series in metrics:
+                if kind == HISTOGRAM:
+                    for key, histogram in series.items():
+                        copy = Histogram(self.buckets)
+                        copy.merge(histogram)
+                        series[key] = copy
+        for name, kind, help_text, series in metrics + list(self._collected()):
+            full = f'{self.prefix}_{name}'
+            lines.append(f'# HELP {full} {help_text}')
+            lines.append(f'# TYPE {full} {kind}')
+            for key, value in sorted(series.items()):
+                if kind != HISTOGRAM:
+                    lines.append(f'{full}{_labels(key)} {_number(value)}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), value.counts):
+                    cumulative += count
+                    lines.append(f'{full}_bucket{_labels(key, [("le", _number(bound))])} {cumulative}')
+                lines.append(f'{full}_sum{_labels(key)} {value.sum}')
+                lines.append(f'{full}_count{_labels(key)} {value.count}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self, top=5):
+        """Totals per counter and latency percentiles per histogram, with the
+        slowest label combinations by mean"""
+        summary = {}
+        with self.lock:
+            for name, metric in self.metrics.items():
+                series = metric['series']
+                if metric['type'] == COUNTER:
+                    # Total, then totals per value of each label
+                    entry = summary[name] = {'total': sum(series.values())}
+                    for labels, value in series.items():
+                        for key, label in labels:
+                            totals = entry.setdefault(key, {})
+                            totals[label] = totals.get(label, 0) + value
+                    continue
+                if metric['type'] != HISTOGRAM:
+                    continue
+                total = Histogram(self.buckets)
+                for histogram in series.values():
+                    total.merge(histogram)
+                entry = self._latency(total)
+                slowest = sorted(series.items(), key=lambda item: -item[1].sum / item[1].count)
+                entry['slowest'] = [dict(self._latency(histogram), **dict(labels))
+                                    for labels, histogram in slowest[:top]]
+                summary[name] = entry
+        return summary
+
+    @staticmethod
+    def _latency(histogram):
+        def ms(value):
+            return None if value is None else round(value * 1000, 2)
+        return {
+            'count': histogram.count,
+            'mean_ms': ms(histogram.sum / histogram.count) if histogram.count else None,
+            'p50_ms': ms(histogram.quantile(0.5)),
+            'p95_ms': ms(histogram.quantile(0.95)),
+            'p99_ms': ms(histogram.quantile(0.99))
+        }
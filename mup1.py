@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+"""
+VelocityDRIVE Touch GUI - Native MUP1 serial transport
+Microchip UART Protocol #1 framing, decoding and request/response handling
+on top of an open serial port, so that simple operations do not need to
+start the mvdct CLI
+"""
+
+import os
+import pty
+import queue
+import select
+import threading
+import time
+import tty
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Frame delimiters and escape character
+SOF = 0x3E  # '>'
+EOF = 0x3C  # '<'
+ESC = 0x5C  # '\'
+
+# Bytes that must be escaped inside a frame, and their escaped form
+ESCAPE_MAP = {SOF: ord('>'), EOF: ord('<'), ESC: ord('\\'), 0x00: ord('0'), 0xFF: ord('F')}
+UNESCAPE_MAP = {v: k for k, v in ESCAPE_MAP.items()}
+
+# Frame types: requests are lower case, the device answers in upper case
+TYPE_ANNOUNCE = 'A'
+TYPE_COAP = 'C'
+TYPE_PING = 'P'
+TYPE_SYSREQ = 'S'
+TYPE_TRACE = 'T'
+
+MUP1_WRITE_QUEUE_SIZE = 64
+MUP1_MAX_FRAME_SIZE = 4096
+# How long a reply to a timed-out request is still expected and dropped
+MUP1_LATE_REPLY_WINDOW = 2.0
+
+
+class Mup1Error(Exception):
+    """Raised for MUP1 link failures"""
+
+
+def checksum(frame):
+    """16-bit one's complement checksum over an even-length frame"""
+    total = 0
+    for i in range(0, len(frame), 2):
+        total += (frame[i] << 8) | frame[i + 1]
+    while total > 0xFFFF:
+        total = (total & 0xFFFF) + (total >> 16)
+    return (~total) & 0xFFFF
+
+
+def escape(data):
+    out = bytearray()
+    for b in data:
+        if b in ESCAPE_MAP:
+            out.append(ESC)
+            out.append(ESCAPE_MAP[b])
+        else:
+            out.append(b)
+    return bytes(out)
+
+
+def encode_frame(frame_type, data=b''):
+    """Build a complete MUP1 frame: >type data < [<] checksum"""
+    if isinstance(data, str):
+        data = data.encode()
+    frame = bytearray([SOF, ord(frame_type)]) + escape(data) + bytes([EOF])
+    # Pad with a second EOF so the checksum covers whole 16-bit words
+    if len(frame) % 2:
+        frame.append(EOF)
+    return bytes(frame) + b'%04X' % checksum(frame)
+
+
+class Mup1Decoder:
+    """Incremental frame decoder; feed() returns the complete frames found"""
+
+    def __init__(self):
+        self.errors = 0
+        self._reset()
+
+    def _reset(self):
+        self.state = 'idle'
+        self.raw = bytearray()
+        self.data = bytearray()
+        self.frame_type = None
+        self.escaped = False
+        self.trailer = bytearray()
+
+    def feed(self, chunk):
+        frames = []
+        for b in chunk:
+            frame = self._feed_byte(b)
+            if frame:
+                frames.append(frame)
+        return frames
+
+    def _feed_byte(self, b):
+        if self.state == 'idle':
+            if b == SOF:
+                self._reset()
+                self.raw.append(b)
+                self.state = 'type'
+            return None
+
+        if self.state == 'type':
+            self.frame_type = chr(b)
+            self.raw.append(b)
+            self.state = 'data'
+            return None
+
+        if self.state == 'data':
+            if self.escaped:
+                self.escaped = False
+                self.raw.append(b)
+                if b not in UNESCAPE_MAP:
+                    return self._error('invalid escape sequence')
+                self.data.append(UNESCAPE_MAP[b])
+            elif b == ESC:
+                self.escaped = True
+                self.raw.append(b)
+            elif b == SOF:
+                # Unescaped SOF inside a frame: resync on the new frame
+                self.errors += 1
+                self._reset()
+                self.raw.append(b)
+                self.state = 'type'
+            elif b == EOF:
+                self.raw.append(b)
+                self.state = 'trailer'
+            else:
+                self.raw.append(b)
+                self.data.append(b)
+                if len(self.data) > MUP1_MAX_FRAME_SIZE:
+                    return self._error('frame too large')
+            return None
+
+        # Trailer: optional padding EOF followed by four checksum hex digits
+        if b == EOF and not self.trailer and len(self.raw) % 2:
+            self.raw.append(b)
+            return None
+        self.trailer.append(b)
+        if len(self.trailer) < 4:
+            return None
+
+        try:
+            received = int(self.trailer.decode('ascii'), 16)
+        except ValueError:
+            return self._error('malformed checksum')
+        raw = bytes(self.raw)
+        if len(raw) % 2 or received != checksum(raw):
+            return self._error('checksum mismatch')
+
+        frame = (self.frame_type, bytes(self.data))
+        self._reset()
+        return frame
+
+    def _error(self, reason):
+        logger.debug(f"MUP1 decode error: {reason}")
+        self.errors += 1
+        self._reset()
+        return None
+
+
+class Mup1Transport:
+    """MUP1 link over an open serial port with reader and writer threads"""
+
+    def __init__(self, port, name=None, write_queue_size=MUP1_WRITE_QUEUE_SIZE):
+        self.port = port
+        self.name = name or getattr(port, 'port', None)
+        self.decoder = Mup1Decoder()
+        self.write_queue_size = write_queue_size
+        self.writes = queue.Queue(maxsize=write_queue_size)
+        self.release_lock = threading.Lock()
+        # Notified when the port comes back from released()
+        self.lent = False
+        self.returned = threading.Condition()
+        self.pending = {}
+        self.pending_lock = threading.Lock()
+        # Per response type, expiry times of requests that gave up waiting
+        self.abandoned = {}
+        self.listeners = {}
+        self.frames_in = 0
+        self.frames_out = 0
+        self.running = False
+        self.reader = None
+        self.writer = None
+
+    def start(self):
+        self.writes = queue.Queue(maxsize=self.write_queue_size)
+        # Drop any partial frame left over from before the port was lent out
+        self.decoder._reset()
+        self.running = True
+        self.reader = threading.Thread(target=self._reader_loop, daemon=True,
+                                       name=f'mup1-reader-{self.name}')
+        self.writer = threading.Thread(target=self._writer_loop, daemon=True,
+                                       name=f'mup1-writer-{self.name}')
+        self.reader.start()
+        self.writer.start()
+        return self
+
+    def stop(self):
+        """Stop the I/O threads without closing the port"""
+        self.running = False
+        try:
+            self.writes.put_nowait(None)
+        except queue.Full:
+            pass
+        for thread in (self.reader, self.writer):
+            if thread and thread is not threading.current_thread():
+                thread.join(timeout=2)
+        self._fail_pending(Mup1Error('MUP1 link stopped'))
+
+    def close(self):
+        self.stop()
+        try:
+            self.port.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def released(self):
+        """Hand the serial port to another program (e.g. mvdct) temporarily"""
+        with self.release_lock:
+            with self.returned:
+                self.lent = True
+            self.stop()
+            self.port.close()
+            try:
+                yield
+            finally:
+                try:
+                    self.port.open()
+                    self.start()
+                finally:
+                    with self.returned:
+                        self.lent = False
+                        self.returned.notify_all()
+
+    # ---------- I/O threads ----------
+
+    def _reader_loop(self):
+        while self.running:
+            try:
+                data = self.port.read(getattr(self.port, 'in_waiting', 0) or 1)
+            except Exception as e:
+                if self.running:
+                    logger.error(f"MUP1 read failed on {self.name}: {e}")
+                    self._fail_pending(Mup1Error(str(e)))
+                    self.running = False
+                return
+            if not data:
+                continue
+            for frame_type, payload in self.decoder.feed(data):
+                self.frames_in += 1
+                self._dispatch(frame_type, payload)
+
+    def _writer_loop(self):
+        while self.running:
+            frame = self.writes.get()
+            if frame is None:
+                return
+            try:
+                self.port.write(frame)
+                if hasattr(self.port, 'flush'):
+                    self.port.flush()
+                self.frames_out += 1
+            except Exception as e:
+                logger.error(f"MUP1 write failed on {self.name}: {e}")
+                self._fail_pending(Mup1Error(str(e)))
+
+    def _dispatch(self, frame_type, payload):
+        # Responses are matched to requests in the order they were sent.
+        # Frames carry no request id, so the reply owed to a request that
+        # timed out must be dropped rather than handed to the next one.
+        with self.pending_lock:
+            abandoned = self.abandoned.get(frame_type)
+            now = time.monotonic()
+            while abandoned and abandoned[0] < now:
+                abandoned.pop(0)
+            if abandoned:
+                abandoned.pop(0)
+                logger.debug(f"MUP1 dropped late {frame_type} reply on {self.name}")
+                return
+            waiters = self.pending.get(frame_type)
+            waiter = waiters.pop(0) if waiters else None
+        if waiter:
+            waiter['data'] = payload
+            waiter['event'].set()
+            return
+
+        for callback in self.listeners.get(frame_type, []):
+            try:
+                callback(payload)
+            except Exception as e:
+                logger.error(f"MUP1 listener failed: {e}")
+
+    def _fail_pending(self, error):
+        with self.pending_lock:
+            waiters = [w for ws in self.pending.values() for w in ws]
+            self.pending = {}
+            self.abandoned = {}
+        for waiter in waiters:
+            waiter['error'] = error
+            waiter['event'].set()
+
+    # ---------- public API ----------
+
+    def add_listener(self, frame_type, callback):
+        """Call callback(payload) for unsolicited frames of this type"""
+        self.listeners.setdefault(frame_type, []).append(callback)
+
+    def send(self, frame_type, data=b'', timeout=0):
+        """Queue a frame for transmission
+
+        While released() has lent the port out, wait up to timeout seconds
+        for the link to come back.
+        """
+        self._await_link(timeout)
+        self._enqueue(encode_frame(frame_type, data))
+
+    def _await_link(self, timeout):
+        if not self.running and timeout > 0:
+            with self.returned:
+                self.returned.wait_for(lambda: not self.lent, timeout)
+        if not self.running:
+            raise Mup1Error('MUP1 link is not running')
+
+    def _enqueue(self, frame):
+        try:
+            self.writes.put_nowait(frame)
+        except queue.Full:
+            raise Mup1Error('MUP1 write queue full')
+
+    def request(self, frame_type, data=b'', timeout=10):
+        """Send a request frame and wait for the matching response frame"""
+        response_type = frame_type.upper()
+        waiter = {'event': threading.Event()}
+        deadline = time.monotonic() + timeout
+        frame = encode_frame(frame_type.lower(), data)
+        self._await_link(timeout)
+        # Queue and register together so stop() cannot fail the waiter
+        # between the two and leave its reply to the next request
+        with self.pending_lock:
+            if not self.running:
+                raise Mup1Error('MUP1 link is not running')
+            self._enqueue(frame)
+            self.pending.setdefault(response_type, []).append(waiter)
+
+        if not waiter['event'].wait(max(0, deadline - time.monotonic())):
+            self._abandon(response_type, waiter)
+            raise TimeoutError(f'No MUP1 {response_type} response within {timeout}s')
+        if 'error' in waiter:
+            raise waiter['error']
+        return waiter['data']
+
+    def _abandon(self, response_type, waiter):
+        # The request is already on the wire, so expect its reply for a while
+        with self.pending_lock:
+            waiters = self.pending.get(response_type, [])
+            if waiter in waiters:
+                waiters.remove(waiter)
+                self.abandoned.setdefault(response_type, []).append(
+                    time.monotonic() + MUP1_LATE_REPLY_WINDOW)
+
+    def execute(self, args, timeout=30):
+        """Handle a CLI-style command natively, or return None if unsupported"""
+        if len(args) < 3 or args[0] != 'device' or args[1] != self.name:
+            return None
+
+        command = ' '.join(args)
+        try:
+            if args[2] == 'type' and len(args) == 3:
+                stdout = self.request(TYPE_PING, timeout=timeout).decode(errors='replace')
+            elif args[2] == 'mup' and len(args) == 4:
+                message = args[3]
+                if message.startswith('>'):
+                    frames = Mup1Decoder().feed(message.encode())
+                    if not frames:
+                        raise Mup1Error('Invalid MUP1 frame')
+                    frame_type, payload = frames[0]
+                else:
+                    frame_type, payload = message[0], message[1:].encode()
+                stdout = self.request(frame_type, payload, timeout=timeout).decode(errors='replace')
+            else:
+                return None
+        except TimeoutError:
+            return {
+                'success': False,
+                'error': f'Command timeout after {timeout}s',
+                'command': command
+            }
+        except Mup1Error as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'command': command
+            }
+
+        return {
+            'success': True,
+            'stdout': stdout,
+            'stderr': '',
+            'command': command,
+            'returncode': 0
+        }
+
+    def status(self):
+        return {
+            'port': self.name,
+            'running': self.running,
+            'frames_in': self.frames_in,
+            'frames_out': self.frames_out,
+            'decode_errors': self.decoder.errors,
+            'write_queue': self.writes.qsize()
+        }
+
+
+class PtyLoopbackDevice:
+    """Pseudo-terminal device that answers MUP1 frames for offline testing
+
+    Open the returned `port_name` with serial.Serial like a real board.
+    `handler(frame_type, payload)` returns (type, payload) or None; by
+    default pings are answered and other requests are echoed back.
+    """
+
+    def __init__(self, handler=None, device_type='VelocityDRIVE-SP LAN9662 (loopback)'):
+        self.handler = handler
+        self.device_type = device_type
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)
+        self.port_name = os.ttyname(self.slave)
+        self.decoder = Mup1Decoder()
+        self.running = True
+        self.thread = threading.Thread(target=self._loop, daemon=True, name='mup1-loopback')
+        self.thread.start()
+
+    def _respond(self, frame_type, payload):
+        if self.handler:
+            return self.handler(frame_type, payload)
+        if frame_type.upper() == TYPE_PING:
+            return TYPE_PING, self.device_type.encode()
+        return frame_type.upper(), payload
+
+    def _loop(self):
+        while self.running:
+            readable, _, _ = select.select([self.master], [], [], 0.1)
+            if not readable:
+                continue
+            try:
+                chunk = os.read(self.master, 1024)
+            except OSError:
+                return
+            for frame_type, payload in self.decoder.feed(chunk):
+                reply = self._respond(frame_type, payload)
+                if reply:
+                    os.write(self.master, encode_frame(*reply))
+
+    def announce(self, text):
+        """Emit an unsolicited announce frame"""
+        os.write(self.master, encode_frame(TYPE_ANNOUNCE, text))
+
+    def close(self):
+        self.running = False
+        self.thread.join(timeout=1)
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
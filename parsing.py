@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+VelocityDRIVE Touch GUI - CLI output parsing
+Turns mvdct output into structured data once on the server, so clients get
+objects in 'data' instead of re-parsing JSON text from 'stdout'
+"""
+
+import json
+import re
+import logging
+
+from flask import Response, current_app, request
+from flask.json.provider import DefaultJSONProvider
+
+import cbor
+from tracing import span
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+logger = logging.getLogger(__name__)
+
+# Port names as printed by 'mvdct list'
+PORT_PATTERN = re.compile(r'(/dev/\S+|COM\d+)\s*(.*)')
+
+
+def loads(text):
+    """Parse JSON with the fastest available backend"""
+    if orjson:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def parse_structured(text):
+    """(data, error) for JSON or YAML output; empty output is (None, None)"""
+    text = text.strip()
+    if not text:
+        return None, None
+    if text[0] in '{[':
+        try:
+            return loads(text), None
+        except ValueError as e:
+            error = f'Invalid JSON: {e}'
+    else:
+        error = 'Output is not JSON'
+    if yaml:
+        try:
+            data = yaml.safe_load(text)
+            if isinstance(data, (dict, list)):
+                return data, None
+        except yaml.YAMLError as e:
+            error = f'Invalid YAML: {e}'
+    return None, error
+
+
+def parse_output(text):
+    """Structured data from CLI output, or None"""
+    return parse_structured(text)[0]
+
+
+def fetch_instances(data):
+    """{path: value} from 'fetch' output, a list of {path: value} items"""
+    found = {}
+    if isinstance(data, dict):
+        data = [data]
+    for item in data or []:
+        if isinstance(item, dict):
+            found.update(item)
+    return found
+
+
+def _local(name):
+    return name.split(':')[-1]
+
+
+def _counters(statistics):
+    """Counter leaves as numbers; YANG JSON encodes 64-bit counters as strings"""
+    counters = {}
+    for name, value in statistics.items():
+        if isinstance(value, str) and value.isdigit():
+            value = int(value)
+        if not isinstance(value, (dict, list)):
+            counters[_local(name)] = value
+    return counters
+
+
+def _statistics(entry):
+    for name, value in entry.items():
+        if _local(name) == 'statistics' and isinstance(value, dict):
+            return value
+    return None
+
+
+def _named_entries(value):
+    """List entries with a 'name' key anywhere in a YANG tree"""
+    if isinstance(value, dict):
+        if isinstance(value.get('name'), str):
+            yield value
+        for child in value.values():
+            yield from _named_entries(child)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _named_entries(item)
+
+
+def statistics_table(interfaces=None, bridges=None):
+    """{port: row} from the ietf-interfaces and dot1q-bridge subtrees
+
+    Each row has the interface status leaves, 'counters' from the interface
+    statistics and 'bridge' from the bridge port statistics, whether those
+    are augmented into the interface or read from the bridges tree.
+    """
+    table = {}
+    for entry in _named_entries(interfaces):
+        statistics = _statistics(entry)
+        if statistics is None:
+            continue
+        row = table.setdefault(entry['name'], {'name': entry['name']})
+        for name, value in entry.items():
+            if _local(name) in ('oper-status', 'admin-status', 'speed', 'phys-address', 'type'):
+                row[_local(name)] = value
+            elif _local(name) == 'bridge-port' and isinstance(value, dict) and _statistics(value):
+                row['bridge'] = _counters(_statistics(value))
+        row['counters'] = _counters(statistics)
+    for entry in _named_entries(bridges):
+        statistics = _statistics(entry)
+        if statistics is not None:
+            row = table.setdefault(entry['name'], {'name': entry['name']})
+            row['bridge'] = _counters(statistics)
+    return table
+
+
+def parse_port_list(text):
+    """[{'device', 'description'}] from 'mvdct list' output"""
+    ports = []
+    for line in text.splitlines():
+        match = PORT_PATTERN.search(line)
+        if match:
+            port = {'device': match.group(1)}
+            if match.group(2).strip():
+                port['description'] = match.group(2).strip(' -\t')
+            ports.append(port)
+    return ports, None
+
+
+def parse_text(text):
+    return text.strip(), None
+
+
+# Sub-command -> parser returning (data, error)
+PARSERS = {
+    'get': parse_structured,
+    'fetch': parse_structured,
+    'yang': parse_structured,
+    'get-capabilities': parse_structured,
+    'call': parse_structured,
+    'type': parse_text,
+}
+
+
+def parser_for(args):
+    if args[:1] == ['list']:
+        return parse_port_list
+    if len(args) > 2 and args[0] == 'device':
+        if args[2] == 'export' and len(args) > 3 and args[3] in ('json', 'yaml'):
+            return parse_structured
+        return PARSERS.get(args[2])
+    return None
+
+
+def parse_result(args, result):
+    """Add 'data' (and 'parse_error' on failure) to a CLI result in place"""
+    if 'data' in result or not result.get('success'):
+        return result
+    parser = parser_for(args)
+    if parser is None:
+        return result
+    try:
+        data, error = parser(result.get('stdout') or '')
+    except Exception as e:
+        data, error = None, str(e)
+    result['data'] = data
+    if error:
+        result['parse_error'] = error
+        logger.debug(f"Could not parse output of {' '.join(args)}: {error}")
+    return result
+
+
+def cli_response(result):
+    """Response for a CLI result in the format the client asked for
+
+    Clients that send Accept: application/cbor get CBOR. Once the output
+    parsed into 'data' the 'stdout' text is left out unless the client sends
+    raw=true (body or query).
+    """
+    options = request.get_json(silent=True) or {}
+    raw = options.get('raw', request.args.get('raw', False))
+    if raw not in (True, 'true', '1') and result.get('data') is not None:
+        result = {key: value for key, value in result.items() if key != 'stdout'}
+    if 'application/cbor' in request.headers.get('Accept', ''):
+        return Response(cbor.dumps(result), mimetype='application/cbor')
+    return current_app.json.response(result)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider using orjson when it is installed
+
+    Pretty-printed output (debug mode) still goes through the json module.
+    """
+
+    def dumps(self, obj, **kwargs):
+        with span('serialize'):
+            if orjson and 'indent' not in kwargs:
+                try:
+                    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+                except TypeError:
+                    pass
+            return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
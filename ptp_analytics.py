@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+VelocityDRIVE Touch GUI - PTP servo analytics
+Keeps offset-from-master and mean-path-delay samples per device in compact
+ring buffers and computes sync quality from them: mean, RMS, peak-to-peak,
+Allan deviation, MTIE and whether the servo is locked or in holdover
+"""
+
+import math
+import os
+import threading
+import time
+from collections import deque
+
+from timeseries import Ring
+
+# Samples kept per device (one hour at 10 Hz)
+PTP_SAMPLES = int(os.environ.get('VELOCITYDRIVE_PTP_SAMPLES', '36000'))
+# |offset| below which the servo counts as locked
+LOCK_THRESHOLD_NS = float(os.environ.get('VELOCITYDRIVE_PTP_LOCK_NS', '100'))
+# Seconds without analytics reads before a device's ptp stream stops being sampled
+PTP_IDLE = float(os.environ.get('VELOCITYDRIVE_PTP_IDLE', '600'))
+# Terms per ADEV tau and blocks for MTIE; bounds the work per request
+ANALYSIS_POINTS = int(os.environ.get('VELOCITYDRIVE_PTP_ANALYSIS_POINTS', '2048'))
+# Consecutive in-threshold samples needed to declare lock
+LOCK_SAMPLES = 10
+# Sample intervals without data before a locked servo is reported in holdover
+HOLDOVER_INTERVALS = 5
+# ieee1588-ptp time-interval leaves are in units of 2^-16 ns; set to 1 for
+# devices (and the demo backend) that report plain nanoseconds
+TIME_INTERVAL_SCALE = float(os.environ.get('VELOCITYDRIVE_PTP_TIME_SCALE', '65536'))
+
+
+def time_interval_ns(value):
+    """Nanoseconds from a YANG time-interval (scaled ns), or None"""
+    try:
+        return float(value) / TIME_INTERVAL_SCALE
+    except (TypeError, ValueError):
+        return None
+
+
+def summary(values):
+    """count/mean/rms/std/min/max/peak_to_peak of a list of numbers"""
+    count = len(values)
+    if not count:
+        return {'count': 0}
+    mean = math.fsum(values) / count
+    square = math.fsum(value * value for value in values) / count
+    low, high = min(values), max(values)
+    return {
+        'count': count,
+        'mean': mean,
+        'rms': math.sqrt(square),
+        'std': math.sqrt(max(square - mean * mean, 0.0)),
+        'min': low,
+        'max': high,
+        'peak_to_peak': high - low
+    }
+
+
+def _octave_taus(count, limit):
+    n = 1
+    while n <= limit(count):
+        yield n
+        n *= 2
+
+
+def allan_deviation(x, tau0, points=ANALYSIS_POINTS):
+    """Overlapping Allan deviation from time error samples x (seconds)
+
+    Returns [(tau seconds, adev)] for tau = tau0 * 1, 2, 4, ... Each tau
+    uses at most points evenly spaced terms.
+    """
+    result = []
+    count = len(x)
+    for n in _octave_taus(count, lambda c: (c - 1) // 2):
+        terms = range(0, count - 2 * n, max((count - 2 * n) // points, 1))
+        total = math.fsum((x[i + 2 * n] - 2 * x[i + n] + x[i]) ** 2 for i in terms)
+        tau = n * tau0
+        result.append((tau, math.sqrt(total / (2 * len(terms) * tau * tau))))
+    return result
+
+
+def block_extremes(x, points=ANALYSIS_POINTS):
+    """(maxima, minima, size) of x in blocks of size samples, at most points blocks"""
+    size = -(-len(x) // points) if len(x) > points else 1
+    if size == 1:
+        return x, x, 1
+    blocks = range(0, len(x), size)
+    return [max(x[i:i + size]) for i in blocks], [min(x[i:i + size]) for i in blocks], size
+
+
+def mtie(x, tau0, points=ANALYSIS_POINTS):
+    """Maximum time interval error: [(tau seconds, largest max-min of x in any window of tau)]
+
+    Longer series are reduced to at most points block maxima and minima
+    first, which overstates each value by at most one block's worth of time.
+    """
+    maxima, minima, size = block_extremes(x, points)
+    tau0 *= size
+    result = []
+    count = len(maxima)
+    for n in _octave_taus(count, lambda c: c - 1):
+        highs, lows = deque(), deque()
+        worst = 0.0
+        for i in range(count):
+            # Monotonic deques give the window max/min in O(1) per sample
+            while highs and maxima[highs[-1]] <= maxima[i]:
+                highs.pop()
+            while lows and minima[lows[-1]] >= minima[i]:
+                lows.pop()
+            highs.append(i)
+            lows.append(i)
+            if highs[0] <= i - n - 1:
+                highs.popleft()
+            if lows[0] <= i - n - 1:
+                lows.popleft()
+            if i >= n:
+                worst = max(worst, maxima[highs[0]] - minima[lows[0]])
+        result.append((n * tau0, worst))
+    return result
+
+
+def servo_state(times, offsets, now, tau0, threshold):
+    """'locked', 'acquiring', 'holdover' or 'no_data' from recent samples"""
+    if not offsets:
+        return {'state': 'no_data'}
+    recent = offsets[-LOCK_SAMPLES:]
+    locked = len(recent) == LOCK_SAMPLES and all(abs(value) < threshold for value in recent)
+    age = now - times[-1]
+    since = None
+    for t, value in zip(reversed(times), reversed(offsets)):
+        if abs(value) >= threshold:
+            break
+        since = t
+    if age > HOLDOVER_INTERVALS * max(tau0, 1.0):
+        state = 'holdover' if locked else 'no_data'
+    else:
+        state = 'locked' if locked else 'acquiring'
+    return {
+        'state': state,
+        'threshold_ns': threshold,
+        'locked_since': since if locked else None,
+        'last_sample_age': round(age, 3)
+    }
+
+
+class PtpAnalytics:
+    """Offset and path delay history per device"""
+
+    def __init__(self, capacity=PTP_SAMPLES, threshold=LOCK_THRESHOLD_NS, idle=PTP_IDLE):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.idle = idle
+        self.rings = {}
+        # Device -> time of the last analytics read, for devices sampled for them
+        self.readers = {}
+        self.lock = threading.Lock()
+
+    def watch(self, device):
+        """Note an analytics read; True if the device was not being sampled for one"""
+        with self.lock:
+            new = device not in self.readers
+            self.readers[device] = time.time()
+            return new
+
+    def expired(self, now=None):
+        """Devices whose analytics nobody read for idle seconds; they are forgotten"""
+        now = time.time() if now is None else now
+        with self.lock:
+            stale = [device for device, read in self.readers.items() if now - read > self.idle]
+            for device in stale:
+                del self.readers[device]
+            return stale
+
+    def record(self, device, t, offset_ns, delay_ns=None):
+        with self.lock:
+            ring = self.rings.get(device)
+            if ring is None:
+                ring = self.rings[device] = Ring(3, self.capacity)
+            if len(ring) and t <= ring.row(len(ring) - 1)[0]:
+                return
+            ring.append((t, offset_ns, math.nan if delay_ns is None else delay_ns))
+
+    def listener(self, device, stream, key, leaves, sampled_at):
+        """Telemetry listener taking offset and delay from 'ptp' samples"""
+        if stream != 'ptp':
+            return
+        values = {}
+        for path, value in leaves.items():
+            name = path.rsplit('/', 1)[-1].split(':')[-1]
+            if name in ('offset-from-master', 'mean-path-delay') and name not in values:
+                values[name] = time_interval_ns(value)
+        if values.get('offset-from-master') is not None:
+            self.record(device, sampled_at, values['offset-from-master'], values.get('mean-path-delay'))
+
+    def analyze(self, device, window=None, threshold=None):
+        """Sync quality over the last window seconds (all samples when None)"""
+        now = time.time()
+        with self.lock:
+            ring = self.rings.get(device)
+            rows = list(ring.rows(now - window if window else None)) if ring else []
+        threshold = threshold or self.threshold
+        times = [row[0] for row in rows]
+        offsets = [row[1] for row in rows]
+        delays = [row[2] for row in rows if not math.isnan(row[2])]
+
+        # Intervals are nominally fixed; the median tolerates scheduler jitter
+        gaps = sorted(b - a for a, b in zip(times, times[1:]))
+        tau0 = gaps[len(gaps) // 2] if gaps else 0.0
+        seconds = [value * 1e-9 for value in offsets]
+
+        return {
+            'device': device,
+            'samples': len(rows),
+            'span': round(times[-1] - times[0], 3) if rows else 0,
+            'sample_interval': round(tau0, 6),
+            'offset_ns': summary(offsets),
+            'mean_path_delay_ns': summary(delays),
+            'adev': [{'tau': round(tau, 6), 'adev': value}
+                     for tau, value in allan_deviation(seconds, tau0)] if tau0 else [],
+            'mtie': [{'tau': round(tau, 6), 'mtie_ns': value}
+                     for tau, value in mtie(offsets, tau0)] if tau0 else [],
+            'servo': servo_state(times, offsets, now, tau0, threshold)
+        }
+
+    def status(self):
+        with self.lock:
+            return {'devices': {device: len(ring) for device, ring in self.rings.items()},
+                    'sampling': sorted(self.readers),
+                    'capacity': self.capacity}
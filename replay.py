@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+VelocityDRIVE Touch GUI - Device traffic capture and replay
+Records every command the server sends to a device with its timing and
+output in an append-only JSON Lines log (gzip when the name ends in .gz),
+serves the recorded responses again as the 'replay' transport, and
+summarises a capture or re-drives its load pattern offline
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from benchmark import percentile
+from metrics import operation
+
+# Capture log written while the server runs; unset disables capture
+CAPTURE_FILE = os.environ.get('VELOCITYDRIVE_CAPTURE_FILE')
+# Directory for captures started over HTTP, which may only name a file in it
+CAPTURE_DIR = os.environ.get('VELOCITYDRIVE_CAPTURE_DIR', tempfile.gettempdir())
+DEFAULT_CAPTURE_NAME = 'velocitydrive-capture.jsonl'
+# Capture served by the 'replay' transport
+REPLAY_FILE = os.environ.get('VELOCITYDRIVE_REPLAY_FILE')
+# Multiplier on recorded durations: 1 replays at recorded speed, 0 instantly
+REPLAY_SCALE = float(os.environ.get('VELOCITYDRIVE_REPLAY_SCALE', '1'))
+
+TEMP_DIR = tempfile.gettempdir()
+
+
+def _open(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't')
+    return open(path, mode)
+
+
+def command_key(args):
+    """Args with temporary files (patch, fetch, import) replaced by a hash of
+    their content, so a command matches its recording whatever the file name"""
+    key = []
+    for arg in args:
+        arg = str(arg)
+        if arg.startswith(TEMP_DIR) and os.path.isfile(arg):
+            with open(arg, 'rb') as f:
+                arg = '@' + hashlib.sha1(f.read()).hexdigest()[:16]
+        key.append(arg)
+    return key
+
+
+def capture_path(name=None):
+    """Path in CAPTURE_DIR for a capture file name sent by a client"""
+    name = name or DEFAULT_CAPTURE_NAME
+    if os.path.basename(name) != name or name.startswith('.') or '\\' in name:
+        raise ValueError(f'Capture file must be a plain file name: {name}')
+    if not name.endswith(('.jsonl', '.jsonl.gz')):
+        raise ValueError('Capture file name must end in .jsonl or .jsonl.gz')
+    path = os.path.join(CAPTURE_DIR, name)
+    if os.path.islink(path):
+        raise ValueError(f'Capture file is a symbolic link: {name}')
+    return path
+
+
+def read_log(path):
+    """Records of a capture, skipping a line cut short by a crash"""
+    with _open(path, 'r') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+class Recorder:
+    """Appends one line per device command to the capture log"""
+
+    def __init__(self, path=CAPTURE_FILE):
+        self.path = None
+        self.file = None
+        self.records = 0
+        self.lock = threading.Lock()
+        if path:
+            self.start(path)
+
+    def start(self, path):
+        with self.lock:
+            if self.file:
+                self.file.close()
+            self.file = _open(path, 'a')
+            self.path = path
+            self.records = 0
+
+    def stop(self):
+        with self.lock:
+            if self.file:
+                self.file.close()
+            self.file = None
+
+    def record(self, args, started, result):
+        if self.file is None:
+            return
+        entry = {'t': round(started, 6), 'ms': round((time.time() - started) * 1000, 3),
+                 'args': [str(arg) for arg in args]}
+        key = command_key(args)
+        if key != entry['args']:
+            entry['key'] = key
+        entry['ok'] = bool(result.get('success'))
+        for field, name in (('returncode', 'rc'), ('stdout', 'out'), ('stderr', 'err'), ('error', 'error')):
+            if result.get(field) not in (None, ''):
+                entry[name] = result[field]
+        if result.get('data') is not None and not result.get('stdout'):
+            # Native (MUP1/CORECONF) replies carry data without CLI text
+            entry['data'] = result['data']
+        line = json.dumps(entry, separators=(',', ':'), default=str) + '\n'
+        with self.lock:
+            if self.file:
+                self.file.write(line)
+                self.file.flush()
+                self.records += 1
+
+    def status(self):
+        return {'active': self.file is not None, 'file': self.path, 'records': self.records}
+
+
+class ReplayTransport:
+    """Answers commands with recorded responses after their recorded duration"""
+
+    def __init__(self, path=REPLAY_FILE, scale=REPLAY_SCALE):
+        if not path:
+            raise ValueError('The replay transport needs VELOCITYDRIVE_REPLAY_FILE')
+        self.path = path
+        self.scale = scale
+        # Command key -> recorded responses, served in order and then repeated
+        self.responses = {}
+        # The same, keyed without the device path, for boards not in the capture
+        self.wildcards = {}
+        self.positions = {}
+        self.served = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        for record in read_log(path):
+            key = tuple(record.get('key') or record['args'])
+            self.responses.setdefault(key, []).append(record)
+            if self._wildcard(key) != key:
+                self.wildcards.setdefault(self._wildcard(key), []).append(record)
+
+    @staticmethod
+    def _wildcard(key):
+        return (key[0], '*') + key[2:] if len(key) > 2 and key[0] == 'device' else key
+
+    def _next(self, key):
+        # Called with lock held
+        for index, candidate in ((self.responses, key), (self.wildcards, self._wildcard(key))):
+            records = index.get(candidate)
+            if records:
+                position = self.positions.get(candidate, 0)
+                self.positions[candidate] = position + 1
+                return records[position % len(records)]
+        return None
+
+    def execute(self, args, timeout=30):
+        command = ' '.join(str(arg) for arg in args)
+        key = tuple(command_key(args))
+        with self.lock:
+            record = self._next(key)
+            if record is None:
+                self.misses += 1
+            else:
+                self.served += 1
+        if record is None:
+            return {'success': False, 'error': f'No recorded response for: {command}', 'command': command}
+
+        delay = record.get('ms', 0) / 1000 * self.scale
+        if delay > timeout:
+            time.sleep(timeout)
+            return {'success': False, 'error': f'Command timeout after {timeout}s', 'command': command}
+        time.sleep(delay)
+        result = {
+            'success': record.get('ok', False),
+            'stdout': record.get('out', ''),
+            'stderr': record.get('err', ''),
+            'command': command
+        }
+        for name, field in (('rc', 'returncode'), ('error', 'error'), ('data', 'data')):
+            if name in record:
+                result[field] = record[name]
+        return result
+
+    def status(self):
+        with self.lock:
+            return {
+                'file': self.path,
+                'scale': self.scale,
+                'commands': sum(len(records) for records in self.responses.values()),
+                'distinct': len(self.responses),
+                'served': self.served,
+                'misses': self.misses
+            }
+
+
+def summarize(records):
+    """Commands, errors and recorded device time per operation"""
+    operations = {}
+    for record in records:
+        entry = operations.setdefault(operation(record['args'])[0], {'times': [], 'errors': 0})
+        entry['times'].append(record.get('ms', 0))
+        if not record.get('ok'):
+            entry['errors'] += 1
+    summary = {}
+    for name, entry in sorted(operations.items()):
+        times = sorted(entry['times'])
+        summary[name] = {
+            'commands': len(times),
+            'errors': entry['errors'],
+            'mean_ms': round(sum(times) / len(times), 3),
+            'p50_ms': round(percentile(times, 50), 3),
+            'p95_ms': round(percentile(times, 95), 3),
+            'max_ms': times[-1]
+        }
+    return summary
+
+
+def drive(records, options):
+    """Issue the captured commands through app_complete at their recorded
+    offsets (divided by speed) and measure latency as callers see it"""
+    os.environ['VELOCITYDRIVE_TRANSPORT'] = options.transport
+    os.environ['VELOCITYDRIVE_REPLAY_FILE'] = options.capture
+    os.environ['VELOCITYDRIVE_REPLAY_SCALE'] = str(options.scale)
+    os.environ.pop('VELOCITYDRIVE_CAPTURE_FILE', None)
+    import app_complete
+
+    records = sorted(records, key=lambda record: record['t'])
+    origin = records[0]['t']
+    latencies = {}
+    lag = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(record, due):
+        nonlocal errors
+        result = app_complete.execute_cli_command(record.get('key') or record['args'], options.timeout)
+        elapsed = (time.perf_counter() - due) * 1000
+        with lock:
+            latencies.setdefault(operation(record['args'])[0], []).append(elapsed)
+            if not result.get('success'):
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=options.concurrency) as executor:
+        for record in records:
+            due = started + (record['t'] - origin) / options.speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -0.001:
+                lag.append(-delay * 1000)
+            executor.submit(one, record, due)
+    wall = time.perf_counter() - started
+    app_complete.close_device_links()
+
+    def stats(values):
+        values = sorted(values)
+        return {
+            'commands': len(values),
+            'p50_ms': round(percentile(values, 50), 3),
+            'p95_ms': round(percentile(values, 95), 3),
+            'p99_ms': round(percentile(values, 99), 3),
+            'max_ms': round(values[-1], 3)
+        }
+
+    return {
+        'capture': options.capture,
+        'transport': options.transport,
+        'speed': options.speed,
+        'scale': options.scale,
+        'wall_s': round(wall, 3),
+        'errors': errors,
+        'late_submissions': len(lag),
+        'max_lag_ms': round(max(lag), 3) if lag else 0,
+        'all': stats([value for values in latencies.values() for value in values]),
+        'operations': {name: stats(values) for name, values in sorted(latencies.items())}
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[1])
+    commands = parser.add_subparsers(dest='command', required=True)
+    summary = commands.add_parser('summary', help='commands and recorded device time per operation')
+    summary.add_argument('capture')
+    replay = commands.add_parser('drive', help='re-run the capture\'s load against app_complete in-process')
+    replay.add_argument('capture')
+    replay.add_argument('--transport', choices=('replay', 'sim'), default='replay',
+                        help='answer from the capture itself or from the simulator')
+    replay.add_argument('--speed', type=float, default=1.0,
+                        help='arrival rate multiplier: 2 issues the commands twice as fast')
+    replay.add_argument('--scale', type=float, default=1.0,
+                        help='multiplier on recorded device time for the replay transport')
+    replay.add_argument('--concurrency', type=int, default=64, help='commands in flight at most')
+    replay.add_argument('--timeout', type=float, default=30)
+    replay.add_argument('--output', help='write results to this JSON file')
+    options = parser.parse_args(argv)
+
+    records = list(read_log(options.capture))
+    if not records:
+        parser.error(f'No commands in {options.capture}')
+    if options.command == 'summary':
+        results = {
+            'commands': len(records),
+            'duration_s': round(max(r['t'] for r in records) - min(r['t'] for r in records), 3),
+            'operations': summarize(records)
+        }
+    else:
+        if options.speed <= 0:
+            parser.error('--speed must be positive')
+        results = drive(records, options)
+    print(json.dumps(results, indent=2))
+    if getattr(options, 'output', None):
+        with open(options.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
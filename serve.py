@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+VelocityDRIVE Touch GUI - Server runner
+Selects between the Flask development server and a production server with
+a worker thread pool, keep-alive, socket timeouts, optional pre-forked
+worker processes and graceful shutdown on SIGTERM/SIGINT
+"""
+
+import os
+import signal
+import socket
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+try:
+    import waitress
+except ImportError:
+    waitress = None
+
+logger = logging.getLogger(__name__)
+
+# 'dev' runs app.run(debug=True); 'production' runs the pooled server below
+SERVE_MODE = os.environ.get('VELOCITYDRIVE_SERVE_MODE', 'dev')
+SERVER_THREADS = int(os.environ.get('VELOCITYDRIVE_THREADS', '16'))
+SERVER_PROCESSES = int(os.environ.get('VELOCITYDRIVE_PROCESSES', '1'))
+# Idle keep-alive connections are closed after this many seconds
+KEEPALIVE_TIMEOUT = float(os.environ.get('VELOCITYDRIVE_KEEPALIVE_TIMEOUT', '5'))
+# Socket timeout for reading a request and writing its response (Werkzeug
+# fallback only: waitress has no such setting and instead closes a connection
+# that is idle or stalled mid-request for KEEPALIVE_TIMEOUT seconds)
+REQUEST_TIMEOUT = float(os.environ.get('VELOCITYDRIVE_REQUEST_TIMEOUT', '30'))
+# How long in-flight requests get to finish after a shutdown signal
+SHUTDOWN_TIMEOUT = float(os.environ.get('VELOCITYDRIVE_SHUTDOWN_TIMEOUT', '30'))
+
+
+class TimeoutRequestHandler(WSGIRequestHandler):
+    """Request handler with a socket timeout so stalled clients are dropped"""
+
+    timeout = REQUEST_TIMEOUT
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """Werkzeug server that handles each connection on a bounded thread pool
+
+    Used when waitress is not installed. Werkzeug closes the connection after
+    every response, so there is no keep-alive with this backend.
+    """
+
+    multithread = True
+
+    def __init__(self, host, port, app, threads=SERVER_THREADS, fd=None):
+        super().__init__(host, port, app, handler=TimeoutRequestHandler, fd=fd)
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='http')
+        self.active = 0
+        self.active_lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        with self.active_lock:
+            self.active += 1
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self.active_lock:
+                self.active -= 1
+
+    def drain(self, timeout=SHUTDOWN_TIMEOUT):
+        """Wait for in-flight requests, then stop the worker threads"""
+        deadline = time.time() + timeout
+        while self.active and time.time() < deadline:
+            time.sleep(0.1)
+        if self.active:
+            logger.warning(f"Shutting down with {self.active} request(s) still running")
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _serve_werkzeug(app, host, port, threads, sock):
+    server = PooledWSGIServer(host, port, app, threads=threads,
+                              fd=sock.fileno() if sock else None)
+    stopping = threading.Event()
+
+    def handle_signal(signum, frame):
+        if not stopping.is_set():
+            stopping.set()
+            logger.info(f"Received signal {signum}, shutting down")
+            # shutdown() blocks until serve_forever() returns, so use a thread
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    try:
+        server.serve_forever()
+    finally:
+        server.drain()
+        server.server_close()
+
+
+def _serve_waitress(app, host, port, threads, sock):
+    options = {
+        'threads': threads,
+        'channel_timeout': KEEPALIVE_TIMEOUT,
+        # Flush from the worker thread so streamed output is sent immediately
+        # and responses still complete while the server is shutting down
+        'send_bytes': 1,
+        'ident': 'VelocityDRIVE'
+    }
+    if sock:
+        options['sockets'] = [sock]
+    else:
+        options['host'] = host
+        options['port'] = port
+    server = waitress.create_server(app, **options)
+    stopping = []
+
+    def handle_signal(signum, frame):
+        logger.info(f"Received signal {signum}, shutting down")
+        stopping.append(time.monotonic())
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    # run() stops accepting on SystemExit and already waits up to 5 s for
+    # running requests; give them the rest of SHUTDOWN_TIMEOUT
+    server.run()
+    waited = time.monotonic() - stopping[0] if stopping else 0
+    server.task_dispatcher.shutdown(timeout=max(0, SHUTDOWN_TIMEOUT - waited))
+    if server.task_dispatcher.threads:
+        logger.warning("Shutting down with requests still running")
+    server.close()
+
+
+def _serve_worker(app, host, port, threads, sock, on_shutdown):
+    """Run one server until SIGTERM/SIGINT, then run the shutdown hooks"""
+    try:
+        if waitress:
+            _serve_waitress(app, host, port, threads, sock)
+        else:
+            _serve_werkzeug(app, host, port, threads, sock)
+    finally:
+        for callback in on_shutdown:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Shutdown hook failed: {e}")
+
+
+def run_production(app, host='0.0.0.0', port=8080, threads=SERVER_THREADS,
+                   processes=SERVER_PROCESSES, on_shutdown=()):
+    """Serve the app with a thread pool, optionally in several processes"""
+    backend = 'waitress' if waitress else 'werkzeug'
+    logger.info(f"Production server ({backend}) on {host}:{port}, "
+                f"{processes} process(es) x {threads} threads")
+
+    if processes <= 1:
+        _serve_worker(app, host, port, threads, None, on_shutdown)
+        return
+
+    # Pre-fork: every worker accepts on the same listening socket. Device
+    # sessions and MUP1 links are per process, so use the subprocess
+    # transport when running more than one process.
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(128)
+
+    children = []
+    for _ in range(processes):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _serve_worker(app, host, port, threads, listener, on_shutdown)
+            finally:
+                os._exit(0)
+        children.append(pid)
+
+    def forward(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+
+    for pid in children:
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
+    listener.close()
+
+
+def run(app, host='0.0.0.0', port=8080, on_shutdown=()):
+    """Start the server in the mode selected by VELOCITYDRIVE_SERVE_MODE"""
+    if SERVE_MODE == 'production':
+        run_production(app, host=host, port=port, on_shutdown=on_shutdown)
+    else:
+        app.run(host=host, port=port, debug=True)
@@ -0,0 +1,510 @@
+#!/usr/bin/env python3
+"""
+VelocityDRIVE Touch GUI - Simulated device
+A stateful stand-in for a LAN9662 board behind the same execute(args,
+timeout) interface as the real transports: a YANG datastore per device with
+get/set/delete/fetch/patch/import, interface counters that grow with time and
+a PTP servo that wanders, with configurable latency, jitter, error rate and
+bandwidth per operation
+"""
+
+import copy
+import json
+import os
+import random
+import re
+import threading
+import time
+import logging
+from datetime import datetime, timezone
+
+import yaml
+
+from parsing import fetch_instances
+
+logger = logging.getLogger(__name__)
+
+# Default timing of every simulated command
+SIM_LATENCY_MS = float(os.environ.get('VELOCITYDRIVE_SIM_LATENCY_MS', '20'))
+SIM_JITTER_MS = float(os.environ.get('VELOCITYDRIVE_SIM_JITTER_MS', '5'))
+# Share of commands that fail as if the device did not answer
+SIM_ERROR_RATE = float(os.environ.get('VELOCITYDRIVE_SIM_ERROR_RATE', '0'))
+# Link throughput in bytes/s for request and reply; 0 is unlimited
+# (a 115200 baud serial link carries about 11520)
+SIM_BANDWIDTH = float(os.environ.get('VELOCITYDRIVE_SIM_BANDWIDTH', '0'))
+# Per-operation overrides as JSON, e.g. {"set": {"latency_ms": 80}}
+SIM_PROFILE = os.environ.get('VELOCITYDRIVE_SIM_PROFILE')
+# Seed for reproducible runs; unset seeds from the clock
+SIM_SEED = os.environ.get('VELOCITYDRIVE_SIM_SEED')
+
+SETTINGS = ('latency_ms', 'jitter_ms', 'error_rate', 'bandwidth')
+PORTS = ('eth0', 'eth1', 'eth2', 'eth3')
+# Average frame size used to turn simulated packet rates into octets
+FRAME_BYTES = 600
+# ieee1588-ptp time-interval leaves count 2^-16 ns
+TIME_INTERVAL_SCALE = 65536
+FIRMWARE = 'VelocityDRIVE Firmware v2025.07.12-sim\nBuild: Jul 12 2025 14:30:00\nBootloader: v1.2.3'
+DEVICE_TYPE = 'Microchip LAN9662 VelocityDRIVE (Simulated)'
+# Reply of a permissive simulator to device commands it does not implement
+GENERIC_REPLY = 'Operation completed successfully'
+
+# '/module:node/list[key="value"]/leaf' -> segments with their list keys
+_SEGMENT = re.compile(r'/([^/\[]+)((?:\[[^\]]*\])*)')
+_PREDICATE = re.compile(r'\[\s*([\w:.-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\]]*?))\s*\]')
+
+
+class SimulatorError(Exception):
+    pass
+
+
+def parse_path(path):
+    """[(name, {key: value})] for an instance path"""
+    if not path or path == '/':
+        return []
+    segments = []
+    position = 0
+    for match in _SEGMENT.finditer(path):
+        if match.start() != position:
+            break
+        keys = {}
+        for key in _PREDICATE.finditer(match.group(2)):
+            keys[key.group(1).split(':')[-1]] = next(value for value in key.group(2, 3, 4) if value is not None)
+        segments.append((match.group(1), keys))
+        position = match.end()
+    if position != len(path.rstrip('/')):
+        raise SimulatorError(f'Invalid path: {path}')
+    return segments
+
+
+def _child_key(node, name):
+    """Key of child 'name' in node, matching with or without module prefix"""
+    if name in node:
+        return name
+    local = name.split(':')[-1]
+    for key in node:
+        if key.split(':')[-1] == local:
+            return key
+    return None
+
+
+def _matches(entry, keys):
+    return isinstance(entry, dict) and all(str(entry.get(key)) == value for key, value in keys.items())
+
+
+def _merge(target, value):
+    """YANG merge: containers combine, everything else is replaced"""
+    if isinstance(target, dict) and isinstance(value, dict):
+        for key, item in value.items():
+            target[key] = _merge(target.get(key), item)
+        return target
+    return copy.deepcopy(value)
+
+
+def select(node, segments, path):
+    """Copy of the branch of node along segments, keeping the ancestors"""
+    if not segments:
+        return copy.deepcopy(node)
+    name, keys = segments[0]
+    key = _child_key(node, name) if isinstance(node, dict) else None
+    if key is None:
+        raise SimulatorError(f'Path not found: {path}')
+    child = node[key]
+    if isinstance(child, list):
+        entries = [entry for entry in child if _matches(entry, keys)]
+        if keys and not entries:
+            raise SimulatorError(f'Path not found: {path}')
+        return {key: [dict(keys, **select(entry, segments[1:], path)) if segments[1:]
+                      else copy.deepcopy(entry) for entry in entries]}
+    if keys:
+        raise SimulatorError(f'{name} is not a list: {path}')
+    return {key: select(child, segments[1:], path)}
+
+
+def lookup(tree, segments, path):
+    """The node at the path itself, as 'fetch' reports it"""
+    node = tree
+    for index, (name, keys) in enumerate(segments):
+        key = _child_key(node, name) if isinstance(node, dict) else None
+        if key is None:
+            raise SimulatorError(f'Path not found: {path}')
+        node = node[key]
+        if isinstance(node, list) and (keys or index < len(segments) - 1):
+            if not keys:
+                raise SimulatorError(f'{name} needs list keys: {path}')
+            node = next((entry for entry in node if _matches(entry, keys)), None)
+            if node is None:
+                raise SimulatorError(f'Path not found: {path}')
+    return copy.deepcopy(node)
+
+
+def assign(tree, segments, value, path):
+    """Merge value in at the path, creating containers and list entries"""
+    if not segments:
+        raise SimulatorError('Cannot replace the whole datastore')
+    node = tree
+    for index, (name, keys) in enumerate(segments):
+        last = index == len(segments) - 1
+        if not isinstance(node, dict):
+            raise SimulatorError(f'Cannot set below a leaf: {path}')
+        key = _child_key(node, name) or name
+        if keys:
+            entries = node.setdefault(key, [])
+            if not isinstance(entries, list):
+                raise SimulatorError(f'{name} is not a list: {path}')
+            entry = next((entry for entry in entries if _matches(entry, keys)), None)
+            if entry is None:
+                entry = dict(keys)
+                entries.append(entry)
+            if last:
+                if not isinstance(value, dict):
+                    raise SimulatorError(f'A list entry needs an object value: {path}')
+                _merge(entry, value)
+            node = entry
+        elif last:
+            node[key] = _merge(node.get(key), value)
+        else:
+            node = node.setdefault(key, {})
+
+
+def remove(tree, segments, path):
+    if not segments:
+        raise SimulatorError('Cannot delete the whole datastore')
+    node = tree
+    for index, (name, keys) in enumerate(segments):
+        last = index == len(segments) - 1
+        key = _child_key(node, name) if isinstance(node, dict) else None
+        if key is None:
+            raise SimulatorError(f'Path not found: {path}')
+        if keys:
+            entries = node[key]
+            matches = [entry for entry in entries if _matches(entry, keys)] if isinstance(entries, list) else []
+            if not matches:
+                raise SimulatorError(f'Path not found: {path}')
+            if last:
+                node[key] = [entry for entry in entries if not _matches(entry, keys)]
+                return
+            node = matches[0]
+        elif last:
+            del node[key]
+        else:
+            node = node[key]
+
+
+def initial_datastore(rng):
+    """Configuration and state of a freshly booted board"""
+    interfaces = []
+    for index, name in enumerate(PORTS):
+        up = index < len(PORTS) - 1
+        interfaces.append({
+            'name': name,
+            'type': 'iana-if-type:ethernetCsmacd',
+            'enabled': up,
+            'oper-status': 'up' if up else 'down',
+            'speed': 1000000000,
+            'mtu': 1500,
+            'phys-address': f'00:04:a3:12:34:{0x50 + index:02x}',
+            'statistics': {
+                'discontinuity-time': datetime.now(timezone.utc).isoformat(),
+                'in-octets': 0, 'in-unicast-pkts': 0, 'in-multicast-pkts': 0,
+                'in-discards': 0, 'in-errors': 0,
+                'out-octets': 0, 'out-unicast-pkts': 0, 'out-multicast-pkts': 0,
+                'out-discards': 0, 'out-errors': 0
+            },
+            'ieee802-dot1q-bridge:bridge-port': {
+                'port-number': index + 1,
+                'statistics': {'frame-rx': 0, 'frame-tx': 0, 'discard-inbound': 0,
+                               'forward-outbound': 0, 'delay-exceeded-discards': 0}
+            }
+        })
+    return {
+        'ietf-system:system-state': {
+            'platform': {'os-name': 'VelocityDRIVE', 'os-release': '2025.07.12',
+                         'machine': 'LAN9662', 'processor': 'ARM Cortex-A7'},
+            'clock': {'boot-datetime': datetime.now(timezone.utc).isoformat()}
+        },
+        'ietf-interfaces:interfaces': {'interface': interfaces},
+        'ieee802-dot1q-bridge:bridges': {
+            'bridge': [{'name': 'br0', 'address': '00:04:a3:12:34:50',
+                        'bridge-type': 'customer-vlan-bridge',
+                        'component': [{'name': 'br0', 'type': 'c-vlan-component',
+                                       'ports': len(PORTS)}]}]
+        },
+        'ieee1588-ptp:ptp': {
+            'instances': {'instance': [{
+                'instance-index': 0,
+                'default-ds': {'clock-identity': '00:04:A3:FF:FE:12:34:56',
+                               'clock-quality': {'clock-class': 248, 'clock-accuracy': 'time-accurate-to-250-ns',
+                                                 'offset-scaled-log-variance': 17258},
+                               'priority1': 128, 'priority2': 128, 'domain-number': 0,
+                               'slave-only': False, 'two-step-flag': True},
+                'current-ds': {'steps-removed': 1,
+                               'offset-from-master': rng.randint(-50, 50) * TIME_INTERVAL_SCALE,
+                               'mean-path-delay': 250 * TIME_INTERVAL_SCALE},
+                'ports': {'port': [{'port-index': 1,
+                                    'port-ds': {'port-state': 'slave', 'delay-mechanism': 'p2p',
+                                                'log-sync-interval': -3,
+                                                'log-min-pdelay-req-interval': 0}}]}
+            }]}
+        },
+        'ieee802-dot1q-sched:sched': {
+            'gate-enabled': False,
+            'admin-gate-states': 255,
+            'admin-cycle-time': {'numerator': 1000000, 'denominator': 1000000000},
+            'admin-control-list': {'gate-control-entry': [
+                {'index': 0, 'operation-name': 'set-gate-states',
+                 'gate-states-value': 255, 'time-interval-value': 1000000}]}
+        }
+    }
+
+
+class SimulatedDevice:
+    """Datastore and running state of one simulated board"""
+
+    def __init__(self, name, rng):
+        self.name = name
+        self.rng = rng
+        self.tree = initial_datastore(rng)
+        # Packets per second each port sends and receives
+        self.rates = {port: rng.randint(500, 5000) for port in PORTS}
+        # Counters start as if the board had been up for a while
+        self.updated = time.time() - rng.uniform(600, 7200)
+
+    def advance(self):
+        """Move counters and the PTP servo forward to now"""
+        now = time.time()
+        elapsed = now - self.updated
+        self.updated = now
+        interfaces = self.tree.get('ietf-interfaces:interfaces', {}).get('interface', [])
+        for entry in interfaces:
+            statistics = entry.get('statistics')
+            if entry.get('oper-status') != 'up' or not isinstance(statistics, dict):
+                continue
+            rate = self.rates.get(entry.get('name'), 1000)
+            for direction in ('in', 'out'):
+                packets = int(rate * elapsed * self.rng.uniform(0.8, 1.2))
+                self._add(statistics, f'{direction}-unicast-pkts', packets)
+                self._add(statistics, f'{direction}-multicast-pkts', packets // 50)
+                self._add(statistics, f'{direction}-octets', packets * FRAME_BYTES)
+                if self.rng.random() < elapsed / 60:
+                    self._add(statistics, f'{direction}-errors', 1)
+            bridge = entry.get('ieee802-dot1q-bridge:bridge-port', {}).get('statistics')
+            if isinstance(bridge, dict):
+                received = int(rate * elapsed)
+                self._add(bridge, 'frame-rx', received)
+                self._add(bridge, 'frame-tx', received)
+                self._add(bridge, 'forward-outbound', received)
+
+        for instance in self.tree.get('ieee1588-ptp:ptp', {}).get('instances', {}).get('instance', []):
+            current = instance.get('current-ds')
+            if isinstance(current, dict):
+                # Servo noise around zero with a slow pull back towards it
+                offset = current.get('offset-from-master', 0) / TIME_INTERVAL_SCALE
+                offset = offset * 0.7 + self.rng.gauss(0, 15)
+                current['offset-from-master'] = int(offset * TIME_INTERVAL_SCALE)
+                delay = 250 + self.rng.gauss(0, 2)
+                current['mean-path-delay'] = int(delay * TIME_INTERVAL_SCALE)
+
+        clock = self.tree.get('ietf-system:system-state', {}).get('clock')
+        if isinstance(clock, dict):
+            clock['current-datetime'] = datetime.now(timezone.utc).isoformat()
+
+    @staticmethod
+    def _add(container, leaf, amount):
+        value = container.get(leaf, 0)
+        if isinstance(value, str) and value.isdigit():
+            value = int(value)
+        if isinstance(value, int):
+            container[leaf] = value + amount
+
+    def get(self, path):
+        return select(self.tree, parse_path(path), path)
+
+    def value(self, path):
+        return lookup(self.tree, parse_path(path), path)
+
+    def set(self, path, value):
+        assign(self.tree, parse_path(path), value, path)
+
+    def delete(self, path):
+        remove(self.tree, parse_path(path), path)
+
+
+def _value(text):
+    """A 'set' argument: JSON when it parses, otherwise the plain string"""
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def _read_file(path):
+    with open(path) as f:
+        return yaml.safe_load(f)
+
+
+class DeviceSimulator:
+    """Simulated boards answering CLI commands like mvdct would"""
+
+    def __init__(self, latency_ms=SIM_LATENCY_MS, jitter_ms=SIM_JITTER_MS, error_rate=SIM_ERROR_RATE,
+                 bandwidth=SIM_BANDWIDTH, profile=SIM_PROFILE, seed=SIM_SEED, permissive=False):
+        self.rng = random.Random(seed)
+        # Answer unimplemented device commands (firmware update, key, coap...)
+        # with a generic success instead of an error, as demo mode did
+        self.permissive = permissive
+        self.defaults = {}
+        self.profiles = {}
+        self.devices = {}
+        self.commands = 0
+        self.injected_errors = 0
+        self.lock = threading.Lock()
+        self.configure(latency_ms=latency_ms, jitter_ms=jitter_ms, error_rate=error_rate, bandwidth=bandwidth)
+        for operation, settings in (json.loads(profile) if profile else {}).items():
+            self.configure(operation, **settings)
+
+    def configure(self, operation=None, **settings):
+        """Change timing for all operations, or for one ('get', 'set', ...)"""
+        unknown = set(settings) - set(SETTINGS)
+        if unknown:
+            raise ValueError(f'Unknown simulator settings: {", ".join(sorted(unknown))}')
+        values = {}
+        for name, value in settings.items():
+            if value is None:
+                continue
+            value = float(value)
+            if value < 0 or (name == 'error_rate' and value > 1):
+                raise ValueError(f'{name} must be non-negative' + (' and at most 1' if name == 'error_rate' else ''))
+            values[name] = value
+        with self.lock:
+            (self.profiles.setdefault(operation, {}) if operation else self.defaults).update(values)
+            return self._config()
+
+    def _config(self):
+        return {'defaults': dict(self.defaults), 'operations': copy.deepcopy(self.profiles)}
+
+    def _settings(self, operation):
+        return dict(self.defaults, **self.profiles.get(operation, {}))
+
+    def device(self, name):
+        # Called with lock held
+        device = self.devices.get(name)
+        if device is None:
+            device = self.devices[name] = SimulatedDevice(name, self.rng)
+        return device
+
+    def execute(self, args, timeout=30):
+        """Run one CLI command against the simulated device"""
+        started = time.time()
+        # mvdct only ever sees strings on its command line
+        args = [str(arg) for arg in args]
+        command = ' '.join(args)
+        operation = args[2] if len(args) > 2 and args[0] == 'device' else (args[0] if args else '')
+        settings = self._settings(operation)
+
+        with self.lock:
+            self.commands += 1
+            delay = max(settings['latency_ms'] + self.rng.uniform(-1, 1) * settings['jitter_ms'], 0) / 1000
+            failed = self.rng.random() < settings['error_rate']
+            if failed:
+                self.injected_errors += 1
+            else:
+                try:
+                    stdout = self._run(args)
+                    returncode = 0
+                    stderr = ''
+                except SimulatorError as e:
+                    stdout, stderr, returncode = '', str(e), 1
+                except Exception as e:
+                    logger.exception(f"Simulator failed on: {command}")
+                    stdout, stderr, returncode = '', f'Simulator error: {e}', 1
+
+        if failed:
+            stdout, stderr, returncode = '', 'Simulated device error: no response from device', 1
+        if settings['bandwidth']:
+            delay += (len(command) + len(stdout) + len(stderr)) / settings['bandwidth']
+        if delay > timeout:
+            time.sleep(max(timeout - (time.time() - started), 0))
+            return {'success': False, 'error': f'Command timeout after {timeout}s', 'command': command}
+        time.sleep(max(delay - (time.time() - started), 0))
+        return {
+            'success': returncode == 0,
+            'stdout': stdout,
+            'stderr': stderr,
+            'command': command,
+            'returncode': returncode
+        }
+
+    def _run(self, args):
+        # Called with lock held; returns stdout or raises SimulatorError
+        if args[:1] == ['list']:
+            names = sorted(self.devices) or ['/dev/ttyACM0']
+            return ''.join(f'{name} - Simulated VelocityDRIVE LAN9662\n' for name in names)
+        if len(args) < 3 or args[0] != 'device':
+            raise SimulatorError(f"Unknown command: {' '.join(args)}")
+
+        device = self.device(args[1])
+        command, rest = args[2], args[3:]
+        device.advance()
+        if command == 'type':
+            return DEVICE_TYPE
+        if command == 'firmware' and not rest:
+            return FIRMWARE
+        if command == 'yang':
+            return json.dumps(sorted(key.split(':')[0] for key in device.tree))
+        if command == 'get':
+            return json.dumps(device.get(rest[0] if rest else '/'), indent=2)
+        if command == 'set' and len(rest) >= 2:
+            device.set(rest[0], _value(rest[1]))
+            return ''
+        if command == 'delete' and rest:
+            device.delete(rest[0])
+            return ''
+        if command == 'fetch' and rest:
+            try:
+                paths = _read_file(rest[0]) or []
+            except (OSError, yaml.YAMLError) as e:
+                raise SimulatorError(f'Cannot read {rest[0]}: {e}')
+            found = []
+            for path in paths:
+                try:
+                    value = device.value(path)
+                except SimulatorError:
+                    continue
+                found.append({path: value})
+            return json.dumps(found, indent=2)
+        if command == 'patch' and rest:
+            try:
+                edits = fetch_instances(_read_file(rest[0]))
+            except (OSError, yaml.YAMLError) as e:
+                raise SimulatorError(f'Cannot read {rest[0]}: {e}')
+            # Check every edit on a copy first: a patch applies completely or not at all
+            tree = copy.deepcopy(device.tree)
+            for path, value in edits.items():
+                if value is None:
+                    remove(tree, parse_path(path), path)
+                else:
+                    assign(tree, parse_path(path), value, path)
+            device.tree = tree
+            return ''
+        if command == 'import' and len(rest) >= 2:
+            try:
+                data = _read_file(rest[1])
+            except (OSError, yaml.YAMLError) as e:
+                raise SimulatorError(f'Cannot read {rest[1]}: {e}')
+            if not isinstance(data, dict):
+                raise SimulatorError('Imported configuration must be an object')
+            _merge(device.tree, data)
+            return ''
+        if command == 'call':
+            return json.dumps({'output': {}})
+        if self.permissive:
+            return GENERIC_REPLY
+        raise SimulatorError(f"Command not supported by the simulator: {' '.join(args[2:])}")
+
+    def status(self):
+        with self.lock:
+            return {
+                'devices': sorted(self.devices),
+                'commands': self.commands,
+                'injected_errors': self.injected_errors,
+                'config': self._config()
+            }
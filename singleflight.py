@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+VelocityDRIVE Touch GUI - Request coalescing
+Concurrent calls with the same key share a single execution and its result
+"""
+
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; late callers wait for it"""
+
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+        self.executions = 0
+        self.shared = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        """Return fn(*args, **kwargs), joining an identical call in flight"""
+        with self.lock:
+            call = self.calls.get(key)
+            if call:
+                self.shared += 1
+                leader = False
+            else:
+                call = self.calls[key] = _Call()
+                self.executions += 1
+                leader = True
+
+        if leader:
+            try:
+                call.result = fn(*args, **kwargs)
+            except Exception as e:
+                call.error = e
+            finally:
+                with self.lock:
+                    if self.calls.get(key) is call:
+                        del self.calls[key]
+                call.done.set()
+        else:
+            call.done.wait()
+
+        if call.error:
+            raise call.error
+        # Each caller gets its own copy of a dict result
+        return dict(call.result) if isinstance(call.result, dict) else call.result
+
+    def forget(self, match):
+        """Stop sharing in-flight calls whose key matches; later callers start anew"""
+        with self.lock:
+            for key in [key for key in self.calls if match(key)]:
+                del self.calls[key]
+
+    def stats(self):
+        with self.lock:
+            return {
+                'in_flight': len(self.calls),
+                'executions': self.executions,
+                'shared': self.shared
+            }
@@ -9,11 +9,14 @@ echo "Starting VelocityDRIVE Touch GUI..."
 cd "$(dirname "$0")"
 
 # Install Python dependencies if needed
-if ! python3 -c "import flask" 2>/dev/null; then
+if ! python3 -c "import flask, waitress" 2>/dev/null; then
     echo "Installing required Python packages..."
-    pip3 install --break-system-packages flask flask-cors pyserial
+    pip3 install --break-system-packages flask flask-cors pyserial waitress
 fi
 
+# Use the production server unless told otherwise (dev enables the debugger)
+export VELOCITYDRIVE_SERVE_MODE="${VELOCITYDRIVE_SERVE_MODE:-production}"
+
 # Kill any existing instances
 pkill -f "python3 app.py"
 
@@ -1,11 +1,24 @@
 // VelocityDRIVE Touch GUI - Main Application JavaScript
 
+// Console output pieces kept in the page; older output is dropped
+const CONSOLE_MAX_LINES = 5000;
+
+// Text of a command result: the CLI output, or the parsed 'data' when the
+// server left the output out
+function resultText(data) {
+    if (data.stdout) return data.stdout;
+    if (data.data === undefined || data.data === null) return '';
+    return typeof data.data === 'string' ? data.data : JSON.stringify(data.data, null, 2);
+}
+
 class VelocityDriveApp {
     constructor() {
         this.apiUrl = window.location.origin + '/api';
         this.currentPort = '/dev/ttyACM0';
         this.isConnected = false;
         this.updateInterval = null;
+        this.telemetrySource = null;
+        this.telemetryLive = false;
         this.settings = {
             theme: 'light',
             updateInterval: 1000,
@@ -138,6 +151,7 @@ class VelocityDriveApp {
                 this.updateConnectionStatus(true);
                 this.showToast('Connected successfully', 'success');
                 this.refreshDeviceInfo();
+                this.startTelemetry();
             } else {
                 this.showToast(data.error || 'Connection failed', 'error');
             }
@@ -160,6 +174,7 @@ class VelocityDriveApp {
 
             if (data.success) {
                 this.isConnected = false;
+                this.stopTelemetry();
                 this.updateConnectionStatus(false);
                 this.showToast('Disconnected', 'info');
             }
@@ -182,8 +197,8 @@ class VelocityDriveApp {
 
             const data = await response.json();
 
-            if (data.success && data.stdout) {
-                this.updateDeviceInfo(data.stdout);
+            if (data.success && data.data) {
+                this.updateDeviceInfo(data.data);
             }
         } catch (error) {
             console.error('Failed to refresh device info:', error);
@@ -194,10 +209,9 @@ class VelocityDriveApp {
         const deviceInfo = document.getElementById('deviceInfo');
         if (!deviceInfo) return;
 
-        // Parse the info and update display
-        // This would need to be adapted based on actual CLI output format
+        // Update the display from the parsed system state
+        // This would need to be adapted based on the actual YANG data
         try {
-            const lines = info.split('\n');
             const infoItems = deviceInfo.querySelectorAll('.info-item');
 
             // Update with parsed values
@@ -214,7 +228,7 @@ class VelocityDriveApp {
     }
 
     async refreshStatistics() {
-        if (!this.isConnected) return;
+        if (!this.isConnected || this.telemetryLive) return;
 
         try {
             const response = await fetch(`${this.apiUrl}/statistics`, {
@@ -225,8 +239,8 @@ class VelocityDriveApp {
 
             const data = await response.json();
 
-            if (data.success && data.stdout) {
-                this.updateStatistics(data.stdout);
+            if (data.success && data.data) {
+                this.updateStatistics(data.data);
             }
         } catch (error) {
             console.error('Failed to refresh statistics:', error);
@@ -256,8 +270,8 @@ class VelocityDriveApp {
 
             const data = await response.json();
 
-            if (data.success && data.stdout) {
-                this.displayInterfaces(data.stdout);
+            if (data.success && data.data) {
+                this.displayInterfaces(data.data);
             }
         } catch (error) {
             this.showToast('Failed to load interfaces', 'error');
@@ -306,9 +320,9 @@ class VelocityDriveApp {
 
             const data = await response.json();
 
-            if (data.success && data.stdout) {
+            if (data.success && data.data) {
                 // Parse and display TSN configuration
-                console.log('TSN Config:', data.stdout);
+                console.log('TSN Config:', data.data);
             }
         } catch (error) {
             console.error('Failed to load TSN config:', error);
@@ -378,7 +392,7 @@ class VelocityDriveApp {
     }
 
     async refreshPTPStatus() {
-        if (!this.isConnected) return;
+        if (!this.isConnected || this.telemetryLive) return;
 
         try {
             const response = await fetch(`${this.apiUrl}/ptp/status`, {
@@ -389,8 +403,8 @@ class VelocityDriveApp {
 
             const data = await response.json();
 
-            if (data.success && data.stdout) {
-                this.displayPTPStatus(data.stdout);
+            if (data.success && data.data) {
+                this.displayPTPStatus(data.data);
             }
         } catch (error) {
             console.error('Failed to refresh PTP status:', error);
@@ -434,33 +448,73 @@ class VelocityDriveApp {
         if (!command) return;
 
         // Display command in console
-        output.innerHTML += `> ${command}\n`;
+        this.appendConsole(`> ${command}\n`);
 
         this.showLoading(true);
 
         try {
             const response = await fetch(`${this.apiUrl}/command`, {
                 method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ command: `device ${this.currentPort} ${command}` })
+                headers: {
+                    'Content-Type': 'application/json',
+                    'Accept': 'application/x-ndjson'
+                },
+                body: JSON.stringify({ command: `device ${this.currentPort} ${command}`, stream: 'ndjson' })
             });
 
-            const data = await response.json();
+            const contentType = response.headers.get('Content-Type') || '';
+            if (!contentType.includes('application/x-ndjson') || !response.body) {
+                const data = await response.json();
+                if (data.success) {
+                    this.appendConsole(resultText(data));
+                } else {
+                    this.appendConsole(`Error: ${data.error || data.stderr}\n`);
+                }
+                return;
+            }
 
-            if (data.success) {
-                output.innerHTML += data.stdout || '';
-            } else {
-                output.innerHTML += `Error: ${data.error || data.stderr}\n`;
+            // Show each output line as soon as the server sends it
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            while (true) {
+                const { value, done } = await reader.read();
+                buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+
+                let newline;
+                while ((newline = buffer.indexOf('\n')) >= 0) {
+                    const line = buffer.slice(0, newline).trim();
+                    buffer = buffer.slice(newline + 1);
+                    if (!line) continue;
+                    const event = JSON.parse(line);
+                    if (event.type === 'line') {
+                        this.appendConsole(event.line + '\n');
+                    } else if (event.type === 'done' && event.error) {
+                        this.appendConsole(`Error: ${event.error}\n`);
+                    }
+                }
+                if (done) break;
             }
         } catch (error) {
-            output.innerHTML += `Error: ${error.message}\n`;
+            this.appendConsole(`Error: ${error.message}\n`);
         } finally {
             this.showLoading(false);
             input.value = '';
-            output.scrollTop = output.scrollHeight;
         }
     }
 
+    // Append text to the console, keeping the last CONSOLE_MAX_LINES pieces
+    appendConsole(text) {
+        const output = document.getElementById('consoleOutput');
+        if (!output) return;
+
+        output.appendChild(document.createTextNode(text));
+        while (output.childNodes.length > CONSOLE_MAX_LINES) {
+            output.removeChild(output.firstChild);
+        }
+        output.scrollTop = output.scrollHeight;
+    }
+
     clearConsole() {
         const output = document.getElementById('consoleOutput');
         if (output) {
@@ -535,6 +589,47 @@ class VelocityDriveApp {
         }
     }
 
+    // Server-pushed statistics and PTP state; polling resumes if the channel drops
+    startTelemetry() {
+        if (!window.EventSource) return;
+        this.stopTelemetry();
+
+        const params = new URLSearchParams({ port: this.currentPort, streams: 'statistics,ptp' });
+        const source = new EventSource(`${this.apiUrl}/telemetry/stream?${params}`);
+        this.telemetrySource = source;
+        this.telemetryState = {};
+
+        const apply = (event) => {
+            const message = JSON.parse(event.data);
+            const key = `${message.stream}/${message.key}`;
+            const state = this.telemetryState[key] = event.type === 'snapshot'
+                ? { ...(message.data || {}) }
+                : (this.telemetryState[key] || {});
+
+            Object.assign(state, message.changes || {});
+            (message.removed || []).forEach(leaf => delete state[leaf]);
+
+            if (message.stream === 'statistics') {
+                this.updateStatistics(message.raw || state);
+            } else if (message.stream === 'ptp') {
+                this.displayPTPStatus(message.raw || state);
+            }
+        };
+
+        source.addEventListener('snapshot', apply);
+        source.addEventListener('delta', apply);
+        source.onopen = () => { this.telemetryLive = true; };
+        source.onerror = () => { this.telemetryLive = false; };
+    }
+
+    stopTelemetry() {
+        if (this.telemetrySource) {
+            this.telemetrySource.close();
+            this.telemetrySource = null;
+        }
+        this.telemetryLive = false;
+    }
+
     startAutoRefresh() {
         if (this.updateInterval) {
             clearInterval(this.updateInterval);
@@ -1,10 +1,48 @@
 // VelocityDRIVE Complete Control Center - Full CLI Feature Support
 
+// Console lines kept in the page; older lines are dropped
+const CONSOLE_MAX_LINES = 5000;
+
+// Text of a command result: the CLI output, or the parsed 'data' when the
+// server left the output out
+function resultText(data) {
+    if (data.stdout) return data.stdout;
+    if (data.data === undefined || data.data === null) return '';
+    return typeof data.data === 'string' ? data.data : JSON.stringify(data.data, null, 2);
+}
+
+// Apply RFC 6902 add/remove/replace operations to a copy of doc
+function applyJsonPatch(doc, ops) {
+    let result = JSON.parse(JSON.stringify(doc));
+    ops.forEach(op => {
+        if (op.path === '') {
+            result = op.value;
+            return;
+        }
+        const tokens = op.path.split('/').slice(1)
+            .map(token => token.replace(/~1/g, '/').replace(/~0/g, '~'));
+        const last = tokens.pop();
+        const parent = tokens.reduce((node, token) => node[Array.isArray(node) ? Number(token) : token], result);
+        if (Array.isArray(parent)) {
+            const index = last === '-' ? parent.length : Number(last);
+            if (op.op === 'remove') parent.splice(index, 1);
+            else if (op.op === 'add') parent.splice(index, 0, op.value);
+            else parent[index] = op.value;
+        } else if (op.op === 'remove') {
+            delete parent[last];
+        } else {
+            parent[last] = op.value;
+        }
+    });
+    return result;
+}
+
 class VelocityDriveComplete {
     constructor() {
         this.apiUrl = '/api';
         this.currentDevice = null;
         this.isConnected = false;
+        this.yangVersions = {};
         this.init();
     }
 
@@ -124,7 +162,7 @@ class VelocityDriveComplete {
             const data = await response.json();
 
             if (data.success) {
-                document.getElementById('deviceType').textContent = data.stdout || 'Unknown';
+                document.getElementById('deviceType').textContent = data.data || 'Unknown';
                 this.showToast('Device type retrieved', 'success');
             } else {
                 this.showToast('Failed to get device type', 'error');
@@ -148,21 +186,38 @@ class VelocityDriveComplete {
         this.showLoading(true);
 
         try {
+            // Send the version we already have: the server answers 304 when
+            // nothing changed, or only the changed leaves as a JSON patch
+            const known = this.yangVersions[path];
+            const headers = { 'Content-Type': 'application/json' };
+            if (known) {
+                headers['If-None-Match'] = `"${known.etag}"`;
+            }
+
             const response = await fetch(`${this.apiUrl}/yang/get`, {
                 method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ path, device: this.currentDevice })
+                headers,
+                body: JSON.stringify({ path, device: this.currentDevice, since: known && known.etag })
             });
 
-            const data = await response.json();
-
-            if (data.success) {
-                document.getElementById('yangResponse').textContent = data.stdout || 'No data';
-                this.showToast('YANG GET successful', 'success');
+            let content;
+            if (response.status === 304) {
+                content = known.content;
             } else {
-                document.getElementById('yangResponse').textContent = data.stderr || 'Error';
-                this.showToast('YANG GET failed', 'error');
+                const data = await response.json();
+                if (!data.success) {
+                    document.getElementById('yangResponse').textContent = data.stderr || 'Error';
+                    this.showToast('YANG GET failed', 'error');
+                    return;
+                }
+                content = data.patch ? applyJsonPatch(known.content, data.patch) :
+                    (data.data !== undefined && data.data !== null ? data.data : data.stdout);
+                this.yangVersions[path] = { etag: data.etag, content };
             }
+
+            document.getElementById('yangResponse').textContent =
+                typeof content === 'string' ? (content || 'No data') : JSON.stringify(content, null, 2);
+            this.showToast('YANG GET successful', 'success');
         } catch (error) {
             this.showToast('Error: ' + error.message, 'error');
         } finally {
@@ -261,7 +316,7 @@ class VelocityDriveComplete {
 
             if (data.success) {
                 document.getElementById('yangCatalogs').innerHTML =
-                    `<pre>${data.stdout || 'No catalogs'}</pre>`;
+                    `<pre>${resultText(data) || 'No catalogs'}</pre>`;
             }
         } catch (error) {
             this.showToast('Failed to get YANG catalogs', 'error');
@@ -285,7 +340,7 @@ class VelocityDriveComplete {
             const data = await response.json();
 
             if (data.success) {
-                const interfaces = this.parseInterfaces(data.stdout);
+                const interfaces = this.parseInterfaces(data.data);
                 this.displayInterfaces(interfaces);
             }
         } catch (error) {
@@ -295,9 +350,17 @@ class VelocityDriveComplete {
         }
     }
 
-    parseInterfaces(output) {
-        // Parse interface data from CLI output
-        // This would need to be adapted based on actual output format
+    parseInterfaces(data) {
+        // 'data' is the ietf-interfaces tree already parsed by the server
+        const container = data && (data['ietf-interfaces:interfaces'] || data.interfaces);
+        if (container && Array.isArray(container.interface)) {
+            return container.interface.map(iface => ({
+                name: iface.name,
+                status: iface['oper-status'] || (iface.enabled === false ? 'down' : 'up'),
+                speed: iface.speed ? `${Number(iface.speed) / 1e9}Gbps` : '-'
+            }));
+        }
+
         return [
             { name: 'eth0', status: 'up', speed: '1Gbps' },
             { name: 'eth1', status: 'up', speed: '1Gbps' }
@@ -382,7 +445,7 @@ class VelocityDriveComplete {
             if (data.success) {
                 this.showToast('TAS schedule applied', 'success');
             } else {
-                this.showToast('TAS configuration failed', 'error');
+                this.showToast(data.error || 'TAS configuration failed', 'error');
             }
         } catch (error) {
             this.showToast('Error: ' + error.message, 'error');
@@ -457,19 +520,21 @@ class VelocityDriveComplete {
         this.showLoading(true);
 
         try {
-            const response = await fetch(`${this.apiUrl}/tsn/statistics`, {
+            // Every port's counters in one request
+            const response = await fetch(`${this.apiUrl}/tsn/statistics/all`, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({
-                    device: this.currentDevice,
-                    interface: 'eth0'
+                    device: this.currentDevice
                 })
             });
 
             const data = await response.json();
 
             if (data.success) {
-                this.displayTSNStatistics(data.statistics);
+                this.displayTSNStatistics(data.ports);
+            } else {
+                this.showToast(data.error || 'No statistics returned', 'warning');
             }
         } catch (error) {
             this.showToast('Failed to get TSN statistics', 'error');
@@ -478,9 +543,19 @@ class VelocityDriveComplete {
         }
     }
 
-    displayTSNStatistics(stats) {
+    displayTSNStatistics(ports) {
         const container = document.getElementById('tsnStatistics');
-        container.innerHTML = '<pre>' + JSON.stringify(stats, null, 2) + '</pre>';
+        const rows = Object.values(ports);
+        const columns = [...new Set(rows.flatMap(row => Object.keys(row.counters || {})))];
+        const escape = value => String(value ?? '').replace(/[&<>"]/g, c => `&#${c.charCodeAt(0)};`);
+
+        let html = '<table class="table table-sm"><thead><tr><th>Port</th><th>Status</th>';
+        html += columns.map(name => `<th>${escape(name)}</th>`).join('') + '</tr></thead><tbody>';
+        for (const row of rows) {
+            html += `<tr><td>${escape(row.name)}</td><td>${escape(row['oper-status'])}</td>`;
+            html += columns.map(name => `<td>${escape((row.counters || {})[name])}</td>`).join('') + '</tr>';
+        }
+        container.innerHTML = html + '</tbody></table>';
     }
 
     // ==================== Protocol Operations ====================
@@ -507,7 +582,7 @@ class VelocityDriveComplete {
             const data = await response.json();
 
             document.getElementById('protocolResponse').textContent =
-                data.stdout || data.stderr || 'No response';
+                resultText(data) || data.stderr || 'No response';
 
             if (data.success) {
                 this.showToast('CoAP request sent', 'success');
@@ -544,7 +619,7 @@ class VelocityDriveComplete {
             const data = await response.json();
 
             document.getElementById('protocolResponse').textContent =
-                data.stdout || data.stderr || 'No response';
+                resultText(data) || data.stderr || 'No response';
 
             if (data.success) {
                 this.showToast('MUP1 message sent', 'success');
@@ -596,17 +671,17 @@ class VelocityDriveComplete {
         this.showLoading(true);
 
         try {
-            const response = await fetch(`${this.apiUrl}/firmware/update`, {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({
-                    device: this.currentDevice,
-                    firmware_file: firmwarePath
-                })
+            const data = await this.streamRequest('firmware/update', {
+                device: this.currentDevice,
+                firmware_file: firmwarePath
+            }, (event) => {
+                if (event.type === 'progress') {
+                    this.setLoadingText(`Updating firmware... ${Math.round(event.percent)}%`);
+                } else if (event.type === 'line') {
+                    this.appendConsoleLine(event.line, event.stream === 'stderr' ? 'console-error-line' : 'console-output-line');
+                }
             });
 
-            const data = await response.json();
-
             if (data.success) {
                 this.showToast('Firmware updated successfully', 'success');
             } else {
@@ -615,6 +690,7 @@ class VelocityDriveComplete {
         } catch (error) {
             this.showToast('Error: ' + error.message, 'error');
         } finally {
+            this.setLoadingText('Processing...');
             this.showLoading(false);
         }
     }
@@ -630,9 +706,12 @@ class VelocityDriveComplete {
             const response = await fetch(`${this.apiUrl}/export`, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
+                // The download is the CLI's own text; parsed YAML cannot be
+                // turned back into it in the browser
                 body: JSON.stringify({
                     device: this.currentDevice,
-                    format
+                    format,
+                    raw: true
                 })
             });
 
@@ -740,24 +819,31 @@ class VelocityDriveComplete {
         this.showLoading(true);
 
         try {
-            const response = await fetch(`${this.apiUrl}/batch`, {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({
-                    device: this.currentDevice,
-                    commands
-                })
+            let completed = 0;
+            const data = await this.streamRequest('batch', {
+                device: this.currentDevice,
+                commands
+            }, (event) => {
+                if (event.type !== 'result') return;
+                completed++;
+                this.setLoadingText(`Running batch... ${completed}/${commands.length}`);
+                this.appendConsoleLine(event.command, 'console-line');
+                const result = event.result || {};
+                if (result.stdout) {
+                    this.appendConsoleLine(result.stdout, 'console-output-line');
+                }
+                if (result.stderr || result.error) {
+                    this.appendConsoleLine(result.stderr || result.error, 'console-error-line');
+                }
             });
 
-            const data = await response.json();
-
             if (data.success) {
-                console.log('Batch results:', data.results);
                 this.showToast(`Executed ${commands.length} commands`, 'success');
             }
         } catch (error) {
             this.showToast('Batch execution failed', 'error');
         } finally {
+            this.setLoadingText('Processing...');
             this.showLoading(false);
         }
     }
@@ -777,40 +863,98 @@ class VelocityDriveComplete {
 
     async sendConsoleCommand() {
         const input = document.getElementById('consoleInput');
-        const output = document.getElementById('consoleOutput');
         const command = input.value.trim();
 
         if (!command) return;
 
         // Display command
-        output.innerHTML += `<div class="console-line"><span class="console-prompt">mvdct&gt;</span> ${command}</div>`;
+        this.appendConsoleLine(`mvdct> ${command}`, 'console-line');
 
         this.showLoading(true);
 
         try {
-            const response = await fetch(`${this.apiUrl}/command/raw`, {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ command })
+            const data = await this.streamRequest('command/raw', { command }, (event) => {
+                if (event.type === 'line') {
+                    this.appendConsoleLine(event.line, event.stream === 'stderr' ? 'console-error-line' : 'console-output-line');
+                }
             });
 
-            const data = await response.json();
-
-            if (data.stdout) {
-                output.innerHTML += `<div class="console-output-line">${this.escapeHtml(data.stdout)}</div>`;
-            }
-            if (data.stderr) {
-                output.innerHTML += `<div class="console-error-line">${this.escapeHtml(data.stderr)}</div>`;
+            if (data.error) {
+                this.appendConsoleLine(`Error: ${data.error}`, 'console-error-line');
             }
         } catch (error) {
-            output.innerHTML += `<div class="console-error-line">Error: ${error.message}</div>`;
+            this.appendConsoleLine(`Error: ${error.message}`, 'console-error-line');
         } finally {
             this.showLoading(false);
             input.value = '';
-            output.scrollTop = output.scrollHeight;
         }
     }
 
+    // Append one line of output, dropping the oldest beyond CONSOLE_MAX_LINES
+    appendConsoleLine(text, className) {
+        const output = document.getElementById('consoleOutput');
+        if (!output) return;
+
+        const line = document.createElement('div');
+        line.className = className;
+        line.textContent = text;
+        output.appendChild(line);
+
+        while (output.childElementCount > CONSOLE_MAX_LINES) {
+            output.removeChild(output.firstElementChild);
+        }
+        output.scrollTop = output.scrollHeight;
+    }
+
+    // POST with stream=ndjson and call onEvent for every event as it arrives.
+    // Servers that answer with plain JSON are replayed as the same events.
+    // Resolves with the final 'done' event.
+    async streamRequest(path, body, onEvent) {
+        const response = await fetch(`${this.apiUrl}/${path}`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Accept': 'application/x-ndjson'
+            },
+            body: JSON.stringify({ ...body, stream: 'ndjson' })
+        });
+
+        const contentType = response.headers.get('Content-Type') || '';
+        if (!contentType.includes('application/x-ndjson') || !response.body) {
+            const data = await response.json();
+            (data.results || []).forEach(item => onEvent({ type: 'result', ...item }));
+            ['stdout', 'stderr'].forEach(stream => {
+                (data[stream] || '').split('\n').filter(line => line).forEach(line =>
+                    onEvent({ type: 'line', stream, line }));
+            });
+            return { ...data, type: 'done' };
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let done = { type: 'done', success: false, error: 'Stream ended unexpectedly' };
+
+        while (true) {
+            const { value, done: finished } = await reader.read();
+            buffer += decoder.decode(value || new Uint8Array(), { stream: !finished });
+
+            let newline;
+            while ((newline = buffer.indexOf('\n')) >= 0) {
+                const line = buffer.slice(0, newline).trim();
+                buffer = buffer.slice(newline + 1);
+                if (!line) continue;
+                const event = JSON.parse(line);
+                if (event.type === 'done') {
+                    done = event;
+                }
+                onEvent(event);
+            }
+            if (finished) break;
+        }
+        return done;
+    }
+
     clearConsole() {
         document.getElementById('consoleOutput').innerHTML = '';
     }
@@ -885,6 +1029,13 @@ class VelocityDriveComplete {
         }
     }
 
+    setLoadingText(text) {
+        const label = document.querySelector('#loadingOverlay p');
+        if (label) {
+            label.textContent = text;
+        }
+    }
+
     showToast(message, type = 'info') {
         const container = document.getElementById('toastContainer');
         const toast = document.createElement('div');
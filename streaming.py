@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+VelocityDRIVE Touch GUI - Streaming responses
+Runs CLI commands with line-by-line output and sends events to the browser
+as NDJSON or Server-Sent Events while the command is still running
+"""
+
+import json
+import queue
+import re
+import subprocess
+import threading
+import time
+import logging
+
+from flask import Response
+
+logger = logging.getLogger(__name__)
+
+NDJSON = 'ndjson'
+SSE = 'sse'
+STREAM_FORMATS = (NDJSON, SSE)
+
+# Lines buffered between the CLI and a slow client before the CLI blocks
+STREAM_QUEUE_SIZE = 256
+
+# Progress as printed by the CLI, e.g. "Writing ... 42%"
+PROGRESS_PATTERN = re.compile(r'(\d{1,3}(?:\.\d+)?)\s*%')
+
+
+def stream_format(req, data=None):
+    """Requested stream format from the body, query string or Accept header"""
+    fmt = (data or {}).get('stream') or req.args.get('stream')
+    if fmt is True or fmt in ('1', 'true'):
+        return NDJSON
+    if fmt in STREAM_FORMATS:
+        return fmt
+    accept = req.headers.get('Accept', '')
+    if 'application/x-ndjson' in accept:
+        return NDJSON
+    if 'text/event-stream' in accept:
+        return SSE
+    return None
+
+
+def _encode(event, fmt):
+    data = json.dumps(event)
+    if fmt == SSE:
+        return f"event: {event.get('type', 'message')}\ndata: {data}\n\n"
+    return data + '\n'
+
+
+def stream_response(events, fmt):
+    """Flask response that sends each event as soon as it is produced"""
+    mimetype = 'text/event-stream' if fmt == SSE else 'application/x-ndjson'
+    return Response(
+        (_encode(event, fmt) for event in events),
+        mimetype=mimetype,
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+def _put(lines, item, closed):
+    while not closed.is_set():
+        try:
+            lines.put(item, timeout=0.5)
+            return
+        except queue.Full:
+            continue
+
+
+def _pump(pipe, name, lines, closed):
+    """Copy lines from a pipe into the queue; drop them once nobody reads"""
+    try:
+        for line in iter(pipe.readline, ''):
+            _put(lines, (name, line), closed)
+    finally:
+        pipe.close()
+        _put(lines, (name, None), closed)
+
+
+def stream_process(cmd, timeout=30, kill_on_close=True):
+    """Run a command and yield 'line' events followed by one 'done' event
+
+    Output is never accumulated, so memory use does not grow with the
+    amount of output. If the client goes away the process is killed unless
+    kill_on_close is False (e.g. firmware updates), in which case it runs to
+    completion with its output discarded.
+    """
+    command = ' '.join(cmd)
+    logger.info(f"Streaming: {command}")
+    try:
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   text=True, bufsize=1)
+    except Exception as e:
+        yield {'type': 'done', 'success': False, 'error': str(e), 'command': command}
+        return
+
+    lines = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+    closed = threading.Event()
+    for name, pipe in (('stdout', process.stdout), ('stderr', process.stderr)):
+        threading.Thread(target=_pump, args=(pipe, name, lines, closed), daemon=True).start()
+
+    deadline = time.time() + timeout
+    open_pipes = 2
+    finished = False
+    try:
+        while open_pipes:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                process.kill()
+                process.wait()
+                finished = True
+                yield {'type': 'done', 'success': False,
+                       'error': f'Command timeout after {timeout}s', 'command': command}
+                return
+            try:
+                name, line = lines.get(timeout=min(remaining, 1.0))
+            except queue.Empty:
+                continue
+            if line is None:
+                open_pipes -= 1
+                continue
+            yield {'type': 'line', 'stream': name, 'line': line.rstrip('\n')}
+
+        try:
+            returncode = process.wait(timeout=max(deadline - time.time(), 0.1))
+        except subprocess.TimeoutExpired:
+            process.kill()
+            returncode = process.wait()
+        finished = True
+        yield {'type': 'done', 'success': returncode == 0,
+               'returncode': returncode, 'command': command}
+    finally:
+        closed.set()
+        if not finished and process.poll() is None:
+            if kill_on_close:
+                logger.info(f"Client disconnected, stopping: {command}")
+                process.kill()
+                process.wait()
+            else:
+                # Wait here so callers holding the serial port keep it
+                logger.info(f"Client disconnected, letting finish: {command}")
+                process.wait()
+
+
+def result_events(result):
+    """Events for a command that already finished (non-streaming transports)"""
+    for name in ('stdout', 'stderr'):
+        for line in (result.get(name) or '').splitlines():
+            yield {'type': 'line', 'stream': name, 'line': line}
+    done = {key: value for key, value in result.items() if key not in ('stdout', 'stderr')}
+    done['type'] = 'done'
+    yield done
+
+
+def with_progress(events):
+    """Add a 'progress' event after each output line that shows a percentage"""
+    last = None
+    for event in events:
+        yield event
+        if event.get('type') != 'line':
+            continue
+        match = PROGRESS_PATTERN.search(event['line'])
+        if match:
+            percent = min(float(match.group(1)), 100.0)
+            if percent != last:
+                last = percent
+                yield {'type': 'progress', 'percent': percent}
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+VelocityDRIVE Touch GUI - Background telemetry poller
+One scheduler samples interface counters, PTP current-ds and TAS state per
+device at configurable rates and pushes changes to subscribed clients, so
+device load does not grow with the number of open browsers. Samples run on a
+bounded pool, so a slow board does not hold up the others.
+"""
+
+import heapq
+import os
+import queue
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from parsing import parse_output
+
+logger = logging.getLogger(__name__)
+
+# Stream name -> (YANG path, seconds between samples); '{interface}' is
+# expanded once per configured interface
+TELEMETRY_STREAMS = {
+    'statistics': ('/ietf-interfaces:interfaces/interface[name="{interface}"]/statistics', 1.0),
+    'ptp': ('/ieee1588-ptp:ptp/instances/instance/current-ds', 1.0),
+    'tas': ('/ieee802-dot1q-sched:sched', 5.0),
+}
+TELEMETRY_INTERFACES = os.environ.get('VELOCITYDRIVE_TELEMETRY_INTERFACES', 'eth0').split(',')
+# Devices sampled at the same time; each device has at most one sample in flight
+TELEMETRY_WORKERS = int(os.environ.get('VELOCITYDRIVE_TELEMETRY_WORKERS', '8'))
+# Minimum seconds between samples of one stream, whatever a client asks for
+MIN_INTERVAL = 0.1
+# Idle SSE connections get a heartbeat this often so dead clients are noticed
+HEARTBEAT_INTERVAL = 15
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+def flatten(value, prefix=''):
+    """Map of '/'-joined leaf paths to leaf values"""
+    leaves = {}
+    if isinstance(value, dict):
+        for key, item in value.items():
+            leaves.update(flatten(item, f'{prefix}/{key}'))
+    elif isinstance(value, list):
+        for index, item in enumerate(value):
+            leaves.update(flatten(item, f'{prefix}/{index}'))
+    else:
+        leaves[prefix or '/'] = value
+    return leaves
+
+
+class Subscription:
+    """Event queue for one connected client"""
+
+    def __init__(self, poller, device, streams):
+        self.poller = poller
+        self.device = device
+        self.streams = set(streams)
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.resync = False
+
+    def push(self, event):
+        if event['stream'] not in self.streams:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # Slow client: drop its backlog and send a fresh snapshot instead
+            self.resync = True
+            with self.queue.mutex:
+                self.queue.queue.clear()
+
+    def events(self, heartbeat=HEARTBEAT_INTERVAL):
+        """Snapshot of the current state, then changes as they happen"""
+        try:
+            yield from self.poller.snapshot(self.device, self.streams)
+            while True:
+                if self.resync:
+                    self.resync = False
+                    yield from self.poller.snapshot(self.device, self.streams)
+                try:
+                    yield self.queue.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield {'type': 'heartbeat', 'time': time.time()}
+        finally:
+            self.poller.unsubscribe(self)
+
+
+class TelemetryPoller:
+    """Schedules samples of subscribed devices on one thread and takes them
+    on a bounded pool"""
+
+    def __init__(self, execute, streams=TELEMETRY_STREAMS, interfaces=TELEMETRY_INTERFACES,
+                 workers=TELEMETRY_WORKERS):
+        self.execute = execute
+        self.streams = streams
+        self.interfaces = interfaces
+        self.workers = workers
+        self.pool = None
+        # Devices with a sample in flight; their due samples are skipped
+        self.busy = set()
+        self.skipped = 0
+        self.config = {}
+        self.state = {}
+        self.subscribers = {}
+        # Streams sampled per device even without subscribers, e.g. to record history
+        self.retained = {}
+        self.listeners = []
+        self.generations = {}
+        self.schedule = []
+        self.samples = 0
+        self.cond = threading.Condition()
+        self.thread = None
+        self.running = False
+
+    def _device_config(self, device):
+        config = self.config.get(device)
+        if config is None:
+            config = self.config[device] = {
+                'intervals': {name: interval for name, (_, interval) in self.streams.items()},
+                'interfaces': list(self.interfaces)
+            }
+        return config
+
+    def _reschedule(self, device):
+        # Called with cond held; older heap entries for the device are ignored
+        generation = self.generations[device] = self.generations.get(device, 0) + 1
+        now = time.time()
+        for name in self._device_config(device)['intervals']:
+            heapq.heappush(self.schedule, (now, device, name, generation))
+        self.cond.notify()
+
+    def check_streams(self, streams):
+        """The stream names (default all), or ValueError naming unknown ones"""
+        if streams is None:
+            return list(self.streams)
+        unknown = [name for name in streams if name not in self.streams]
+        if unknown:
+            raise ValueError(f'Unknown telemetry stream: {", ".join(map(str, unknown))}')
+        return list(streams)
+
+    def configure(self, device, intervals=None, interfaces=None):
+        """Change sample intervals (seconds per stream) or interfaces for a device"""
+        if not isinstance(intervals or {}, dict):
+            raise TypeError('intervals must map stream names to seconds')
+        self.check_streams(list(intervals or {}))
+        with self.cond:
+            config = self._device_config(device)
+            for name, interval in (intervals or {}).items():
+                config['intervals'][name] = max(float(interval), MIN_INTERVAL)
+            if interfaces:
+                config['interfaces'] = list(interfaces)
+            if self._active(device):
+                self._reschedule(device)
+            return {'device': device, 'intervals': dict(config['intervals']),
+                    'interfaces': list(config['interfaces'])}
+
+    def _start(self):
+        # Called with cond held
+        if not self.running:
+            self.running = True
+            self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='telemetry-sample')
+            self.thread = threading.Thread(target=self._run, name='telemetry', daemon=True)
+            self.thread.start()
+
+    def _active(self, device):
+        return bool(self.subscribers.get(device)) or bool(self.retained.get(device))
+
+    def _wanted(self, device, stream):
+        # Called with cond held
+        return (stream in self.retained.get(device, ()) or
+                any(stream in sub.streams for sub in self.subscribers.get(device, ())))
+
+    def add_listener(self, callback):
+        """Call callback(device, stream, key, leaves, time) for every parsed sample"""
+        self.listeners.append(callback)
+
+    def retain(self, device, streams=None):
+        """Keep sampling some (default all) streams of a device while nobody is subscribed"""
+        streams = self.check_streams(streams)
+        with self.cond:
+            if not self._active(device):
+                self._reschedule(device)
+            self.retained.setdefault(device, set()).update(streams or self.streams)
+            self._start()
+
+    def release(self, device, streams=None):
+        """Stop sampling retained streams (default all) of a device"""
+        streams = self.check_streams(streams)
+        with self.cond:
+            retained = self.retained.get(device, set())
+            retained.difference_update(streams or self.streams)
+            if not retained:
+                self.retained.pop(device, None)
+            if not self._active(device):
+                self.generations[device] = self.generations.get(device, 0) + 1
+
+    def subscribe(self, device, streams=None):
+        sub = Subscription(self, device, self.check_streams(streams))
+        with self.cond:
+            if not self._active(device):
+                self._reschedule(device)
+            self.subscribers.setdefault(device, set()).add(sub)
+            self._start()
+        logger.info(f"Telemetry subscriber added for {device}")
+        return sub
+
+    def watch(self, device, streams=None):
+        """Events that subscribe when iteration starts and unsubscribe when it
+        stops; unknown stream names raise ValueError here, not on iteration"""
+        return self._watch(device, self.check_streams(streams))
+
+    def _watch(self, device, streams):
+        yield from self.subscribe(device, streams).events()
+
+    def unsubscribe(self, sub):
+        with self.cond:
+            self.subscribers.get(sub.device, set()).discard(sub)
+            if not self._active(sub.device):
+                # Nobody watching: stop sampling the device
+                self.generations[sub.device] = self.generations.get(sub.device, 0) + 1
+        logger.info(f"Telemetry subscriber removed for {sub.device}")
+
+    def snapshot(self, device, streams):
+        with self.cond:
+            items = [(key, value) for key, value in self.state.items()
+                     if key[0] == device and key[1] in streams]
+        for (_, stream, name), value in items:
+            yield dict(value, type='snapshot', device=device, stream=stream, key=name)
+
+    def _paths(self, device, stream):
+        path = self.streams[stream][0]
+        if '{interface}' not in path:
+            return [(stream, path)]
+        with self.cond:
+            interfaces = list(self._device_config(device)['interfaces'])
+        return [(name, path.format(interface=name)) for name in interfaces]
+
+    def _sample(self, device, stream):
+        for name, path in self._paths(device, stream):
+            result = self.execute(['device', device, 'get', path])
+            self.samples += 1
+            now = time.time()
+            key = (device, stream, name)
+            with self.cond:
+                previous = self.state.get(key, {})
+
+            if not result.get('success'):
+                error = result.get('error') or result.get('stderr') or 'Sample failed'
+                if previous.get('error') != error:
+                    self._store(key, {'time': now, 'error': error})
+                    self._publish(device, {'type': 'error', 'device': device, 'stream': stream,
+                                           'key': name, 'time': now, 'error': error})
+                continue
+
+            stdout = result.get('stdout', '')
+            data = result.get('data')
+            if not isinstance(data, (dict, list)):
+                data = parse_output(stdout)
+            if data is None:
+                if previous.get('raw') == stdout:
+                    continue
+                self._store(key, {'time': now, 'raw': stdout})
+                event = {'raw': stdout}
+            else:
+                leaves = flatten(data)
+                for callback in self.listeners:
+                    try:
+                        callback(device, stream, name, leaves, now)
+                    except Exception as e:
+                        logger.error(f"Telemetry listener failed: {e}")
+                old = previous.get('data') or {}
+                changes = {leaf: value for leaf, value in leaves.items() if old.get(leaf) != value}
+                removed = [leaf for leaf in old if leaf not in leaves]
+                if not changes and not removed and 'data' in previous:
+                    continue
+                self._store(key, {'time': now, 'data': leaves})
+                event = {'changes': changes, 'removed': removed}
+
+            event.update({'type': 'delta', 'device': device, 'stream': stream,
+                          'key': name, 'time': now})
+            self._publish(device, event)
+
+    def _store(self, key, value):
+        with self.cond:
+            self.state[key] = value
+
+    def _publish(self, device, event):
+        with self.cond:
+            subscribers = list(self.subscribers.get(device, ()))
+        for sub in subscribers:
+            sub.push(event)
+
+    def _run(self):
+        while self.running:
+            with self.cond:
+                while self.running and (not self.schedule or self.schedule[0][0] > time.time()):
+                    self.cond.wait(self.schedule[0][0] - time.time() if self.schedule else None)
+                if not self.running:
+                    return
+                due, device, stream, generation = heapq.heappop(self.schedule)
+                if generation != self.generations.get(device):
+                    continue
+                interval = self._device_config(device)['intervals'][stream]
+                wanted = self._wanted(device, stream)
+                if wanted and device in self.busy:
+                    # The last sample has not come back yet; do not pile up
+                    self.skipped += 1
+                    wanted = False
+                elif wanted:
+                    self.busy.add(device)
+                # Keep the cadence, but never queue up missed samples
+                next_due = max(due + interval, time.time())
+                heapq.heappush(self.schedule, (next_due, device, stream, generation))
+                pool = self.pool
+
+            if wanted:
+                try:
+                    pool.submit(self._take, device, stream)
+                except (RuntimeError, AttributeError):
+                    # Pool shut down by stop()
+                    with self.cond:
+                        self.busy.discard(device)
+                    return
+
+    def _take(self, device, stream):
+        try:
+            self._sample(device, stream)
+        except Exception as e:
+            logger.error(f"Telemetry sample of {stream} on {device} failed: {e}")
+        finally:
+            with self.cond:
+                self.busy.discard(device)
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+            pool, self.pool = self.pool, None
+        if pool:
+            pool.shutdown(wait=False)
+
+    def status(self):
+        with self.cond:
+            return {
+                'devices': {device: {'subscribers': len(self.subscribers.get(device, ())),
+                                     'retained': sorted(self.retained.get(device, ())),
+                                     'intervals': dict(config['intervals']),
+                                     'interfaces': list(config['interfaces'])}
+                            for device, config in self.config.items()},
+                'samples': self.samples,
+                'skipped': self.skipped,
+                'in_flight': sorted(self.busy)
+            }
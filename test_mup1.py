@@ -0,0 +1,143 @@
+import threading
+import time
+import unittest
+
+import serial
+
+import mup1
+from mup1 import (Mup1Decoder, Mup1Error, Mup1Transport, PtyLoopbackDevice,
+                  TYPE_PING, checksum, encode_frame)
+
+
+class FramingTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        frame = encode_frame('p', b'')
+        self.assertTrue(frame.startswith(b'>p<'))
+        self.assertEqual(Mup1Decoder().feed(frame), [('p', b'')])
+
+    def test_padding_keeps_checksum_on_whole_words(self):
+        # '>' 'c' 'a' '<' is even, '>' 'c' '<' needs a second EOF
+        self.assertEqual(encode_frame('c', b'a')[:4], b'>ca<')
+        self.assertEqual(encode_frame('c')[:4], b'>c<<')
+        frame = encode_frame('c', b'ab')
+        body, trailer = frame[:-4], frame[-4:]
+        self.assertEqual(len(body) % 2, 0)
+        self.assertEqual(int(trailer, 16), checksum(body))
+
+    def test_escaping(self):
+        data = bytes([0x3E, 0x3C, 0x5C, 0x00, 0xFF, 0x41])
+        frame = encode_frame('c', data)
+        self.assertEqual(frame[2:12], b'\\>\\<\\\\\\0\\F')
+        self.assertEqual(Mup1Decoder().feed(frame), [('c', data)])
+
+    def test_split_feed(self):
+        decoder = Mup1Decoder()
+        frame = encode_frame('C', b'split\x00frame')
+        frames = []
+        for i in range(len(frame)):
+            frames += decoder.feed(frame[i:i + 1])
+        self.assertEqual(frames, [('C', b'split\x00frame')])
+
+    def test_bad_checksum_is_dropped(self):
+        decoder = Mup1Decoder()
+        frame = bytearray(encode_frame('P', b'x'))
+        frame[-1] = ord('0') if frame[-1] != ord('0') else ord('1')
+        self.assertEqual(decoder.feed(bytes(frame) + encode_frame('P', b'y')), [('P', b'y')])
+        self.assertEqual(decoder.errors, 1)
+
+    def test_invalid_escape_is_dropped(self):
+        decoder = Mup1Decoder()
+        self.assertEqual(decoder.feed(b'>c\\x<'), [])
+        self.assertEqual(decoder.errors, 1)
+
+    def test_resync_on_unescaped_sof(self):
+        decoder = Mup1Decoder()
+        frames = decoder.feed(b'>cab' + encode_frame('A', b'hello'))
+        self.assertEqual(frames, [('A', b'hello')])
+
+
+class LoopbackTest(unittest.TestCase):
+
+    def setUp(self):
+        self.replies = {}
+        self.device = PtyLoopbackDevice(handler=self.handle)
+        port = serial.Serial(self.device.port_name, 115200, timeout=0.1)
+        self.link = Mup1Transport(port, name='loopback').start()
+
+    def tearDown(self):
+        self.link.close()
+        self.device.close()
+
+    def handle(self, frame_type, payload):
+        action = self.replies.get(payload)
+        if action == 'silent':
+            return None
+        if isinstance(action, float):
+            time.sleep(action)
+        if frame_type.upper() == TYPE_PING:
+            return TYPE_PING, b'loopback'
+        return frame_type.upper(), payload
+
+    def test_ping(self):
+        self.assertEqual(self.link.request(TYPE_PING, timeout=2), b'loopback')
+
+    def test_escaped_payload(self):
+        data = bytes(range(256))
+        self.assertEqual(self.link.request('c', data, timeout=2), data)
+
+    def test_announce_goes_to_listener(self):
+        received = []
+        got = threading.Event()
+        self.link.add_listener('A', lambda payload: (received.append(payload), got.set()))
+        self.device.announce('hello')
+        self.assertTrue(got.wait(2))
+        self.assertEqual(received, [b'hello'])
+
+    def test_late_reply_is_not_given_to_next_request(self):
+        self.replies[b'slow'] = 0.5
+        with self.assertRaises(TimeoutError):
+            self.link.request('c', b'slow', timeout=0.2)
+        self.assertEqual(self.link.request('c', b'next', timeout=2), b'next')
+
+    def test_unanswered_request_stops_blocking_after_window(self):
+        self.replies[b'lost'] = 'silent'
+        with self.assertRaises(TimeoutError):
+            self.link.request('c', b'lost', timeout=0.1)
+        time.sleep(mup1.MUP1_LATE_REPLY_WINDOW)
+        self.assertEqual(self.link.request('c', b'after', timeout=2), b'after')
+
+    def test_released_fails_pending_and_resumes(self):
+        self.replies[b'slow'] = 0.5
+        result = {}
+
+        def slow():
+            try:
+                self.link.request('c', b'slow', timeout=5)
+            except Mup1Error as e:
+                result['error'] = e
+
+        thread = threading.Thread(target=slow)
+        thread.start()
+        time.sleep(0.1)
+        with self.link.released():
+            self.assertFalse(self.link.running)
+            thread.join(2)
+            self.assertIsInstance(result.get('error'), Mup1Error)
+            # Requests made while the port is lent out wait for it to return
+            waiting = threading.Thread(
+                target=lambda: result.setdefault('ping', self.link.request(TYPE_PING, timeout=5)))
+            waiting.start()
+            time.sleep(0.6)
+        waiting.join(5)
+        self.assertEqual(result.get('ping'), b'loopback')
+        self.assertEqual(self.link.request('c', b'again', timeout=2), b'again')
+
+    def test_send_fails_when_stopped(self):
+        self.link.stop()
+        with self.assertRaises(Mup1Error):
+            self.link.request(TYPE_PING, timeout=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
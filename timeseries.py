@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+VelocityDRIVE Touch GUI - Interface statistics history
+Fixed-size ring buffers of counter samples per (device, interface, counter)
+with per-second rates, a per-minute rollup tier for long history and
+optional memory-mapped files so history survives restarts
+"""
+
+import hashlib
+import math
+import mmap
+import os
+import threading
+import time
+import logging
+from array import array
+
+logger = logging.getLogger(__name__)
+
+# Raw samples kept per counter (one hour at 1 s)
+HISTORY_RAW = int(os.environ.get('VELOCITYDRIVE_HISTORY_RAW', '3600'))
+# Rollup rows kept per counter (three days at one minute)
+HISTORY_ROLLUP = int(os.environ.get('VELOCITYDRIVE_HISTORY_ROLLUP', '4320'))
+HISTORY_ROLLUP_SECONDS = 60
+# Directory for memory-mapped series files; unset keeps history in RAM only
+HISTORY_DIR = os.environ.get('VELOCITYDRIVE_HISTORY_DIR')
+
+NAN = float('nan')
+# Two header slots (next write position, number of rows) precede the rows
+HEADER = 2
+# Rows allocated up front for a ring kept in RAM; it doubles as it fills
+INITIAL_ROWS = 16
+
+
+class Ring:
+    """Ring of fixed-width rows of doubles in an array or a mapped file"""
+
+    def __init__(self, columns, capacity, path=None):
+        self.columns = columns
+        self.capacity = capacity
+        self.mmap = None
+        if path:
+            nbytes = (HEADER + columns * capacity) * 8
+            fresh = not os.path.exists(path) or os.path.getsize(path) != nbytes
+            with open(path, 'a+b') as f:
+                if fresh:
+                    f.truncate(0)
+                    f.truncate(nbytes)
+                self.mmap = mmap.mmap(f.fileno(), nbytes)
+            self.data = memoryview(self.mmap).cast('d')
+            self.allocated = capacity
+        else:
+            self.allocated = min(capacity, INITIAL_ROWS)
+            self.data = array('d', bytes((HEADER + columns * self.allocated) * 8))
+
+    def __len__(self):
+        return int(self.data[1])
+
+    def append(self, row):
+        head = int(self.data[0])
+        if head == self.allocated and self.allocated < self.capacity:
+            # Not wrapped yet, so rows are in order from slot 0 and can be extended
+            grow = min(self.allocated, self.capacity - self.allocated)
+            self.data.frombytes(bytes(grow * self.columns * 8))
+            self.allocated += grow
+        base = HEADER + head * self.columns
+        for offset, value in enumerate(row):
+            self.data[base + offset] = value
+        self.data[0] = (head + 1) % self.capacity
+        self.data[1] = min(len(self) + 1, self.capacity)
+
+    def row(self, index):
+        """Row by age order, 0 being the oldest"""
+        count = len(self)
+        start = (int(self.data[0]) - count) % self.capacity
+        base = HEADER + ((start + index) % self.capacity) * self.columns
+        return tuple(self.data[base:base + self.columns])
+
+    def rows(self, since=None, until=None):
+        """Rows whose first column (time) lies in [since, until]"""
+        count = len(self)
+        lo, hi = 0, count
+        if since is not None:
+            # Rows are in time order, so binary search for the first one
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if self.row(mid)[0] < since:
+                    lo = mid + 1
+                else:
+                    hi = mid
+        for index in range(lo, count):
+            row = self.row(index)
+            if until is not None and row[0] > until:
+                break
+            yield row
+
+    def close(self):
+        if self.mmap:
+            self.data.release()
+            self.mmap.close()
+            self.mmap = None
+
+
+def _number(value):
+    return None if value is None or math.isnan(value) else value
+
+
+class Series:
+    """History of one counter: raw (time, value, rate) plus a rollup tier of
+    (time, last value, min rate, max rate, average rate) rows"""
+
+    def __init__(self, raw_capacity=HISTORY_RAW, rollup_capacity=HISTORY_ROLLUP,
+                 rollup_seconds=HISTORY_ROLLUP_SECONDS, path=None):
+        self.raw = Ring(3, raw_capacity, path + '.raw' if path else None)
+        self.rollup = Ring(5, rollup_capacity, path + '.rollup' if path else None)
+        self.rollup_seconds = rollup_seconds
+        self.bucket = None
+        self.last = self.raw.row(len(self.raw) - 1) if len(self.raw) else None
+
+    def add(self, t, value):
+        if self.last and t <= self.last[0]:
+            return
+        rate = NAN
+        # A counter that went backwards was reset; its first rate is unknown
+        if self.last and value >= self.last[1]:
+            rate = (value - self.last[1]) / (t - self.last[0])
+        self.last = (t, value, rate)
+        self.raw.append(self.last)
+        self._roll(t, value, rate)
+
+    def _roll(self, t, value, rate):
+        start = t - t % self.rollup_seconds
+        if self.bucket and self.bucket['start'] != start:
+            self._flush()
+        if not self.bucket:
+            self.bucket = {'start': start, 'first': None, 'min': NAN, 'max': NAN}
+        bucket = self.bucket
+        bucket['last'] = (t, value)
+        if bucket['first'] is None:
+            bucket['first'] = (t, value)
+        if not math.isnan(rate):
+            bucket['min'] = rate if math.isnan(bucket['min']) else min(bucket['min'], rate)
+            bucket['max'] = rate if math.isnan(bucket['max']) else max(bucket['max'], rate)
+
+    def _flush(self):
+        bucket, self.bucket = self.bucket, None
+        (t0, v0), (t1, v1) = bucket['first'], bucket['last']
+        previous = self.rollup.row(len(self.rollup) - 1) if len(self.rollup) else None
+        if previous and previous[0] < t0 and v1 >= previous[1]:
+            t0, v0 = previous[0], previous[1]
+        avg = (v1 - v0) / (t1 - t0) if t1 > t0 and v1 >= v0 else NAN
+        self.rollup.append((t1, v1, bucket['min'], bucket['max'], avg))
+
+    def points(self, since=None, until=None):
+        """(time, value, min rate, max rate, avg rate) rows, rollup then raw"""
+        oldest_raw = self.raw.row(0)[0] if len(self.raw) else None
+        for row in self.rollup.rows(since, until):
+            if oldest_raw is None or row[0] < oldest_raw:
+                yield row
+        for t, value, rate in self.raw.rows(since, until):
+            yield (t, value, rate, rate, rate)
+
+    def query(self, since=None, until=None, step=None):
+        """Points in [since, until], downsampled to step-second buckets if given"""
+        if not step:
+            return [{'t': t, 'value': value, 'rate': _number(avg),
+                     'min_rate': _number(low), 'max_rate': _number(high)}
+                    for t, value, low, high, avg in self.points(since, until)]
+
+        buckets = []
+        current = None
+        for t, value, low, high, avg in self.points(since, until):
+            start = t - t % step
+            if current is None or current['t'] != start:
+                current = {'t': start, 'value': value, 'min_rate': NAN, 'max_rate': NAN,
+                           'rate_sum': 0.0, 'rate_weight': 0.0, 'samples': 0}
+                buckets.append(current)
+            current['value'] = value
+            current['samples'] += 1
+            if not math.isnan(avg):
+                current['min_rate'] = low if math.isnan(current['min_rate']) else min(current['min_rate'], low)
+                current['max_rate'] = high if math.isnan(current['max_rate']) else max(current['max_rate'], high)
+                current['rate_sum'] += avg
+                current['rate_weight'] += 1
+
+        for bucket in buckets:
+            weight = bucket.pop('rate_weight')
+            total = bucket.pop('rate_sum')
+            bucket['avg_rate'] = total / weight if weight else None
+            bucket['min_rate'] = _number(bucket['min_rate'])
+            bucket['max_rate'] = _number(bucket['max_rate'])
+        return buckets
+
+    def close(self):
+        self.raw.close()
+        self.rollup.close()
+
+
+def counter_values(leaves):
+    """Numeric counters from flattened YANG leaves, keyed by leaf name"""
+    counters = {}
+    for path, value in leaves.items():
+        if isinstance(value, bool):
+            continue
+        if isinstance(value, str):
+            # YANG JSON encodes 64-bit counters as strings
+            if not value.isdigit():
+                continue
+            value = int(value)
+        if not isinstance(value, (int, float)):
+            continue
+        name = path.rsplit('/', 1)[-1].split(':')[-1]
+        counters[name] = float(value)
+    return counters
+
+
+class TimeSeriesStore:
+    """All counter histories, keyed by (device, interface, counter)"""
+
+    def __init__(self, directory=HISTORY_DIR, raw_capacity=HISTORY_RAW,
+                 rollup_capacity=HISTORY_ROLLUP):
+        self.directory = directory
+        self.raw_capacity = raw_capacity
+        self.rollup_capacity = rollup_capacity
+        self.series = {}
+        self.lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._load()
+
+    def _load(self):
+        # Each mapped series has a .key file naming its (device, interface, counter)
+        for filename in os.listdir(self.directory):
+            if filename.endswith('.key'):
+                with open(os.path.join(self.directory, filename)) as f:
+                    key = tuple(f.read().split('\0'))
+                if len(key) == 3:
+                    self._series(key)
+        logger.info(f"Loaded {len(self.series)} statistics series from {self.directory}")
+
+    def _series(self, key):
+        series = self.series.get(key)
+        if series is None:
+            path = None
+            if self.directory:
+                name = hashlib.sha1('\0'.join(key).encode()).hexdigest()[:16]
+                path = os.path.join(self.directory, name)
+                with open(path + '.key', 'w') as f:
+                    f.write('\0'.join(key))
+            series = self.series[key] = Series(self.raw_capacity, self.rollup_capacity, path=path)
+        return series
+
+    def record(self, device, interface, counters, t=None):
+        """Add one sample of several counters ({name: value})"""
+        t = time.time() if t is None else t
+        with self.lock:
+            for name, value in counters.items():
+                self._series((device, interface, name)).add(t, value)
+
+    def counters(self, device, interface):
+        with self.lock:
+            return sorted(key[2] for key in self.series if key[:2] == (device, interface))
+
+    def query(self, device, interface, counters=None, since=None, until=None, step=None):
+        """{counter: points} for one interface"""
+        with self.lock:
+            names = counters or [key[2] for key in self.series if key[:2] == (device, interface)]
+            return {name: self.series[(device, interface, name)].query(since, until, step)
+                    for name in names if (device, interface, name) in self.series}
+
+    def close(self):
+        with self.lock:
+            for series in self.series.values():
+                series.close()
+            self.series.clear()
+
+    def status(self):
+        with self.lock:
+            return {
+                'series': len(self.series),
+                'raw_capacity': self.raw_capacity,
+                'rollup_capacity': self.rollup_capacity,
+                'directory': self.directory
+            }
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+VelocityDRIVE Touch GUI - Request tracing
+Opt-in span trees for single requests: stages open spans on the request's
+context, the tree is returned with the response and every span is appended
+to a Chrome trace file (chrome://tracing, Perfetto)
+"""
+
+import contextvars
+import json
+import os
+import tempfile
+import threading
+import time
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Chrome trace events are appended here, one JSON array for all traces
+TRACE_FILE = os.environ.get('VELOCITYDRIVE_TRACE_FILE',
+                            os.path.join(tempfile.gettempdir(), 'velocitydrive-trace.json'))
+
+# Innermost open span of the traced request running on this context
+_current = contextvars.ContextVar('velocitydrive_span', default=None)
+
+
+class Span:
+    __slots__ = ('name', 'attrs', 'start', 'end', 'thread', 'children')
+
+    def __init__(self, name, attrs, start=None, end=None):
+        self.name = name
+        self.attrs = attrs
+        self.start = start or time.time()
+        self.end = end
+        self.thread = threading.get_ident()
+        self.children = []
+
+    def tree(self, origin=None):
+        """Nested dict of this span and its children, times in ms from origin"""
+        origin = self.start if origin is None else origin
+        node = {
+            'name': self.name,
+            'start_ms': round((self.start - origin) * 1000, 3),
+            'duration_ms': round(((self.end or time.time()) - self.start) * 1000, 3)
+        }
+        if self.attrs:
+            node['attrs'] = self.attrs
+        if self.children:
+            node['children'] = [child.tree(origin) for child in list(self.children)]
+        return node
+
+    def events(self, pid):
+        """Chrome 'complete' events for this span and its children"""
+        yield {
+            'name': self.name,
+            'ph': 'X',
+            'ts': round(self.start * 1e6),
+            'dur': round(((self.end or time.time()) - self.start) * 1e6),
+            'pid': pid,
+            'tid': self.thread,
+            'args': self.attrs
+        }
+        for child in list(self.children):
+            yield from child.events(pid)
+
+
+@contextmanager
+def span(name, **attrs):
+    """Time the enclosed block as a child of the current span; free when not tracing"""
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(name, attrs)
+    parent.children.append(child)
+    token = _current.set(child)
+    try:
+        yield child
+    finally:
+        child.end = time.time()
+        _current.reset(token)
+
+
+def add_span(name, start, end=None, **attrs):
+    """Add an already finished stage, e.g. time spent waiting in a queue"""
+    parent = _current.get()
+    if parent is not None:
+        parent.children.append(Span(name, attrs, start, end or time.time()))
+
+
+class Tracer:
+    """Starts and finishes traced requests and writes them to the trace file"""
+
+    def __init__(self, path=TRACE_FILE):
+        self.path = path
+        self.traces = 0
+        self.lock = threading.Lock()
+
+    def start(self, name, **attrs):
+        root = Span(name, attrs)
+        _current.set(root)
+        return root
+
+    def finish(self, root):
+        root.end = time.time()
+        _current.set(None)
+        self.traces += 1
+        if self.path:
+            self.write(root)
+        return root.tree()
+
+    def write(self, root):
+        # Chrome accepts a JSON array without the closing bracket, so traces
+        # can be appended without rewriting the file
+        lines = ''.join(json.dumps(event, default=str) + ',\n' for event in root.events(os.getpid()))
+        try:
+            with self.lock:
+                with open(self.path, 'a') as f:
+                    if f.tell() == 0:
+                        f.write('[\n')
+                    f.write(lines)
+        except OSError as e:
+            logger.warning(f"Could not write trace to {self.path}: {e}")
+
+    def status(self):
+        return {'traces': self.traces, 'file': self.path}
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+VelocityDRIVE Touch GUI - YANG transactions
+Stages sets and deletes for one device and commits them as a single patch,
+after reading a pre-image of every staged path so a failed commit can be
+rolled back
+"""
+
+import itertools
+import os
+import tempfile
+import threading
+import time
+import logging
+import re
+
+import yaml
+
+from parsing import fetch_instances, parse_output
+
+logger = logging.getLogger(__name__)
+
+# Seconds an uncommitted transaction is kept after its last change
+TRANSACTION_TTL = int(os.environ.get('VELOCITYDRIVE_TRANSACTION_TTL', '600'))
+
+SET = 'set'
+DELETE = 'delete'
+OPERATIONS = (SET, DELETE)
+
+
+def names_path(error, path):
+    """True if the error text mentions path as a whole, not as part of a
+    longer path such as a sibling leaf or a child node"""
+    pattern = r'(?<![\w/:.\-])' + re.escape(path) + r'(?![\w/:\-\[]|\.\w)'
+    return bool(error) and re.search(pattern, error) is not None
+
+
+def patch_document(edits):
+    """mvdct YAML patch: one {path: value} item per edit, null deletes"""
+    return yaml.safe_dump([{path: value} for path, value in edits], sort_keys=False)
+
+
+class Transaction:
+    """Staged edits for one device"""
+
+    def __init__(self, tx_id, device):
+        self.id = tx_id
+        self.device = device
+        # path -> (operation, value); re-staging a path replaces its edit
+        self.edits = {}
+        self.state = 'open'
+        self.created = self.touched = time.time()
+        self.result = None
+
+    def stage(self, operation, path, value=None):
+        if operation not in OPERATIONS:
+            raise ValueError(f'Operation must be one of: {", ".join(OPERATIONS)}')
+        if not path or not isinstance(path, str):
+            raise ValueError('Path required')
+        if operation == SET and value is None:
+            raise ValueError(f'Value required to set {path}')
+        self.edits.pop(path, None)
+        self.edits[path] = (operation, value if operation == SET else None)
+        self.touched = time.time()
+
+    def summary(self):
+        summary = {
+            'id': self.id,
+            'device': self.device,
+            'state': self.state,
+            'created': self.created,
+            'edits': [{'op': operation, 'path': path, 'value': value}
+                      for path, (operation, value) in self.edits.items()]
+        }
+        if self.result:
+            summary.update(self.result)
+        return summary
+
+
+class TransactionManager:
+    """Open transactions and their commit/rollback"""
+
+    def __init__(self, execute, apply_native=None, ttl=TRANSACTION_TTL):
+        self.execute = execute
+        # apply_native(device, {path: value}, timeout) -> result, or None when
+        # the edits cannot be sent without the CLI
+        self.apply_native = apply_native
+        self.ttl = ttl
+        self.transactions = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def _expire(self):
+        # Called with lock held
+        now = time.time()
+        for tx_id, tx in list(self.transactions.items()):
+            if now - tx.touched > self.ttl:
+                del self.transactions[tx_id]
+
+    def begin(self, device):
+        with self.lock:
+            self._expire()
+            tx = Transaction(str(next(self.ids)), device)
+            self.transactions[tx.id] = tx
+            return tx
+
+    def get(self, tx_id):
+        with self.lock:
+            self._expire()
+            return self.transactions.get(tx_id)
+
+    def stage(self, tx_id, edits):
+        """Add [{'op', 'path', 'value'}] edits to an open transaction"""
+        with self.lock:
+            tx = self.transactions.get(tx_id)
+            if tx is None or tx.state != 'open':
+                return None
+            if not isinstance(edits, list):
+                raise ValueError('Edits must be a list')
+            for edit in edits:
+                if not isinstance(edit, dict):
+                    raise ValueError('Each edit must be an object with op, path and value')
+            # Validate all edits before staging any of them
+            for target in (Transaction(tx.id, tx.device), tx):
+                for edit in edits:
+                    target.stage(edit.get('op', SET), edit.get('path'), edit.get('value'))
+            return tx
+
+    def abort(self, tx_id):
+        with self.lock:
+            tx = self.transactions.get(tx_id)
+            if tx is None or tx.state != 'open':
+                return None
+            tx.state = 'aborted'
+            del self.transactions[tx_id]
+            return tx
+
+    def read_pre_image(self, device, paths, timeout):
+        """Current values of paths in one 'fetch' round trip; absent paths map to None"""
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.fetch', delete=False) as f:
+            yaml.safe_dump(list(paths), f)
+            fetch_file = f.name
+        try:
+            result = self.execute(['device', device, 'fetch', fetch_file], timeout)
+        finally:
+            os.unlink(fetch_file)
+        if not result.get('success'):
+            raise RuntimeError(result.get('error') or result.get('stderr') or 'Fetch failed')
+        data = result.get('data')
+        if data is None:
+            data = parse_output(result.get('stdout') or '')
+        found = fetch_instances(data)
+        return {path: found.get(path) for path in paths}
+
+    def apply(self, device, edits, timeout):
+        """Send [(path, value)] edits in one round trip"""
+        if self.apply_native:
+            result = self.apply_native(device, dict(edits), timeout)
+            if result is not None:
+                return result
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.patch', delete=False) as f:
+            f.write(patch_document(edits))
+            patch_file = f.name
+        try:
+            return self.execute(['device', device, 'patch', patch_file], timeout)
+        finally:
+            os.unlink(patch_file)
+
+    def restore_edits(self, tx, pre_image, error=None):
+        """[(path, value)] putting back the pre-image of every staged edit that
+        may have been applied; deletes of paths that did not exist changed
+        nothing, and neither did the edit the device rejected"""
+        restore = []
+        for path, (operation, _) in tx.edits.items():
+            previous = pre_image.get(path)
+            if previous is None and operation == DELETE:
+                continue
+            if names_path(error, path):
+                continue
+            restore.append((path, previous))
+        return restore
+
+    def roll_back(self, device, restore, timeout):
+        """(result, round trips) of applying restore edits; a restoring delete of
+        a path that is already gone counts as done"""
+        result = {'success': True}
+        trips = 0
+        while restore:
+            result = self.apply(device, restore, timeout)
+            trips += 1
+            if result.get('success'):
+                break
+            error = result.get('error') or result.get('stderr') or ''
+            if 'not found' not in error.lower():
+                break
+            gone = [path for path, value in restore if value is None and names_path(error, path)]
+            if not gone:
+                break
+            restore = [(path, value) for path, value in restore if path not in gone]
+            result = {'success': True}
+        return result, trips
+
+    def commit(self, tx_id, rollback=True, timeout=60):
+        """Apply all staged edits; on failure restore the pre-image
+
+        Returns the transaction summary with 'success', per-leaf 'results' and,
+        after a failure, 'rollback'.
+        """
+        with self.lock:
+            tx = self.transactions.get(tx_id)
+            if tx is None or tx.state != 'open':
+                return None
+            tx.state = 'committing'
+        started = time.time()
+        edits = [(path, value) for path, (_, value) in tx.edits.items()]
+
+        pre_image = None
+        if rollback and edits:
+            try:
+                pre_image = self.read_pre_image(tx.device, [path for path, _ in edits], timeout)
+            except Exception as e:
+                tx.state = 'open'
+                tx.result = {'success': False, 'error': f'Could not read pre-image: {e}'}
+                return tx.summary()
+
+        result = self.apply(tx.device, edits, timeout) if edits else {'success': True}
+        success = bool(result.get('success'))
+        error = None if success else (result.get('error') or result.get('stderr') or 'Patch failed')
+
+        rollback_result = None
+        rollback_trips = 0
+        if not success and pre_image is not None:
+            rollback_result, rollback_trips = self.roll_back(
+                tx.device, self.restore_edits(tx, pre_image, error), timeout)
+            if not rollback_result.get('success'):
+                logger.error(f"Rollback of transaction {tx.id} on {tx.device} failed")
+
+        results = []
+        for path, (operation, value) in tx.edits.items():
+            leaf = {'op': operation, 'path': path}
+            if pre_image is not None:
+                leaf['previous'] = pre_image.get(path)
+            if success:
+                leaf['status'] = 'applied'
+            else:
+                # The CLI names the offending path in its error when it can
+                leaf['status'] = 'failed' if names_path(error, path) else 'not_applied'
+                if rollback_result is not None:
+                    leaf['rolled_back'] = bool(rollback_result.get('success'))
+            results.append(leaf)
+
+        tx.state = 'committed' if success else 'failed'
+        tx.result = {
+            'success': success,
+            'error': error,
+            'results': results,
+            'round_trips': (1 if edits else 0) + (1 if pre_image is not None else 0) + rollback_trips,
+            'elapsed_ms': round((time.time() - started) * 1000, 2)
+        }
+        if rollback_result is not None:
+            tx.result['rollback'] = {
+                'success': bool(rollback_result.get('success')),
+                'error': rollback_result.get('error') or rollback_result.get('stderr') or None
+            }
+        return tx.summary()
+
+    def status(self):
+        with self.lock:
+            self._expire()
+            return {'open': sum(1 for tx in self.transactions.values() if tx.state == 'open')}
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+VelocityDRIVE Touch GUI - JSON Patch (RFC 6902) deltas
+Content hashes for ETags, a diff producing add/remove/replace operations for
+YANG subtrees and a small store of recently sent versions to diff against
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+# Versions of YANG subtrees kept for delta responses
+MAX_VERSIONS = 64
+
+
+def etag(value):
+    """Stable content hash of a JSON-serializable value"""
+    text = json.dumps(value, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+def _escape(token):
+    return str(token).replace('~', '~0').replace('/', '~1')
+
+
+def diff(old, new, path=''):
+    """Operations turning old into new"""
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = []
+        for key in old:
+            if key not in new:
+                ops.append({'op': 'remove', 'path': f'{path}/{_escape(key)}'})
+        for key, value in new.items():
+            child = f'{path}/{_escape(key)}'
+            if key not in old:
+                ops.append({'op': 'add', 'path': child, 'value': value})
+            else:
+                ops.extend(diff(old[key], value, child))
+        return ops
+
+    if isinstance(old, list) and isinstance(new, list):
+        ops = []
+        common = min(len(old), len(new))
+        for index in range(common):
+            ops.extend(diff(old[index], new[index], f'{path}/{index}'))
+        # Remove from the end so earlier indexes stay valid
+        for index in range(len(old) - 1, common - 1, -1):
+            ops.append({'op': 'remove', 'path': f'{path}/{index}'})
+        for index in range(common, len(new)):
+            ops.append({'op': 'add', 'path': f'{path}/{index}', 'value': new[index]})
+        return ops
+
+    if old == new and type(old) is type(new):
+        return []
+    return [{'op': 'replace', 'path': path, 'value': new}]
+
+
+class VersionStore:
+    """Recently sent versions by (key, etag), least recently used dropped first"""
+
+    def __init__(self, max_versions=MAX_VERSIONS):
+        self.max_versions = max_versions
+        self.versions = OrderedDict()
+        self.lock = threading.Lock()
+
+    def remember(self, key, tag, value):
+        with self.lock:
+            self.versions[(key, tag)] = value
+            self.versions.move_to_end((key, tag))
+            while len(self.versions) > self.max_versions:
+                self.versions.popitem(last=False)
+
+    def get(self, key, tag):
+        with self.lock:
+            value = self.versions.get((key, tag))
+            if value is not None:
+                self.versions.move_to_end((key, tag))
+            return value